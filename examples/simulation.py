@@ -0,0 +1,16 @@
+"""Example of rolling many trials at once."""
+from collections import Counter
+from trill import roll_many
+
+
+def main():
+    results, errors = roll_many('sum largest 3 4d6', 1_000_000)
+    assert not errors
+
+    counts = Counter(int(v) for v in results)
+    for score in sorted(counts):
+        print(f'{score:>2}: {counts[score] / len(results):.4f}')
+
+
+if __name__ == '__main__':
+    main()
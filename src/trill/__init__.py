@@ -1,22 +1,27 @@
 """Trill - Troll interpreter."""
 from typing import Optional
-from .tokenizer import Tokenizer
-from .parser import Parser
-from .interpreter import Interpreter
+from .functions import NumpyRandom
+from .program import CompiledRoll, compile_roll as compile  # pylint: disable=redefined-builtin
 from .error import handler as error_handler
+from .limits import LimitExceeded, Limits
+from .parallel import roll_parallel
+from .types import RandomSource
+from .aio import aiterate, aprobabilities, atrill
 
 
-def trill(roll: str, seed: Optional[int] = None, average: bool = False):
-    tokens = Tokenizer(roll).scan_tokens()
+def trill(
+    roll: str,
+    seed: Optional[int] = None,
+    average: bool = False,
+    engine: str = "auto",
+    rng: Optional[RandomSource] = None,
+    limits: Optional[Limits] = None,
+):
+    return compile(roll).roll(seed=seed, average=average, engine=engine, rng=rng, limits=limits)
 
-    if error_handler.had_error:
-        return [None, error_handler.error_report]
 
-    parsed = Parser(tokens).parse()
+def roll_many(roll: str, n: int, seed: Optional[int] = None, average: bool = False):
+    """Roll ROLL N times, vectorized with NumPy where possible."""
+    from .batch import roll_many as batch_roll_many  # pylint: disable=import-outside-toplevel
 
-    if error_handler.had_error:
-        return [None, error_handler.error_report]
-
-    result = Interpreter(seed).interpret(parsed, average=average)
-
-    return [result, error_handler.error_report]
+    return batch_roll_many(roll, n, seed=seed, average=average)
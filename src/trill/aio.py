@@ -0,0 +1,189 @@
+"""Rolls from asyncio code.
+
+Rolls are run in an executor, the default one of the event loop unless
+another is given, so they do not block the event loop. A roll in a thread
+checks for cancellation on every loop iteration and function call, so a
+roll that is cancelled or runs out of time stops its worker, instead of
+rolling on in the background.
+
+Other executors, like a ProcessPoolExecutor, are sent a module level
+function and its arguments. Their workers can not be told to stop, so they
+are given the deadline of the roll instead, and stop by themselves once it
+passes.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from .ast import expression, statement
+from .calculator import Calculator
+from .limits import LimitExceeded, Limits, guard
+from .program import compile_roll
+from .types import RandomSource
+
+T = TypeVar("T")
+
+Checkpoint = Callable[[], None]
+
+
+class Cancelled(Exception):
+    """Raised in the worker of a roll that was cancelled or timed out."""
+
+
+def cancellation(stop: threading.Event) -> Checkpoint:
+    """Checkpoint raising Cancelled once STOP is set."""
+
+    def checkpoint():
+        if stop.is_set():
+            raise Cancelled()
+
+    return checkpoint
+
+
+def in_threads(executor: Optional[Executor]) -> bool:
+    """Whether EXECUTOR runs work in threads of this process, like the default executor."""
+    return executor is None or isinstance(executor, ThreadPoolExecutor)
+
+
+class Deadline:
+    """Checkpoint raising Cancelled once the wall clock passes AT, which can be sent to worker processes."""
+
+    def __init__(self, at: float):
+        self.at = at
+
+    def __repr__(self):
+        return f"<Deadline {self.at}>"
+
+    def __call__(self):
+        if time.time() > self.at:
+            raise Cancelled()
+
+
+async def run(
+    work: Callable[..., T],
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None,
+    arguments: Sequence[Any] = (),
+) -> T:
+    """Call WORK with ARGUMENTS and a checkpoint in EXECUTOR, stopping it if cancelled or after TIMEOUT seconds.
+
+    Executors not running threads are given a Deadline as the checkpoint,
+    or None without a timeout.
+    """
+    loop = asyncio.get_running_loop()
+    if not in_threads(executor):
+        deadline = None if timeout is None else Deadline(time.time() + timeout)
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, work, *arguments, deadline), timeout)
+        except Cancelled as e:
+            # The worker passed the deadline before the timeout was noticed here.
+            raise asyncio.TimeoutError() from e
+
+    stop = threading.Event()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(executor, work, *arguments, cancellation(stop)), timeout)
+    finally:
+        stop.set()
+
+
+def roll_work(
+    roll: str,
+    seed: Optional[int],
+    average: bool,
+    engine: str,
+    rng: Optional[RandomSource],
+    limits: Optional[Limits],
+    checkpoint: Optional[Checkpoint],
+) -> List[Any]:
+    program = compile_roll(roll)
+    return program.roll(seed=seed, average=average, engine=engine, rng=rng, checkpoint=checkpoint, limits=limits)
+
+
+def probabilities_work(roll: str, average: bool, limits: Optional[Limits], checkpoint: Optional[Checkpoint]) -> List[Any]:
+    program = compile_roll(roll)
+    if program.errors:
+        return [None, list(program.errors)]
+
+    calculator = Calculator()
+    calculator.guard = guard(limits, checkpoint)
+    try:
+        return [calculator.interpret(list(program.statements), average=average), []]
+    except LimitExceeded as e:
+        return [None, [e.error]]
+
+
+async def atrill(
+    roll: str,
+    seed: Optional[int] = None,
+    average: bool = False,
+    engine: str = "auto",
+    rng: Optional[RandomSource] = None,
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None,
+    limits: Optional[Limits] = None,
+) -> List[Any]:
+    """Roll ROLL like `trill()`, without blocking the event loop.
+
+    Raises asyncio.TimeoutError if the roll takes more than TIMEOUT seconds.
+    """
+    arguments = (roll, seed, average, engine, rng, limits)
+    return await run(roll_work, executor, timeout, arguments)
+
+
+async def aprobabilities(
+    roll: str,
+    average: bool = False,
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None,
+    limits: Optional[Limits] = None,
+) -> List[Any]:
+    """Calculate the exact distribution of ROLL, without blocking the event loop.
+
+    Returns [distribution, errors], where the distribution is the
+    histogram, average, spread and mean deviation from Calculator.interpret,
+    or None if the roll has errors. Raises asyncio.TimeoutError if the
+    calculation takes more than TIMEOUT seconds.
+    """
+    arguments = (roll, average, limits)
+    return await run(probabilities_work, executor, timeout, arguments)
+
+
+async def aiterate(
+    roll: str,
+    seed: Optional[int] = None,
+    average: bool = False,
+    rng: Optional[RandomSource] = None,
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None,
+    limits: Optional[Limits] = None,
+) -> AsyncIterator[Tuple[int, Union[expression.Expression, statement.Statement], Any]]:
+    """Yield the results of ROLL as they are rolled, like CompiledRoll.iterate.
+
+    Each result is rolled in EXECUTOR, so repeated rolls like
+    `1000'sum 4d6` yield a line at a time. TIMEOUT limits the time of the
+    whole roll. Closing the iterator early stops the roll. Going over
+    LIMITS raises LimitExceeded.
+
+    The rolls are a generator, which can only be shared with executors
+    running threads, so other executors raise TypeError.
+    """
+    if not in_threads(executor):
+        raise TypeError(f"aiterate needs an executor running threads, got {type(executor).__name__}")
+
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    stop = threading.Event()
+    results = compile_roll(roll).iterate(seed=seed, average=average, rng=rng, checkpoint=cancellation(stop), limits=limits)
+    done = object()
+
+    try:
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            item = await asyncio.wait_for(loop.run_in_executor(executor, next, results, done), remaining)
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,550 @@
+"""Static analysis of Troll programs, choosing how to find their distributions.
+
+The analyzer walks a program once, before it is run, and finds:
+
+- whether the calculator supports every construct used, so the exact
+  distribution can be calculated, or it has to be estimated by sampling;
+- whether the batch evaluator can roll every trial at once with NumPy;
+- bounds on the values of each expression, and from them the number of
+  outcomes the calculator enumerates.
+
+Single rolls do not use it: the "auto" engine of CompiledRoll.roll always
+runs the closures, or the interpreter when profiling.
+
+Numbers are bounded by intervals, and collections by their shortest and
+longest length. Collections are counted as the calculator sees them, sorted,
+so N dice of S sides have comb(N + S - 1, N) outcomes, not the S ** N
+sequences group_probabilities lists. Collections of any length up to N have
+the sum of those counts over each length, comb(N + S, N). Dice pools that
+are only summed, counted or selected from are not enumerated, and do not
+count towards the space.
+
+The analysis can only say what is not supported. Programs it finds exact
+or vectorizable may still fail on their values, like recursion that does
+not end, so engines still fall back when they do.
+"""
+import math
+from dataclasses import dataclass, replace
+from typing import ChainMap, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from .ast import expression
+from .ast import statement
+from .calculator import RANDOM_UNARY, free_variables
+from .functions import CALC_OPERATORS, COMPARISON_OPERATORS
+from .tokens import Token, TokenType
+
+# Most outcomes to calculate exactly, larger programs are estimated.
+EXACT_SPACE = 10_000_000
+
+KINDS = ("exact", "vectorized", "interpreter")
+
+
+@dataclass(frozen=True)
+class Shape:
+    """Bounds on the values of an expression, None where unknown.
+
+    Numbers are integers from LOW to HIGH, and collections hold at most
+    LONGEST of them, and at least SHORTEST. CONSTANT numbers are the same on every roll, and known
+    before rolling, as the batch evaluator needs for dice counts and sizes.
+    """
+
+    low: Optional[int] = None
+    high: Optional[int] = None
+    collection: bool = False
+    longest: Optional[int] = None
+    constant: bool = False
+    shortest: int = 0
+
+    @property
+    def outcomes(self) -> Optional[int]:
+        """Number of distinct values, or None if not known to be finite."""
+        if self.low is None or self.high is None:
+            return None
+        values = max(self.high - self.low + 1, 1)
+        if not self.collection:
+            return values
+        if self.longest is None:
+            return None
+        # Sorted collections of SHORTEST to LONGEST values, comb(n + values - 1, n) of each length n.
+        if self.shortest > self.longest:
+            return 0
+        fewer = math.comb(self.shortest - 1 + values, self.shortest - 1) if self.shortest > 0 else 0
+        return math.comb(self.longest + values, self.longest) - fewer
+
+
+NUMBER = Shape()
+
+
+def number(low: Optional[int], high: Optional[int]) -> Shape:
+    return Shape(low, high)
+
+
+def elements(shape: Shape) -> Shape:
+    """Shape of the values of a collection, or of a number."""
+    return Shape(shape.low, shape.high)
+
+
+def length(shape: Shape) -> Optional[int]:
+    """Longest length of a collection, 1 for numbers."""
+    return shape.longest if shape.collection else 1
+
+
+def shortest(shape: Shape) -> int:
+    """Shortest length of a collection, 1 for numbers."""
+    return shape.shortest if shape.collection else 1
+
+
+def add(*values: Optional[int]) -> Optional[int]:
+    return None if any(v is None for v in values) else sum(values)  # type: ignore[arg-type]
+
+
+def multiply(*values: Optional[int]) -> Optional[int]:
+    return None if any(v is None for v in values) else math.prod(values)  # type: ignore[arg-type]
+
+
+def join(left: Shape, right: Shape) -> Shape:
+    """Shape of a value that is either LEFT or RIGHT."""
+    low = None if left.low is None or right.low is None else min(left.low, right.low)
+    high = None if left.high is None or right.high is None else max(left.high, right.high)
+    if not (left.collection or right.collection):
+        return number(low, high)
+    longest = None if None in (length(left), length(right)) else max(length(left), length(right))  # type: ignore[type-var]
+    return Shape(low, high, True, longest, shortest=min(shortest(left), shortest(right)))
+
+
+def collection(values: Shape, longest: Optional[int], least: int = 0) -> Shape:
+    """Shape of collections of VALUES, holding LEAST to LONGEST of them."""
+    return Shape(values.low, values.high, True, longest, shortest=least)
+
+
+def corners(left: Shape, right: Shape, operation) -> Shape:
+    """Interval of OPERATION over two intervals, from its values at their corners."""
+    if None in (left.low, left.high, right.low, right.high):
+        return NUMBER
+    values = [operation(a, b) for a in (left.low, left.high) for b in (right.low, right.high)]
+    return number(min(values), max(values))
+
+
+@dataclass(frozen=True)
+class Analysis:
+    """What engines can run a program, found before running it.
+
+    EXACT - the calculator supports every construct of the program
+    VECTORIZABLE - roll_many can roll every trial at once
+    SHAPE - bounds on the result of the last statement
+    SPACE - most outcomes the calculator enumerates at once, None if unknown
+    REASONS - why the program is not exact, or not vectorizable
+    """
+
+    exact: bool
+    vectorizable: bool
+    shape: Shape = NUMBER
+    space: Optional[int] = None
+    reasons: Tuple[str, ...] = ()
+
+    @property
+    def outcomes(self) -> Optional[int]:
+        """Number of distinct results, or None if unknown."""
+        return self.shape.outcomes
+
+    @property
+    def calculable(self) -> bool:
+        """Whether the exact distribution should be calculated, rather than estimated."""
+        return self.exact and (self.space is None or self.space <= EXACT_SPACE)
+
+    @property
+    def kind(self) -> str:
+        """The fastest engine for the distribution of the program, one of KINDS."""
+        if self.calculable:
+            return "exact"
+        if self.vectorizable:
+            return "vectorized"
+        return "interpreter"
+
+
+class Analyzer(expression.ExpressionVisitor[Shape], statement.StatementVisitor[Shape]):
+    """Find the shapes of expressions, and what engines can evaluate them."""
+
+    variables: ChainMap[str, Shape]
+    functions: Dict[str, Union[statement.Function, statement.Compositional]]
+
+    # Functions being analyzed, whose calls are recursive.
+    calling: Set[str]
+
+    # Outcomes of the variables in scope, which the calculator enumerates together.
+    scale: Optional[int]
+    space: Optional[int]
+
+    inexact: List[str]
+    scalar: List[str]
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        # Analyzing does not roll any dice.
+        self.variables = ChainMap({})
+        self.functions = {}
+        self.calling = set()
+        self.scale = 1
+        self.space = 1
+        self.inexact = []
+        self.scalar = []
+
+    def __repr__(self):
+        return "<Analyzer >"
+
+    def analyze(self, statements: Sequence[Union[expression.Expression, statement.Statement]]) -> Analysis:
+        self.variables = ChainMap({})
+        self.functions = {}
+        self.calling = set()
+        self.scale = 1
+        self.space = 1
+        self.inexact = []
+        self.scalar = []
+
+        # Functions are declared before anything runs, like in the calculator.
+        for stmt in statements:
+            if isinstance(stmt, statement.Function):
+                stmt.accept(self)
+
+        if len(statements) != 1:
+            self.not_vectorizable("Only single expressions are rolled in batches")
+
+        shape = self.sequence([stmt for stmt in statements if not isinstance(stmt, statement.Function)])
+        self.enumerate(shape)
+
+        return Analysis(
+            exact=not self.inexact,
+            vectorizable=not self.scalar,
+            shape=shape,
+            space=self.space,
+            reasons=tuple(dict.fromkeys(self.inexact + self.scalar)),
+        )
+
+    def not_exact(self, reason: str):
+        self.inexact.append(reason)
+
+    def not_vectorizable(self, reason: str):
+        self.scalar.append(reason)
+
+    def enumerate(self, shape: Shape):
+        """Count the outcomes of SHAPE, for every combination of the variables in scope."""
+        space = multiply(self.scale, shape.outcomes)
+        self.space = None if space is None or self.space is None else max(self.space, space)
+
+    def bind(self, name: Optional[Union[str, int, float]], shape: Shape):
+        """Bind NAME to SHAPE, for the rest of the scope, enumerating its values."""
+        self.enumerate(shape)
+        self.scale = multiply(self.scale, shape.outcomes)
+        if isinstance(name, str):
+            self.variables[name] = shape
+
+    def scoped(self, statements: Sequence[expression.Expression]) -> Shape:
+        """Shape of the last of STATEMENTS, in a scope of their own."""
+        scale = self.scale
+        self.variables = self.variables.new_child()
+        try:
+            return self.sequence(statements)
+        finally:
+            self.variables = self.variables.parents
+            self.scale = scale
+
+    def sequence(self, statements: Sequence[Union[expression.Expression, statement.Statement]]) -> Shape:
+        shape = NUMBER
+        for stmt in statements:
+            shape = stmt.accept(self)
+        return shape
+
+    def visit_Literal_Expression(self, expr: expression.Literal) -> Shape:
+        if isinstance(expr.value, int):
+            return Shape(expr.value, expr.value, constant=True)
+        if isinstance(expr.value, float):
+            return Shape(constant=True)
+
+        self.not_vectorizable("Only numbers can be vectorized")
+        if expr.value is None:
+            self.not_exact("None value not supported for calculation")
+        else:
+            self.not_exact("Text is not supported for calculation")
+        return NUMBER
+
+    def visit_Variable_Expression(self, expr: expression.Variable) -> Shape:
+        if expr.name.literal not in self.variables:
+            self.not_vectorizable(f"Undefined variable {expr.name.literal}")
+            return NUMBER
+        return self.variables[expr.name.literal]  # type: ignore[index]
+
+    def visit_Assign_Expression(self, expr: expression.Assign) -> Shape:
+        self.bind(expr.name.literal, expr.value.accept(self))
+        return NUMBER
+
+    def visit_Grouping_Expression(self, expr: expression.Grouping) -> Shape:
+        return expr.expression.accept(self)
+
+    def visit_Block_Expression(self, expr: expression.Block) -> Shape:
+        return self.scoped(expr.statements)
+
+    def visit_Pair_Expression(self, expr: expression.Pair) -> Shape:
+        expr.first.accept(self)
+        expr.second.accept(self)
+        self.not_vectorizable("Pair can not be vectorized")
+        return NUMBER
+
+    def visit_List_Expression(self, expr: expression.List) -> Shape:
+        values: Optional[Shape] = None
+        longest: Optional[int] = 0
+        least = 0
+        for value in expr.value:
+            item = value.accept(self)
+            values = elements(item) if values is None else join(values, elements(item))
+            longest = add(longest, length(item))
+            least += shortest(item)
+        return collection(values or number(0, 0), longest, least)
+
+    def visit_Unary_Expression(self, expr: expression.Unary) -> Shape:
+        token_type = expr.operator.token_type
+        right = expr.right.accept(self)
+
+        if token_type == TokenType.DICE:
+            if not right.constant or right.collection:
+                self.not_vectorizable("Dice size must be a constant integer")
+            start = 0 if expr.operator.lexeme == "z" else 1
+            return number(start, right.high)
+
+        if token_type == TokenType.MINUS:
+            if right.collection:
+                self.not_vectorizable("Negated collections can not be vectorized")
+            shape = number(None if right.high is None else -right.high, None if right.low is None else -right.low)
+            return replace(shape, constant=right.constant)
+
+        if token_type == TokenType.SUM:
+            if not right.collection:
+                return right
+            low = None if right.low is None else min(0, right.low * (right.longest or 0))
+            high = None if right.high is None else max(0, right.high * (right.longest or 0))
+            return number(low, high) if right.longest is not None else NUMBER
+
+        if token_type == TokenType.COUNT:
+            if not right.collection:
+                self.not_vectorizable("Count of a number can not be vectorized")
+            return number(0, length(right))
+
+        if token_type not in (TokenType.MIN, TokenType.MAX) or not right.collection:
+            self.not_vectorizable(f"Unary {token_type} can not be vectorized")
+
+        if token_type in (TokenType.MIN, TokenType.MAX, TokenType.MEDIAN, TokenType.CHOOSE):
+            return elements(right)
+
+        if token_type in (TokenType.MINIMAL, TokenType.MAXIMAL, TokenType.DIFFERENT):
+            return collection(right, length(right))
+
+        if token_type == TokenType.SIGN:
+            return number(-1, 1)
+
+        if token_type in (TokenType.PROBABILITY, TokenType.NOT):
+            # 1, or an empty collection.
+            return collection(number(1, 1), 1)
+
+        return NUMBER
+
+    def visit_Binary_Expression(self, expr: expression.Binary) -> Shape:
+        token_type = expr.operator.token_type
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+
+        if token_type == TokenType.DEFAULT:
+            self.not_vectorizable("Default can not be vectorized")
+            return join(left, right)
+
+        if token_type == TokenType.DICE:
+            if not (left.constant and right.constant):
+                self.not_vectorizable("Dice count and size must be constant integers")
+            start = 0 if expr.operator.lexeme == "z" else 1
+            return collection(number(start, right.high), left.high, max(left.low or 0, 0))
+
+        if token_type in (TokenType.LARGEST, TokenType.LEAST, TokenType.PICK):
+            if token_type == TokenType.PICK:
+                self.not_vectorizable("Pick can not be vectorized")
+            elif not left.constant or not right.collection:
+                self.not_vectorizable("Selection count must be a constant integer")
+            longest = length(right)
+            if left.high is not None:
+                longest = left.high if longest is None else min(left.high, longest)
+            return collection(right, longest, min(max(left.low or 0, 0), shortest(right)))
+
+        if token_type == TokenType.SAMPLES:
+            if not left.constant:
+                self.not_vectorizable("Sample count must be a constant integer")
+            return collection(right, multiply(left.high, length(right)), max(left.low or 0, 0) * shortest(right))
+
+        if token_type == TokenType.UNION:
+            return collection(
+                join(elements(left), elements(right)), add(length(left), length(right)), shortest(left) + shortest(right)
+            )
+
+        if token_type == TokenType.RANGE:
+            if not (left.constant and right.constant):
+                self.not_vectorizable("Range bounds must be constant integers")
+            longest = None if right.high is None or left.low is None else max(right.high - left.low + 1, 0)
+            least = 0 if right.low is None or left.high is None else max(right.low - left.high + 1, 0)
+            return collection(number(left.low, right.high), longest, least)
+
+        if token_type in COMPARISON_OPERATORS:
+            if left.collection:
+                self.not_vectorizable("Comparisons with a collection on the left can not be vectorized")
+            return collection(right, length(right))
+
+        if token_type in (TokenType.DROP, TokenType.KEEP, TokenType.MINUSMINUS):
+            self.not_vectorizable(f"Binary {token_type} can not be vectorized")
+            return collection(left, length(left))
+
+        if token_type in CALC_OPERATORS:
+            left, right = elements(left), elements(right)
+            constant = left.constant and right.constant
+            if token_type == TokenType.DIVIDE:
+                if right.low is None or right.high is None or right.low <= 0 <= right.high:
+                    return Shape(constant=constant)
+                return replace(corners(left, right, lambda a, b: a // b), constant=constant)
+            return replace(corners(left, right, CALC_OPERATORS[token_type]), constant=constant)
+
+        self.not_vectorizable(f"Binary {token_type} can not be vectorized")
+        return join(left, right)
+
+    def visit_Conditional_Expression(self, stmt: expression.Conditional) -> Shape:
+        stmt.condition.accept(self)
+        truth = stmt.truth.accept(self)
+        falsy = stmt.falsy.accept(self)
+        if truth.collection or falsy.collection:
+            self.not_vectorizable("Conditionals with collection results can not be vectorized")
+        return join(truth, falsy)
+
+    def visit_Foreach_Expression(self, expr: expression.Foreach) -> Shape:
+        self.not_vectorizable("Foreach can not be vectorized")
+        source = expr.source.accept(self)
+
+        scale = self.scale
+        self.enumerate(source)
+        self.variables = self.variables.new_child()
+        try:
+            self.bind(expr.iterator.name.literal, elements(source))
+            block = expr.block.accept(self)
+        finally:
+            self.variables = self.variables.parents
+            self.scale = scale
+
+        return collection(elements(block), multiply(length(source), length(block)))
+
+    def visit_Repeat_Expression(self, stmt: expression.Repeat) -> Shape:
+        self.not_vectorizable("Repeat can not be vectorized")
+        name = stmt.action.name.literal
+        names = free_variables(stmt.action.value)
+        if names is None or name in names:
+            self.not_exact("Repeat where each roll depends on the previous")
+
+        self.variables = self.variables.new_child()
+        scale = self.scale
+        try:
+            stmt.action.accept(self)
+            stmt.qualifier.accept(self)
+            return self.variables.get(name, NUMBER)  # type: ignore[arg-type]
+        finally:
+            self.variables = self.variables.parents
+            self.scale = scale
+
+    def visit_Accumulate_Expression(self, stmt: expression.Accumulate) -> Shape:
+        self.not_vectorizable("Accumulate can not be vectorized")
+        self.not_exact("Accumulate has no finite distribution")
+
+        self.variables = self.variables.new_child()
+        scale = self.scale
+        try:
+            stmt.action.accept(self)
+            stmt.qualifier.accept(self)
+            values = self.variables.get(stmt.action.name.literal, NUMBER)  # type: ignore[arg-type]
+        finally:
+            self.variables = self.variables.parents
+            self.scale = scale
+        return collection(elements(values), None)
+
+    def visit_Call_Expression(self, expr: expression.Call) -> Shape:
+        self.not_vectorizable("Call can not be vectorized")
+        arguments = [parameter.accept(self) for parameter in expr.parameters]
+
+        name = expr.name.literal
+        stmt = expr.function if expr.function is not None else self.functions.get(name)  # type: ignore[arg-type]
+
+        if isinstance(stmt, statement.Compositional):
+            return self.compositional(stmt)
+
+        if not isinstance(stmt, statement.Function) or not isinstance(stmt.expression, expression.Expression):
+            return NUMBER
+
+        if name in self.calling:
+            # Whether recursion ends is only found out by running it.
+            self.space = None
+            return NUMBER
+
+        self.calling.add(name)  # type: ignore[arg-type]
+        variables, scale = self.variables, self.scale
+        self.variables = ChainMap({})
+        try:
+            for parameter, argument in zip(stmt.parameters, arguments):
+                self.bind(parameter.literal, argument)
+            return stmt.expression.accept(self)
+        finally:
+            self.variables, self.scale = variables, scale
+            self.calling.discard(name)  # type: ignore[arg-type]
+
+    def compositional(self, stmt: statement.Compositional) -> Shape:
+        singleton, union = stmt.singleton, stmt.union
+        if isinstance(singleton, Token) and singleton.token_type in RANDOM_UNARY:
+            self.not_exact(f"{singleton.token_type} as operator of compositional")
+        for operator in (singleton, union):
+            if isinstance(operator, Token) and isinstance(self.functions.get(operator.literal), statement.Compositional):  # type: ignore[arg-type]
+                self.not_exact("Compositional used as operator of compositional")
+        return NUMBER
+
+    def visit_Function_Statement(self, stmt: statement.Function) -> Shape:
+        self.not_vectorizable("Function can not be vectorized")
+        if isinstance(stmt.name.literal, str):
+            self.functions[stmt.name.literal] = stmt
+        return NUMBER
+
+    def visit_Compositional_Statement(self, stmt: statement.Compositional) -> Shape:
+        self.not_vectorizable("Compositional can not be vectorized")
+        if isinstance(stmt.name.literal, str):
+            self.functions[stmt.name.literal] = stmt
+        return NUMBER
+
+    def visit_Print_Statement(self, stmt: statement.Print) -> Shape:
+        self.not_vectorizable("Text can not be vectorized")
+        self.not_exact("Text is not supported for calculation")
+        stmt.expression.accept(self)
+        return NUMBER
+
+    def visit_TextAlign_Expression(self, expr: expression.TextAlign) -> Shape:
+        self.not_vectorizable("Text can not be vectorized")
+        self.not_exact("Text is not supported for calculation")
+        expr.left.accept(self)
+        expr.right.accept(self)
+        return NUMBER
+
+
+def analysis_lines(analysis: Analysis) -> List[str]:
+    """Analysis of a program, as shown by trill --analyze."""
+
+    def count(value: Optional[int]) -> str:
+        return "unknown" if value is None else str(value)
+
+    lines = [
+        f"Engine: {analysis.kind}",
+        f"Exact: {'yes' if analysis.exact else 'no'}",
+        f"Vectorizable: {'yes' if analysis.vectorizable else 'no'}",
+        f"Outcomes: {count(analysis.outcomes)}",
+        f"Space: {count(analysis.space)}",
+    ]
+    lines += [f"- {reason}" for reason in analysis.reasons]
+    return lines
+
+
+def analyze(statements: Sequence[Union[expression.Expression, statement.Statement]]) -> Analysis:
+    """Analyze STATEMENTS, before running them."""
+    return Analyzer().analyze(statements)
@@ -1,8 +1,15 @@
-"""Base AST classes and types."""
-import sys
+"""Base AST classes and types.
+
+Nodes are frozen dataclasses, slotted where Python supports it, and are
+hashed by identity, so they can be used as keys of caches. Each node class
+looks up the name of its visit method once, when the class is created.
+"""
 from dataclasses import dataclass
 import random
-from typing import Any, Optional, TypeVar, Generic
+import sys
+from typing import Any, ClassVar, Optional, TypeVar, Generic
+
+from trill.types import RandomSource
 
 T = TypeVar("T")
 
@@ -14,25 +21,37 @@ class UnknownNodeType(Exception):
 class Visitor(Generic[T]):
     """Visitor base class."""
 
-    def __init__(self, seed: Optional[int] = None):
-        if seed is None:
-            seed = random.randrange(sys.maxsize)
-        random.seed(seed)
+    random: RandomSource
+
+    def __init__(self, seed: Optional[int] = None, rng: Optional[RandomSource] = None):
+        """Create a visitor rolling dice with RNG, or with its own generator seeded with SEED."""
+        self.random = rng if rng is not None else random.Random(seed)
 
     def visit_generic(self, node: "Node"):
         """Visit a generic node."""
         raise UnknownNodeType(f"No visit_{type(node).__name__} method")
 
 
-@dataclass
+if sys.version_info >= (3, 10):
+    node = dataclass(frozen=True, eq=False, slots=True)
+else:  # pragma: no cover
+    node = dataclass(frozen=True, eq=False)
+
+
+@node
 class Node:
     """Node base class."""
 
+    # Name of the visit method, visit_<class>_<base class>.
+    visit_method: ClassVar[str] = "visit_Node"
+
+    # No super() call: slotted dataclasses are copies of the class they are made from.
+    def __init_subclass__(cls):
+        cls.visit_method = f"visit_{cls.__name__}_{cls.__bases__[0].__name__}"
+
     def accept(self, visitor: Visitor[Any]):
         """Accept visitor."""
-        method_name = "visit_" + type(self).__name__ + "_" + type(self).__bases__[0].__name__
-        visitor_function = getattr(visitor, method_name)
-        return visitor_function(self)
+        return getattr(visitor, self.visit_method)(self)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} />"
@@ -1,108 +1,109 @@
 """Expression base code."""
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Union, List as TList
+from typing import TYPE_CHECKING, Optional, Union, List as TList
 
 from ..tokens import Token
 
-from .base import T, Visitor, Node
+from .base import T, Visitor, Node, node
 
 if TYPE_CHECKING:
-    from trill.ast.statement import Statement
+    from trill.ast.statement import Function, Statement
 
 
 class ExpressionVisitor(Visitor[T]):
     ...
 
 
-@dataclass
+@node
 class Expression(Node):
     ...
 
 
-@dataclass
+@node
 class Binary(Expression):
     left: Expression
     operator: Token
     right: Expression
 
 
-@dataclass
+@node
 class TextAlign(Expression):
     left: Expression
     operator: Token
     right: Union[Expression, "Statement"]
 
 
-@dataclass
+@node
 class Grouping(Expression):
     expression: Expression
 
 
-@dataclass
+@node
 class Block(Expression):
     statements: TList[Expression]
 
 
-@dataclass
+@node
 class List(Expression):
     value: TList[Expression]
 
 
-@dataclass
+@node
 class Pair(Expression):
     first: Expression
     second: Expression
 
 
-@dataclass
+@node
 class Literal(Expression):
     value: Union[int, float, str, None]
 
 
-@dataclass
+@node
 class Unary(Expression):
     operator: Token
     right: Expression
 
 
-@dataclass
+@node
 class Variable(Expression):
     name: Token
 
 
-@dataclass
+@node
 class Assign(Expression):
     name: Token
     value: Expression
 
 
-@dataclass
+@node
 class Conditional(Expression):
     condition: Expression
     truth: Expression
     falsy: Expression
 
 
-@dataclass
+@node
 class Repeat(Expression):
     condition: Token
     action: Assign
     qualifier: Expression
 
 
-@dataclass
+@node
 class Accumulate(Expression):
     action: Assign
     qualifier: Expression
 
 
-@dataclass
+@node
 class Call(Expression):
     name: Token
     parameters: TList["Expression"]
+    # The declaration called, if resolved before running, else looked up by name.
+    function: Optional["Function"] = None
 
 
-@dataclass
+@node
 class Foreach(Expression):
     iterator: Variable
     source: Expression
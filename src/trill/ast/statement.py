@@ -1,8 +1,7 @@
 """Statements."""
-from dataclasses import dataclass
 from typing import Any, List, Union
 
-from .base import T, Visitor, Node
+from .base import T, Visitor, Node, node
 from ..tokens import Token
 from .expression import Expression, Literal
 
@@ -11,19 +10,19 @@ class StatementVisitor(Visitor[T]):
     ...
 
 
-@dataclass
+@node
 class Statement(Node):
     ...
 
 
-@dataclass
+@node
 class Function(Statement):
     name: Token
     parameters: List[Token]
     expression: Union[Statement, "Expression"]
 
 
-@dataclass
+@node
 class Compositional(Statement):
     name: Token
     empty: Literal
@@ -31,7 +30,7 @@ class Compositional(Statement):
     union: Union[Statement, "Expression", Token]
 
 
-@dataclass
+@node
 class Print(Statement):
     expression: Any
     repeats: int = 1
@@ -0,0 +1,326 @@
+"""Bulk rolling of a single Troll expression.
+
+The expression is evaluated once over arrays holding every trial, using
+NumPy. Rolls using constructs that can not be vectorized, found by the
+analysis of the program or while evaluating, fall back to rolling each
+trial with the closure compiler.
+"""
+from typing import Any, List, NamedTuple, Optional, Union
+
+from .ast import expression
+from .ast import statement
+from .compiler import ClosureInterpreter
+from .functions import CALC_OPERATORS, COMPARISON_OPERATORS
+from .limits import Guard
+from .program import compile_roll
+from .scope import Scope
+from .tokens import TokenType
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore
+
+
+class NotVectorizable(Exception):
+    """Expression can not be evaluated for all trials at once."""
+
+
+class Collection(NamedTuple):
+    """A collection per trial, as an (n, k) array.
+
+    Where collections differ in length between trials, MASK marks which
+    elements are present.
+    """
+
+    values: Any
+    mask: Any = None
+
+
+Constant = Union[int, float]
+Vector = Union[Constant, Any, Collection]
+
+
+class BatchEvaluator(expression.ExpressionVisitor[Vector], statement.StatementVisitor[Vector]):
+    """Evaluate expressions for N trials at once.
+
+    A guard, if given, checks the length of each trial's collections, and
+    the time as dice are rolled.
+    """
+
+    variables: Scope
+
+    guard: Optional[Guard] = None
+
+    def __init__(self, trials: int, seed: Optional[int] = None, average: bool = False):  # pylint: disable=super-init-not-called
+        self.trials = trials
+        self.average = average
+        self.generator = np.random.default_rng(seed)
+        self.variables = Scope()
+
+    def evaluate(self, stmt: Union[expression.Expression, statement.Statement]):
+        """Evaluate STMT, returning one result per trial."""
+        value = stmt.accept(self)
+
+        if value is None:
+            raise NotVectorizable("Expression has no value")
+
+        if isinstance(value, Collection):
+            if value.mask is None:
+                return value.values
+            return [row[present].tolist() for row, present in zip(value.values, value.mask)]
+
+        if isinstance(value, (int, float)):
+            return np.full(self.trials, value)
+
+        return value
+
+    def as_collection(self, value: Vector) -> Collection:
+        if isinstance(value, Collection):
+            return value
+        if isinstance(value, (int, float)):
+            return Collection(np.full((self.trials, 1), value))
+        return Collection(value[:, None])
+
+    def mask_of(self, collection: Collection):
+        if collection.mask is None:
+            return np.ones(collection.values.shape, dtype=bool)
+        return collection.mask
+
+    def first(self, value: Vector):
+        """First element of collections, the way arithmetic operators see them."""
+        if not isinstance(value, Collection):
+            return value
+
+        if value.mask is None:
+            if value.values.shape[1] == 0:
+                raise NotVectorizable("Arithmetic on empty collection")
+            return value.values[:, 0]
+
+        if not value.mask.any(axis=1).all():
+            raise NotVectorizable("Arithmetic on empty collection")
+        index = value.mask.argmax(axis=1)
+        return np.take_along_axis(value.values, index[:, None], axis=1)[:, 0]
+
+    def constant_int(self, value: Vector, name: str) -> int:
+        if not isinstance(value, int):
+            raise NotVectorizable(f"{name} must be a constant integer")
+        return value
+
+    def roll(self, sides: int, count: int, start: int):
+        if self.average:
+            return np.full((self.trials, count), (sides + start) / 2)
+        return self.generator.integers(start, sides + 1, size=(self.trials, count))
+
+    def check_length(self, size: int, node: Any):
+        if self.guard is not None:
+            self.guard.length(size, node)
+            self.guard.check(node)
+
+    def union(self, left: Collection, right: Collection) -> Collection:
+        values = np.concatenate([left.values, right.values], axis=1)
+        if left.mask is None and right.mask is None:
+            return Collection(values)
+        return Collection(values, np.concatenate([self.mask_of(left), self.mask_of(right)], axis=1))
+
+    def select(self, count: int, collection: Collection, largest: bool) -> Collection:
+        """Keep the COUNT largest or least values of each collection."""
+        values = collection.values
+
+        if collection.mask is None:
+            ordered = np.sort(values, axis=1)
+            if largest:
+                ordered = ordered[:, ::-1]
+            return Collection(ordered[:, :count])
+
+        limits = np.iinfo(values.dtype) if np.issubdtype(values.dtype, np.integer) else np.finfo(values.dtype)
+        filled = np.where(collection.mask, values, limits.min if largest else limits.max)
+        order = np.argsort(filled, axis=1, kind="stable")
+        if largest:
+            order = order[:, ::-1]
+        order = order[:, :count]
+
+        return Collection(
+            np.take_along_axis(values, order, axis=1),
+            np.take_along_axis(collection.mask, order, axis=1),
+        )
+
+    def visit_Literal_Expression(self, expr: expression.Literal) -> Vector:
+        if not isinstance(expr.value, (int, float)):
+            raise NotVectorizable("Only numbers can be vectorized")
+        return expr.value
+
+    def visit_Grouping_Expression(self, expr: expression.Grouping) -> Vector:
+        return expr.expression.accept(self)
+
+    def visit_List_Expression(self, expr: expression.List) -> Vector:
+        output = Collection(np.zeros((self.trials, 0), dtype=np.int64))
+        for value in expr.value:
+            output = self.union(output, self.as_collection(value.accept(self)))
+        return output
+
+    def visit_Unary_Expression(self, expr: expression.Unary) -> Vector:
+        token_type = expr.operator.token_type
+        right = expr.right.accept(self)
+
+        if token_type == TokenType.DICE:
+            start = 0 if expr.operator.lexeme == "z" else 1
+            sides = self.constant_int(right, "Dice size")
+            self.check_length(1, expr.operator)
+            return self.roll(sides, 1, start)[:, 0]
+
+        if token_type == TokenType.MINUS and not isinstance(right, Collection):
+            return -right
+
+        if token_type == TokenType.SUM:
+            if not isinstance(right, Collection):
+                return right
+            if right.mask is None:
+                return right.values.sum(axis=1)
+            return np.where(right.mask, right.values, 0).sum(axis=1)
+
+        if token_type == TokenType.COUNT and isinstance(right, Collection):
+            if right.mask is None:
+                return np.full(self.trials, right.values.shape[1])
+            return right.mask.sum(axis=1)
+
+        if token_type in (TokenType.MIN, TokenType.MAX) and isinstance(right, Collection):
+            if right.mask is not None or right.values.shape[1] == 0:
+                raise NotVectorizable(f"{token_type} of collection that may be empty")
+            if token_type == TokenType.MIN:
+                return right.values.min(axis=1)
+            return right.values.max(axis=1)
+
+        raise NotVectorizable(f"Unary {token_type}")
+
+    def visit_Binary_Expression(self, expr: expression.Binary) -> Vector:
+        token_type = expr.operator.token_type
+
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+
+        if token_type == TokenType.DICE:
+            start = 0 if expr.operator.lexeme == "z" else 1
+            count = self.constant_int(left, "Dice count")
+            sides = self.constant_int(right, "Dice size")
+            self.check_length(count, expr.operator)
+            return Collection(self.roll(sides, max(count, 0), start))
+
+        if token_type in (TokenType.LARGEST, TokenType.LEAST):
+            count = self.constant_int(left, "Selection count")
+            if count < 0 or not isinstance(right, Collection):
+                raise NotVectorizable(f"Selection of {count} from {type(right)}")
+            return self.select(count, right, token_type == TokenType.LARGEST)
+
+        if token_type == TokenType.SAMPLES:
+            count = max(self.constant_int(left, "Sample count"), 0)
+            collection = self.as_collection(right)
+            self.check_length(count * collection.values.shape[1], expr.operator)
+            return Collection(
+                np.tile(collection.values, (1, count)),
+                None if collection.mask is None else np.tile(collection.mask, (1, count)),
+            )
+
+        if token_type == TokenType.UNION:
+            left, right = self.as_collection(left), self.as_collection(right)
+            self.check_length(left.values.shape[1] + right.values.shape[1], expr.operator)
+            return self.union(left, right)
+
+        if token_type == TokenType.RANGE:
+            low = self.constant_int(left, "Range start")
+            high = self.constant_int(right, "Range end")
+            self.check_length(high - low + 1, expr.operator)
+            return Collection(np.broadcast_to(np.arange(low, high + 1), (self.trials, max(high - low + 1, 0))))
+
+        if token_type in COMPARISON_OPERATORS:
+            if isinstance(left, Collection):
+                raise NotVectorizable("Comparison with collection on the left")
+            collection = self.as_collection(right)
+            check = COMPARISON_OPERATORS[token_type]
+            threshold = left if isinstance(left, (int, float)) else left[:, None]
+            return Collection(collection.values, self.mask_of(collection) & check(threshold, collection.values))
+
+        if token_type in CALC_OPERATORS:
+            left = self.first(left)
+            right = self.first(right)
+            if token_type == TokenType.DIVIDE and np.any(np.asarray(right) == 0):
+                raise NotVectorizable("Division by zero")
+            return CALC_OPERATORS[token_type](left, right)
+
+        raise NotVectorizable(f"Binary {token_type}")
+
+    def visit_Block_Expression(self, expr: expression.Block) -> Vector:
+        val: Optional[Vector] = None
+        self.variables.push()
+        for stmt in expr.statements:
+            val = stmt.accept(self)
+        self.variables.pop()
+        return val
+
+    def visit_Assign_Expression(self, expr: expression.Assign) -> Optional[Vector]:
+        if not isinstance(expr.name.literal, str):
+            raise TypeError("Variable name must be string")
+
+        self.variables[expr.name.literal] = expr.value.accept(self)
+        return None
+
+    def visit_Variable_Expression(self, expr: expression.Variable) -> Vector:
+        if expr.name.literal not in self.variables:
+            raise NotVectorizable(f"Undefined variable {expr.name.literal}")
+        return self.variables[expr.name.literal]
+
+    def visit_Conditional_Expression(self, stmt: expression.Conditional) -> Vector:
+        condition = stmt.condition.accept(self)
+        truth = stmt.truth.accept(self)
+        falsy = stmt.falsy.accept(self)
+
+        if isinstance(truth, Collection) or isinstance(falsy, Collection):
+            raise NotVectorizable("Conditional with collection result")
+
+        if isinstance(condition, Collection):
+            holds = self.mask_of(condition).any(axis=1)
+        else:
+            holds = np.asarray(condition) != 0
+
+        return np.where(holds, truth, falsy)
+
+    def not_vectorizable(self, node: Any) -> Vector:
+        raise NotVectorizable(type(node).__name__)
+
+    visit_Pair_Expression = not_vectorizable
+    visit_Foreach_Expression = not_vectorizable
+    visit_Repeat_Expression = not_vectorizable
+    visit_Accumulate_Expression = not_vectorizable
+    visit_Call_Expression = not_vectorizable
+    visit_TextAlign_Expression = not_vectorizable
+    visit_Function_Statement = not_vectorizable
+    visit_Compositional_Statement = not_vectorizable
+    visit_Print_Statement = not_vectorizable
+
+
+def roll_many(source: str, n: int, seed: Optional[int] = None, average: bool = False) -> List[Any]:
+    """Roll SOURCE N times, returning [results, errors].
+
+    When the roll can be vectorized, results is a NumPy array, with shape
+    (n,) for single values and (n, k) for collections of the same size in
+    every trial. Otherwise results is a list with the result of each trial.
+    Only the value of the last statement of SOURCE is kept.
+    """
+    program = compile_roll(source)
+
+    if program.errors:
+        return [None, list(program.errors)]
+
+    if not program.statements:
+        # Nothing to roll, like trill().
+        return [[], []]
+
+    if np is not None and len(program.statements) == 1 and program.analysis.vectorizable:
+        try:
+            return [BatchEvaluator(n, seed, average).evaluate(program.statements[-1]), []]
+        except NotVectorizable:
+            pass
+
+    interpreter = ClosureInterpreter(seed)
+    closures = program.closures
+    return [[interpreter.run(closures, average)[-1] for _ in range(n)], []]
@@ -0,0 +1,203 @@
+"""Benchmarks of the tokenizer, parser, interpreter and calculator.
+
+Each stage is timed over corpora of rolls: the test cases, when the tests
+are installed, and larger synthetic programs. Results can be written as
+JSON and compared against results from an earlier commit:
+
+    python -m trill.bench --output before.json
+    python -m trill.bench --compare before.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from .calculator import Calculator
+from .error import ErrorHandler
+from .interpreter import Interpreter
+from .parser import Parser
+from .tokenizer import Tokenizer
+
+STAGES = ("tokenize", "parse", "interpret", "calculate")
+
+# Slowdown, as a fraction, reported as a regression when comparing.
+THRESHOLD = 0.1
+
+SYNTHETIC_ROLLS = [
+    " + ".join(["d6"] * 300),
+    "\n".join(f"sum {count}d{sides}" for count in range(1, 20) for sides in (4, 6, 8, 10, 12, 20)),
+    "sum (foreach x in 1..200 do sum x d6)",
+    "sum (foreach x in 1..50 do if x > 25 then sum largest 3 (x d10) else sum least 2 (x d10))",
+    "function down(n) =\nx := d n;\nif x = 1 then 1 else x + call down(x)\n" + "\n".join(["call down(1000)"] * 50),
+    "count (accumulate x := d20 while x > 1)",
+    "x := 100d100; sum (largest 50 x) - sum (least 50 x)",
+    # A dice library, mostly function declarations. Names are letters only.
+    "\n".join(
+        f"\\ weapon {i}\nfunction weapon{chr(97 + i // 26)}{chr(97 + i % 26)}(n) = "
+        f"if n >= 20 then sum largest 2 (3d{i % 12 + 2}) + {i} else (x := d{i % 20 + 1}; x + n)"
+        for i in range(200)
+    )
+    + "\ncall weaponah(d20)",
+]
+
+SYNTHETIC_DISTRIBUTIONS = [
+    "sum 30d6",
+    "sum largest 3 10d6",
+    "sum least 5 20d10",
+    "count 5 < 30d10",
+    "x := d6; y := d8; if x > y then x * y else x + y",
+    "sum (3d6 U 2d8 U 4d4)",
+    "max 8d10",
+]
+
+
+class Corpus(NamedTuple):
+    """Rolls timed together. CALCULATE holds the rolls with exact distributions."""
+
+    name: str
+    rolls: Sequence[str]
+    calculate: Sequence[str]
+
+
+def corpora() -> List[Corpus]:
+    """The test cases, if the tests are installed, and the synthetic programs."""
+    output = []
+    try:
+        from .tests.cases import testcases  # pylint: disable=import-outside-toplevel
+        from .tests.probability_cases import testcases as probability_testcases  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        pass
+    else:
+        rolls = [case.roll for case in testcases if case.interpret_result]
+        output.append(Corpus("cases", rolls, [case.roll for case in probability_testcases]))
+
+    output.append(Corpus("synthetic", SYNTHETIC_ROLLS, SYNTHETIC_DISTRIBUTIONS))
+    return output
+
+
+def parse(roll: str) -> List[Any]:
+    errors = ErrorHandler()
+    statements = Parser(Tokenizer(roll, errors).scan_tokens(), errors).parse()
+    if errors.had_error:
+        raise ValueError(f"Can not benchmark {roll!r}: {errors.error_report}")
+    return statements
+
+
+def stage_runner(stage: str, corpus: Corpus) -> Callable[[], Any]:
+    """Function running STAGE once over the rolls of CORPUS, with the input of the stage prepared."""
+    if stage == "tokenize":
+        rolls = corpus.rolls
+        return lambda: [Tokenizer(roll, ErrorHandler()).scan_tokens() for roll in rolls]
+
+    if stage == "parse":
+        tokens = [Tokenizer(roll, ErrorHandler()).scan_tokens() for roll in corpus.rolls]
+        return lambda: [Parser(roll_tokens, ErrorHandler()).parse() for roll_tokens in tokens]
+
+    if stage == "interpret":
+        programs = [parse(roll) for roll in corpus.rolls]
+        return lambda: [Interpreter(seed=1).interpret(program) for program in programs]
+
+    if stage == "calculate":
+        programs = [parse(roll) for roll in corpus.calculate]
+        return lambda: [Calculator().interpret(program) for program in programs]
+
+    raise ValueError(f"Unknown stage {stage}, expected one of {', '.join(STAGES)}")
+
+
+def measure(run: Callable[[], Any], repeat: int, number: int) -> Dict[str, float]:
+    """Seconds per call of RUN, the best and mean of REPEAT rounds of NUMBER calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        times.append((time.perf_counter() - start) / number)
+    return {"best": min(times), "mean": sum(times) / len(times)}
+
+
+def benchmark(stages: Sequence[str] = STAGES, repeat: int = 5, number: int = 3) -> Dict[str, Any]:
+    """Time each stage over each corpus, returning results ready to be saved as JSON."""
+    results: Dict[str, Dict[str, float]] = {}
+    for corpus in corpora():
+        for stage in stages:
+            results[f"{corpus.name}/{stage}"] = measure(stage_runner(stage, corpus), repeat, number)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "number": number,
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = THRESHOLD) -> List[str]:
+    """Names of the benchmarks more than THRESHOLD slower than in BASELINE."""
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before and result["best"] > before["best"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def report(current: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None, threshold: float = THRESHOLD):
+    from rich.console import Console  # pylint: disable=import-outside-toplevel
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+    table = Table(title="Benchmarks")
+    table.add_column("Benchmark")
+    table.add_column("Best ms", justify="right")
+    table.add_column("Mean ms", justify="right")
+    if baseline is not None:
+        table.add_column("Before ms", justify="right")
+        table.add_column("Change", justify="right")
+
+    for name, result in current["results"].items():
+        row = [name, f"{result['best'] * 1000:.3f}", f"{result['mean'] * 1000:.3f}"]
+        before = baseline["results"].get(name) if baseline is not None else None
+        if before:
+            change = result["best"] / before["best"] - 1
+            style = "red" if change > threshold else "green" if change < -threshold else ""
+            row += [f"{before['best'] * 1000:.3f}", f"[{style}]{change:+.1%}[/{style}]" if style else f"{change:+.1%}"]
+        elif baseline is not None:
+            row += ["", ""]
+        table.add_row(*row)
+
+    Console().print(table)
+
+
+def main(arg_list: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the tokenizer, parser, interpreter and calculator.")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file")
+    parser.add_argument("-c", "--compare", help="Compare with results from this JSON file")
+    parser.add_argument("--stage", choices=STAGES, action="append", help="Stage to benchmark, may be repeated")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-n", "--number", type=int, default=3)
+    parser.add_argument("-t", "--threshold", type=float, default=THRESHOLD, help="Slowdown reported as a regression")
+    args = parser.parse_args(arg_list)
+
+    current = benchmark(args.stage or STAGES, args.repeat, args.number)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report(current, baseline, args.threshold)
+
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
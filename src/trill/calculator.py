@@ -1,67 +1,244 @@
-"""Probability calculator for Trill."""
+"""Probability calculator for Trill.
+
+Every expression is evaluated to the exact distribution of its outcomes,
+given the values of the variables in scope. Assignments are handled by
+evaluating the rest of the block once for each value the variable can
+take, so repeated uses of a variable are not treated as independent.
+
+Outcomes are numbers, sorted tuples for collections and PairOutcome for
+pairs. Distributions of subexpressions are memoized on the values of the
+variables they use.
+"""
+import dataclasses
 import itertools
 import math
-from typing import Any, ChainMap, Dict, List, Optional, TypeVar, Union
+from functools import lru_cache, partial
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple, TypeVar, Union
 from trill import functions
 
-from trill.tokens import TokenType
-from trill.types import Number, NumberList
+from trill.tokens import Token, TokenType
+from trill.distribution import DicePool, Distribution, KeepPool, PairOutcome, Pool, combine, mix, uniform
 
 from .ast import expression, statement
+from .ast.base import Node
+from .compiler import Runtime, binary_operation, constant
+from .error import InterpreterError
+from .limits import Guard
+from .profile import Profile, node_location
+from .purity import Purity
+from .scope import Scope
 
 T = TypeVar("T")
 
+RANDOM_UNARY = (TokenType.DICE, TokenType.CHOOSE, TokenType.PROBABILITY)
+
+
+class CalculationError(Exception):
+    """The distribution of NODE failed on one of its outcomes, like a division by zero."""
+
+    def __init__(self, message: str, node: Any = None):
+        super().__init__(message)
+        self.message = message
+        self.node = node
+
+    @property
+    def error(self) -> InterpreterError:
+        """The error to report, at the location of the node."""
+        location = node_location(self.node)
+        line, column = location if location is not None else (0, 0)
+        return InterpreterError(line, column, self.message)
+
+
+def to_runtime(value: Any) -> Any:
+    """Convert an outcome to the value the interpreter would use."""
+    if isinstance(value, tuple):
+        return [to_runtime(v) for v in value]
+    if isinstance(value, PairOutcome):
+        return (to_runtime(value.first), to_runtime(value.second))
+    return value
+
+
+def to_outcome(value: Any) -> Any:
+    """Convert an interpreter value to a hashable outcome."""
+    if isinstance(value, list):
+        elements = [to_outcome(v) for v in value]
+        try:
+            return tuple(sorted(elements))
+        except TypeError:
+            return tuple(elements)
+    if isinstance(value, tuple):
+        return PairOutcome(to_outcome(value[0]), to_outcome(value[1]))
+    return value
+
+
+def token_key(token: Token):
+    return (token.token_type, token.lexeme, token.literal)
+
+
+@lru_cache(maxsize=65536)
+def _apply_binary(key: Tuple[TokenType, str, Any], left: Any, right: Any):
+    operator = Token(key[0], key[1], key[2], 0, 0)
+    return to_outcome(binary_operation(operator, constant(to_runtime(left)), constant(to_runtime(right)))(Runtime()))
+
+
+def apply_binary(operator: Token, left: Any, right: Any):
+    """Apply a deterministic binary operator to two outcomes."""
+    return _apply_binary(token_key(operator), left, right)
+
+
+def apply_unary(operator: Token, value: Any):
+    """Apply a deterministic unary operator to an outcome."""
+    return to_outcome(functions.unary_expression(operator.token_type, to_runtime(value), operator))
+
+
+def free_variables(node: Any) -> Optional[FrozenSet[str]]:
+    """Names of variables used in NODE, or None if it calls functions."""
+    names: set = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, expression.Call):
+            return None
+        if isinstance(current, expression.Variable) and isinstance(current.name.literal, str):
+            names.add(current.name.literal)
+        if isinstance(current, Node):
+            stack.extend(getattr(current, field.name) for field in dataclasses.fields(current))
+        elif isinstance(current, (list, tuple)):
+            stack.extend(current)
+    return frozenset(names)
+
+
+def summarize(distribution: Distribution):
+    """Normalized histogram, average, spread and mean deviation of DISTRIBUTION.
+
+    The statistics are None unless every outcome is a number.
+    """
+    average_value: Optional[float] = None
+    spread: Optional[float] = None
+    mean_deviation: Optional[float] = None
+
+    value_types = set(type(k) for k in distribution.keys())
+
+    if value_types.issubset(set([float, int])):
+        total_key = sum((a * b) for a, b in zip(distribution.keys(), distribution.values()))
+        total_value = sum(distribution.values())
+
+        average_value = total_key / total_value
+
+        x_2 = sum((a * a * b / total_value) for a, b in zip(distribution.keys(), distribution.values()))
+
+        spread = math.sqrt(max(x_2 - average_value**2, 0))
+
+        mean_deviation = sum(abs(k - average_value) * v for k, v in distribution.items()) / total_value
+
+    return (
+        {k: v / sum(distribution.values()) for k, v in distribution.items()},
+        average_value,
+        spread,
+        mean_deviation,
+    )
+
 
 class Calculator(expression.ExpressionVisitor[T], statement.StatementVisitor[T]):
-    variables: ChainMap[str, Union[Number, NumberList, str]] = ChainMap({})
-    functions: Dict[str, Union[statement.Function, statement.Compositional]] = {}
+    variables: Scope
+    functions: Dict[str, Union[statement.Function, statement.Compositional]]
+    memo: Dict[Tuple[Node, Any], Distribution]
+    free: Dict[Node, Optional[FrozenSet[str]]]
+
+    # Distributions of calls to functions that depend only on their arguments, by argument values.
+    purity: Purity
+    calls: Dict[Tuple[statement.Function, Tuple[Any, ...]], Distribution]
 
     average: bool = False
+    profile: Optional[Profile] = None
+
+    # Counts the nodes calculated, and checks collection lengths against limits, if set.
+    guard: Optional[Guard] = None
+
+    def __init__(self, profile: bool = False):
+        """Create a calculator, recording a Profile of the nodes visited if PROFILE is set."""
+        super().__init__()
+        if profile:
+            self.profile = Profile()
+            self.profile.instrument(self)
 
     def interpret(
         self,
         statements: List[Union[expression.Expression, statement.Statement]],
         average: bool = False,
     ):
-        distribution: Dict[int, float] = {}
-        average_value: Optional[float] = None
-        spread: Optional[float] = None
-        mean_deviation: Optional[float] = None
         self.average = average
+        self.variables = Scope()
+        self.functions = {}
+        self.memo = {}
+        self.free = {}
+        self.purity = Purity(self.functions)
+        self.calls = {}
 
         for stmt in statements:
             if isinstance(stmt, statement.Function):
-                distribution = stmt.accept(self)
+                stmt.accept(self)
 
         # Run statements, skip function declarations, as they are already done.
-        for stmt in statements:
-            if isinstance(stmt, statement.Function):
-                continue
-            if isinstance(stmt, statement.Statement):
-                _, distribution = stmt.accept(self)
-            if isinstance(stmt, expression.Expression):
-                _, distribution = stmt.accept(self)
-
-        value_types = set(type(k) for k in distribution.keys())
-
-        if value_types.issubset(set([float, int])):
-            total_key = sum((a * b) for a, b in zip(distribution.keys(), distribution.values()))
-            total_value = sum(distribution.values())
-
-            average_value = total_key / total_value
-
-            x_2 = sum((a * a * b / total_value) for a, b in zip(distribution.keys(), distribution.values()))
-
-            spread = math.sqrt(x_2 - average_value**2)
-
-            mean_deviation = sum(abs(k - average_value) * v for k, v in distribution.items()) / total_value
-
-        return (
-            {k: v / sum(distribution.values()) for k, v in distribution.items()},
-            average_value,
-            spread,
-            mean_deviation,
-        )
+        distribution = self.sequence([stmt for stmt in statements if not isinstance(stmt, statement.Function)])
+
+        return summarize(distribution)
+
+    def distribution(self, node: Union[expression.Expression, statement.Statement]) -> Distribution:
+        """Distribution of NODE, memoized on the variables it uses."""
+        if node not in self.free:
+            self.free[node] = free_variables(node)
+        names = self.free[node]
+        if names is None:
+            names = frozenset(self.variables)
+
+        key = (node, tuple((name, self.variables.get(name)) for name in sorted(names)))
+        if key not in self.memo:
+            if self.guard is not None:
+                self.guard.step(node)
+            self.memo[key] = node.accept(self)
+        return self.memo[key]
+
+    def bind(self, name: Any, value: Any, node: Union[expression.Expression, statement.Statement]) -> Distribution:
+        """Distribution of NODE with NAME set to VALUE."""
+        if not isinstance(name, str):
+            raise TypeError("Variable name must be string")
+
+        self.variables.push({name: value})
+        try:
+            return self.distribution(node)
+        finally:
+            self.variables.pop()
+
+    def sequence(self, statements: Sequence[Any]) -> Distribution:
+        """Distribution of the last of STATEMENTS, with earlier assignments in scope."""
+        if not statements:
+            return {None: 1.0}
+
+        head, rest = statements[0], statements[1:]
+
+        if isinstance(head, expression.Assign):
+            if not rest:
+                return {None: 1.0}
+            if not isinstance(head.name.literal, str):
+                raise TypeError("Variable name must be string")
+
+            parts = []
+            for value, chance in self.distribution(head.value).items():
+                self.variables.push({head.name.literal: value})
+                try:
+                    parts.append((chance, self.sequence(rest)))
+                finally:
+                    self.variables.pop()
+            return mix(parts)
+
+        if not rest:
+            return self.distribution(head)
+
+        if isinstance(head, (statement.Function, statement.Compositional)):
+            head.accept(self)
+
+        return self.sequence(rest)
 
     def visit_Literal_Expression(self, expr: expression.Literal):
         if expr.value is None:
@@ -69,87 +246,274 @@ class Calculator(expression.ExpressionVisitor[T], statement.StatementVisitor[T])
         if isinstance(expr.value, str):
             raise NotImplementedError("String value not supported for calculation.")
 
-        return expr.value, {expr.value: 1}
+        return {expr.value: 1.0}
+
+    def visit_Variable_Expression(self, expr: expression.Variable):
+        return {self.variables.get(expr.name.literal): 1.0}
+
+    def visit_Assign_Expression(self, _: expression.Assign):
+        return {None: 1.0}
+
+    def visit_Grouping_Expression(self, expr: expression.Grouping):
+        return self.distribution(expr.expression)
+
+    def visit_Block_Expression(self, expr: expression.Block):
+        return self.sequence(expr.statements)
 
     def visit_Unary_Expression(self, expr: expression.Unary):
-        token_type = expr.operator.token_type
+        operator = expr.operator
+        token_type = operator.token_type
 
-        right, right_probabilities = expr.right.accept(self)
+        right = self.distribution(expr.right)
 
         if token_type == TokenType.DICE:
-            start = 0 if expr.operator.lexeme == "z" else 1
+            start = 0 if operator.lexeme == "z" else 1
+            return mix((chance, uniform(range(start, sides + 1))) for sides, chance in right.items())
 
-            if self.average:
-                res = functions.dice_average(right, 1, start)[0]
-            else:
-                res = functions.dice_roll(right, 1, start)[0]
+        if token_type == TokenType.CHOOSE:
+            return mix((chance, uniform(collection)) for collection, chance in right.items())
 
-            probs = functions.dice_probabilities(right, expr.operator.lexeme == "z")
+        if token_type == TokenType.PROBABILITY:
+            return mix((chance, {1: min(max(p, 0), 1), (): 1 - min(max(p, 0), 1)}) for p, chance in right.items())
 
-            return res, probs
-
-        if token_type == TokenType.SUM:
-            probabilities: Dict[int, int] = {}
-            for k, v in right_probabilities.items():
-                if sum(k) in probabilities:
-                    probabilities[sum(k)] += v
-                else:
-                    probabilities[sum(k)] = v
-            if isinstance(right, (int, float)):
-                right = [right]
+        if token_type == TokenType.SUM and isinstance(right, Pool):
+            return right.sum_distribution()
 
-            return sum(right), probabilities
+        if token_type == TokenType.COUNT and isinstance(right, DicePool):
+            return right.count_distribution()
 
-        raise NotImplementedError(token_type)
+        probabilities: Dict[Any, float] = {}
+        for value, chance in right.items():
+            key = apply_unary(operator, value)
+            probabilities[key] = probabilities.get(key, 0) + chance
+        return probabilities
 
     def visit_Binary_Expression(self, expr: expression.Binary):
-        token_type = expr.operator.token_type
+        operator = expr.operator
+        token_type = operator.token_type
 
-        left_probabilities: Dict[int, Union[float, int]]
+        left = self.distribution(expr.left)
 
-        left_value, left_probabilities = expr.left.accept(self)
-        right_value, right_probabilities = expr.right.accept(self)
+        if token_type == TokenType.DEFAULT:
+            return mix((chance, {value: 1.0} if value else self.distribution(expr.right)) for value, chance in left.items())
 
-        if token_type in functions.COLLECTION_TOKENS:
-            return functions.collection_probabilities(token_type, left_value, right_value, right_probabilities)
-
-        left = self.variables.get(left_value, left_value) if isinstance(left_value, str) else left_value
-        right = self.variables.get(right_value) if isinstance(right_value, str) else right_value
+        right = self.distribution(expr.right)
 
         if token_type == TokenType.DICE:
-            start = 0 if expr.operator.lexeme == "z" else 1
+            start = 0 if operator.lexeme == "z" else 1
+            counts = {int(count): chance for count, chance in left.items()}
+            if self.guard is not None:
+                self.guard.length(max(counts), operator)
+            checkpoint = partial(self.guard.check, operator) if self.guard is not None else None
+            return mix(
+                (chance, DicePool(counts, dict.fromkeys(range(start, sides + 1), 1), checkpoint)) for sides, chance in right.items()
+            )
 
-            if not (isinstance(right, int) and isinstance(left, (int, float))):
-                raise TypeError(f"Dice average only support ints, got {right} and {left}")
+        if token_type == TokenType.SAMPLES:
+            if self.guard is not None:
+                self.guard.length(int(max(left)), operator)
+            return mix((chance, self.samples(int(count), right, operator)) for count, chance in left.items())
+
+        if token_type in (TokenType.LARGEST, TokenType.LEAST) and isinstance(right, DicePool):
+            largest = token_type == TokenType.LARGEST
+            return mix((chance, KeepPool(right, count, largest) if count > 0 else {(): 1.0}) for count, chance in left.items())
+
+        if token_type in functions.COMPARISON_OPERATORS and isinstance(right, DicePool) and len(left) == 1:
+            (threshold,) = left
+            if isinstance(threshold, (int, float)):
+                check = functions.COMPARISON_OPERATORS[token_type]
+                return right.filter(lambda face: check(threshold, face))
+
+        if token_type == TokenType.PICK:
+            return mix(
+                (a_chance * b_chance, uniform_picks(collection, count))
+                for (collection, a_chance), (count, b_chance) in itertools.product(left.items(), right.items())
+            )
 
-            if self.average:
-                res = functions.dice_average(right, int(left), start)
+        return combine(left, right, lambda a, b: apply_binary(operator, a, b))
 
-            res = functions.dice_roll(right, int(left), start)
+    def samples(self, count: int, distribution: Distribution, operator: Token) -> Distribution:
+        """Distribution of the union of COUNT independent samples."""
+        if all(isinstance(value, (int, float)) for value in distribution):
+            checkpoint = partial(self.guard.check, operator) if self.guard is not None else None
+            return DicePool({count: 1}, dict(distribution), checkpoint)
 
-            dice_probs = functions.dice_probabilities(right, expr.operator.lexeme == "z")
+        result: Distribution = {(): 1.0}
+        for _ in range(count):
+            result = combine(result, distribution, union)
+        return result
+
+    def visit_Conditional_Expression(self, stmt: expression.Conditional):
+        condition = self.distribution(stmt.condition)
+        truth = sum(chance for value, chance in condition.items() if value)
+
+        parts = []
+        if truth:
+            parts.append((truth, self.distribution(stmt.truth)))
+        if 1 - truth > 1e-12:
+            parts.append((1 - truth, self.distribution(stmt.falsy)))
+        return mix(parts)
+
+    def visit_Pair_Expression(self, expr: expression.Pair):
+        return combine(self.distribution(expr.first), self.distribution(expr.second), PairOutcome)
+
+    def visit_List_Expression(self, expr: expression.List):
+        result: Distribution = {(): 1.0}
+        for value in expr.value:
+            result = combine(result, self.distribution(value), union)
+        return result
+
+    def visit_Foreach_Expression(self, expr: expression.Foreach):
+        name = expr.iterator.name.literal
+
+        def each(values: Any) -> Distribution:
+            result: Distribution = {(): 1.0}
+            for count, value in enumerate(values, 1):
+                if self.guard is not None:
+                    self.guard.iteration(count, expr)
+                result = combine(result, self.bind(name, value, expr.block), union)
+            return result
+
+        return mix((chance, each(values)) for values, chance in self.distribution(expr.source).items())
+
+    def visit_Repeat_Expression(self, stmt: expression.Repeat):
+        name = stmt.action.name.literal
+        names = free_variables(stmt.action.value)
+        if names is None or name in names:
+            raise NotImplementedError("Repeat where each roll depends on the previous")
+
+        until = stmt.condition.token_type == TokenType.UNTIL
+
+        probabilities: Dict[Any, float] = {}
+        for value, chance in self.distribution(stmt.action.value).items():
+            qualifier = self.bind(name, value, stmt.qualifier)
+            stops = sum(p for v, p in qualifier.items() if bool(v) == until)
+            if stops:
+                probabilities[value] = chance * stops
+
+        total = sum(probabilities.values())
+        if not total:
+            raise ValueError("Repeat never stops")
+        return {value: chance / total for value, chance in probabilities.items()}
+
+    def visit_Accumulate_Expression(self, stmt: expression.Accumulate):
+        raise NotImplementedError("Accumulate has no finite distribution")
+
+    def visit_Function_Statement(self, stmt: statement.Function):
+        if not isinstance(stmt.name.literal, str):
+            raise TypeError(f"Expected string, got {stmt.name.literal}")
+
+        self.functions[stmt.name.literal] = stmt
+        return {None: 1.0}
+
+    def visit_Compositional_Statement(self, stmt: statement.Compositional):
+        if not isinstance(stmt.name.literal, str):
+            raise TypeError(f"Expected string, got {stmt.name.literal}")
+
+        self.functions[stmt.name.literal] = stmt
+        return {None: 1.0}
+
+    def visit_Call_Expression(self, expr: expression.Call):
+        if not isinstance(expr.name.literal, str):
+            raise TypeError("Function name must be string")
+
+        stmt = expr.function if expr.function is not None else self.functions[expr.name.literal]
+
+        if self.guard is not None:
+            self.guard.enter(expr.name)
+
+        if isinstance(stmt, statement.Compositional):
+            result = self.call_compositional(expr, stmt)
+        else:
+            result = self.call_function(stmt, [self.distribution(parameter) for parameter in expr.parameters])
+
+        if self.guard is not None:
+            self.guard.leave()
+        return result
+
+    def call_function(self, stmt: statement.Function, arguments: Sequence[Distribution]) -> Distribution:
+        if not isinstance(stmt.expression, expression.Expression):
+            return {None: 1.0}
+
+        parameters = [parameter.literal for parameter in stmt.parameters][: len(arguments)]
+        closed = len(arguments) == len(stmt.parameters) and self.purity.closed(stmt)
+
+        parts = []
+        for combination in itertools.product(*(argument.items() for argument in arguments)):
+            chance = math.prod(p for _, p in combination)
+            values = tuple(v for v, _ in combination)
+            key = (stmt, values)
+            if closed and key in self.calls:
+                parts.append((chance, self.calls[key]))
+                continue
 
-            probability_groups: Dict[int, Any] = {}
-            for count in left_probabilities.keys():
-                probabilities = functions.group_probabilities(count, dice_probs)
-                probability_groups[count] = probabilities
+            self.variables.push(dict(zip(parameters, values)))
+            try:
+                result = self.distribution(stmt.expression)
+            finally:
+                self.variables.pop()
+            if closed:
+                self.calls[key] = result
+            parts.append((chance, result))
+        return mix(parts)
+
+    def call_named(self, name: Token, arguments: Sequence[Distribution]) -> Distribution:
+        stmt = self.functions[str(name.literal)]
+        if isinstance(stmt, statement.Compositional):
+            raise NotImplementedError("Compositional used as operator of compositional")
+        return self.call_function(stmt, arguments)
+
+    def call_compositional(self, expr: expression.Call, stmt: statement.Compositional) -> Distribution:
+        result: Distribution = {stmt.empty.value: 1.0}
+        parameter = expr.parameters[0]
+
+        if isinstance(parameter, expression.List):
+            operator = stmt.union
+            if not isinstance(operator, Token):
+                raise TypeError(f"Expected Token, got {operator}")
+
+            for next_val in parameter.value:
+                element = self.distribution(next_val)
+                if operator.token_type == TokenType.IDENTIFIER:
+                    result = mix((chance, self.call_named(operator, [{value: 1.0}, element])) for value, chance in result.items())
+                else:
+                    result = combine(result, element, lambda a, b, operator=operator: apply_binary(operator, a, b))
+            return result
 
-            probabilities = {k: v for _, group_probs in probability_groups.items() for k, v in group_probs.items()}
+        operator = stmt.singleton
+        if not isinstance(operator, Token):
+            raise TypeError(f"Expected token, got {operator}")
 
-            return res, probabilities
+        if operator.token_type == TokenType.IDENTIFIER:
+            return self.call_named(operator, [result])
 
-        if token_type in functions.CALC_OPERATORS:
-            func = functions.CALC_OPERATORS[token_type]
-            probabilities_keys = [func(a, b) for a, b in itertools.product(left_probabilities.keys(), right_probabilities.keys())]
-            probabilities_values = [a * b for a, b in itertools.product(left_probabilities.values(), right_probabilities.values())]
+        if operator.token_type in RANDOM_UNARY:
+            raise NotImplementedError(f"{operator.token_type} as operator of compositional")
 
-            return (
-                func(left_value, right_value),
-                dict(zip(probabilities_keys, probabilities_values)),
-            )
+        probabilities: Dict[Any, float] = {}
+        for value, chance in self.distribution(parameter).items():
+            key = apply_unary(operator, value)
+            probabilities[key] = probabilities.get(key, 0) + chance
+        return probabilities
 
-        raise functions.UnknownOperator(token_type)
+    def visit_Print_Statement(self, stmt: statement.Print):
+        raise NotImplementedError("Text is not supported for calculation.")
 
-    def visit_Grouping_Expression(self, expr: expression.Grouping):
-        res = expr.expression.accept(self)
-        return res
+    def visit_TextAlign_Expression(self, expr: expression.TextAlign):
+        raise NotImplementedError("Text is not supported for calculation.")
+
+
+def union(left: Any, right: Any) -> Tuple[Any, ...]:
+    """Union of two outcomes, as a sorted tuple."""
+    left = left if isinstance(left, tuple) else (left,)
+    right = right if isinstance(right, tuple) else (right,)
+    return to_outcome(list(left + right))
+
+
+def uniform_picks(collection: Any, count: Any) -> Distribution:
+    """Distribution of picking COUNT elements of COLLECTION without replacement."""
+    if not isinstance(collection, tuple):
+        raise functions.UnknownOperator("Unexpected scalar.")
+    if not isinstance(count, int):
+        raise TypeError("Length should be int")
+    return uniform(tuple(sorted(picked)) for picked in itertools.combinations(collection, min(count, len(collection))))
@@ -0,0 +1,813 @@
+"""Closure compiler for Troll programs.
+
+The syntax tree is compiled once into nested Python closures, one per node,
+with operators and operands resolved at compile time. Running a compiled
+program is then a straight chain of calls, without visitor dispatch.
+"""
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union
+
+from trill import functions
+from trill.string import process_string
+from trill.types import RandomSource
+
+from .ast import expression
+from .ast import statement
+from .interpreter import UnknownType
+from .limits import Guard, recursion_limit
+from .purity import Purity, arguments_key, recall, recursive, remember
+from .scope import Scope
+from .tokens import Token, TokenType
+
+T = TypeVar("T")
+
+
+class Runtime:
+    """Mutable state of a single run of a compiled program."""
+
+    average: bool
+    random: RandomSource
+    variables: Scope
+    functions: Dict[str, Union["CompiledFunction", "CompiledCompositional"]]
+
+    # Checks loops, calls and collection lengths against limits, if set.
+    guard: Optional[Guard] = None
+
+    # Results of calls to pure functions in this run.
+    memo: Dict[Tuple["CompiledFunction", Tuple[Any, ...]], Any]
+
+    def __init__(self, average: bool = False, rng: RandomSource = random):
+        self.average = average
+        self.random = rng
+        self.variables = Scope()
+        self.functions = {}
+        self.memo = {}
+
+    def push(self):
+        self.variables.push()
+
+    def pop(self):
+        self.variables.pop()
+
+
+Closure = Callable[[Runtime], Any]
+BinaryFactory = Callable[[Token, Closure, Closure], Closure]
+
+
+class CompiledFunction(NamedTuple):
+    parameters: Tuple[str, ...]
+    body: Optional[Closure]
+    # Depends only on its arguments, and gives the same result for them, see Purity.
+    closed: bool = False
+    pure: bool = False
+
+
+class TailCall(NamedTuple):
+    """A call to a closed function returned from the body of another, made in its place."""
+
+    name: Token
+    function: CompiledFunction
+    scope: Dict[str, Any]
+
+
+class CompiledCompositional(NamedTuple):
+    empty: Any
+    singleton: Token
+    union: Token
+
+
+@dataclass(frozen=True)
+class ClosureProgram:
+    """A program compiled to closures."""
+
+    declarations: Tuple[Closure, ...]
+    statements: Tuple[Closure, ...]
+    # Whether functions of the program can call themselves, nesting calls without bound.
+    recursive: bool = False
+
+    def run(self, runtime: Runtime) -> List[Any]:
+        output: List[Any] = [declaration(runtime) for declaration in self.declarations]
+        output += [stmt(runtime) for stmt in self.statements]
+        return output
+
+
+def constant(value: Any) -> Closure:
+    def run(_: Runtime):
+        return value
+
+    return run
+
+
+def literal_value(value: Any):
+    """Value of a literal, the way the interpreter evaluates it."""
+    if isinstance(value, str):
+        return process_string(value)
+    return value
+
+
+def operands(runtime: Runtime, left: Closure, right: Closure):
+    """Evaluate binary operands, resolving strings as variable names."""
+    left_value = left(runtime)
+    right_value = right(runtime)
+
+    if isinstance(left_value, str):
+        left_value = runtime.variables.get(left_value, left_value)
+    if isinstance(right_value, str):
+        right_value = runtime.variables.get(right_value)
+
+    return left_value, right_value
+
+
+def first(value: Any):
+    if isinstance(value, list):
+        return value[0]
+    return value
+
+
+def binary_default(_: Token, left: Closure, right: Closure) -> Closure:
+    def run(runtime: Runtime):
+        return left(runtime) or right(runtime)
+
+    return run
+
+
+def binary_collection(operator: Token, left: Closure, right: Closure) -> Closure:
+    token_type = operator.token_type
+    collection_operation = functions.collection_operation
+
+    def run(runtime: Runtime):
+        left_value = left(runtime)
+        right_value = right(runtime)
+        if token_type == TokenType.SAMPLES and runtime.guard is not None:
+            size = len(right_value) if isinstance(right_value, list) else 1
+            runtime.guard.length(int(left_value) * size, operator)
+        return collection_operation(token_type, left_value, right_value)
+
+    return run
+
+
+def binary_and(_: Token, left: Closure, right: Closure) -> Closure:
+    def run(runtime: Runtime):
+        left_value, right_value = operands(runtime, left, right)
+        return left_value and right_value
+
+    return run
+
+
+def binary_dice(operator: Token, left: Closure, right: Closure) -> Closure:
+    start = 0 if operator.lexeme == "z" else 1
+    dice_roll = functions.dice_roll
+    dice_average = functions.dice_average
+
+    def run(runtime: Runtime):
+        count, sides = operands(runtime, left, right)
+        if not (isinstance(sides, int) and isinstance(count, (int, float))):
+            raise TypeError(f"Dice average only support ints, got {sides} and {count}")
+        if runtime.guard is not None:
+            runtime.guard.length(int(count), operator)
+
+        if runtime.average:
+            return dice_average(sides, int(count), start)
+
+        return dice_roll(sides, int(count), start, runtime.random)
+
+    return run
+
+
+def binary_range(operator: Token, left: Closure, right: Closure) -> Closure:
+    def run(runtime: Runtime):
+        left_value, right_value = operands(runtime, left, right)
+        if not (isinstance(right_value, int) and isinstance(left_value, (int,))):
+            raise TypeError(f"Range only support ints, got {right_value} and {left_value}")
+        if runtime.guard is not None:
+            runtime.guard.length(right_value - left_value + 1, operator)
+        return list(range(left_value, right_value + 1))
+
+    return run
+
+
+def binary_union(operator: Token, left: Closure, right: Closure) -> Closure:
+    def run(runtime: Runtime):
+        left_value, right_value = operands(runtime, left, right)
+        if not isinstance(left_value, list):
+            left_value = [left_value]
+        if not isinstance(right_value, list):
+            right_value = [right_value]
+        if runtime.guard is not None:
+            runtime.guard.length(len(left_value) + len(right_value), operator)
+        return left_value + right_value
+
+    return run
+
+
+def binary_pick(_: Token, left: Closure, right: Closure) -> Closure:
+    def run(runtime: Runtime):
+        left_value, right_value = operands(runtime, left, right)
+        if isinstance(left_value, (int, float)):
+            raise UnknownType("Unexpected scalar.")
+
+        if not isinstance(right_value, int):
+            raise TypeError("Length should be int")
+
+        samples = min(len(left_value), right_value)
+        if runtime.average:
+            offset = samples // 2
+            mid_point = len(left_value) // 2
+            return left_value[mid_point - offset : mid_point + offset + 1]
+
+        return runtime.random.sample(left_value, samples)
+
+    return run
+
+
+def binary_multiset(operator: Token, left: Closure, right: Closure) -> Closure:
+    token_type = operator.token_type
+
+    def run(runtime: Runtime):
+        left_value, right_value = operands(runtime, left, right)
+        if not isinstance(left_value, list):
+            left_value = [left_value]
+        if not isinstance(right_value, list):
+            right_value = [right_value]
+
+        if token_type == TokenType.DROP:
+            return [x for x in left_value if x not in right_value]
+
+        if token_type == TokenType.KEEP:
+            return [x for x in left_value if x in right_value]
+
+        output = list(left_value)
+        for v in right_value:
+            if v in output:
+                output.remove(v)
+        return output
+
+    return run
+
+
+def binary_comparison(operator: Token, left: Closure, right: Closure) -> Closure:
+    check = functions.COMPARISON_OPERATORS[operator.token_type]
+
+    def run(runtime: Runtime):
+        left_value, right_value = operands(runtime, left, right)
+        if isinstance(right_value, (int, float)):
+            right_value = [right_value]
+        elif not isinstance(right_value, list):
+            raise TypeError(f"Unexpected type {type(right_value)}")
+
+        if not isinstance(left_value, (list, int, float)):
+            raise TypeError(f"Unexpected type {type(left_value)}")
+
+        return [v for v in right_value if check(left_value, v)]
+
+    return run
+
+
+def binary_calculation(operator: Token, left: Closure, right: Closure) -> Closure:
+    func = functions.CALC_OPERATORS[operator.token_type]
+
+    def run(runtime: Runtime):
+        left_value, right_value = operands(runtime, left, right)
+        return func(first(left_value), first(right_value))
+
+    return run
+
+
+def binary_unknown(operator: Token, left: Closure, right: Closure) -> Closure:
+    def run(runtime: Runtime):
+        operands(runtime, left, right)
+        raise functions.UnknownOperator(f"Unknown operator {operator.token_type} in binary expression")
+
+    return run
+
+
+BINARY_OPERATIONS: Dict[TokenType, BinaryFactory] = {
+    TokenType.DEFAULT: binary_default,
+    **{token_type: binary_collection for token_type in functions.COLLECTION_TOKENS},
+    TokenType.AND: binary_and,
+    TokenType.DICE: binary_dice,
+    TokenType.RANGE: binary_range,
+    TokenType.UNION: binary_union,
+    TokenType.PICK: binary_pick,
+    TokenType.DROP: binary_multiset,
+    TokenType.KEEP: binary_multiset,
+    TokenType.MINUSMINUS: binary_multiset,
+    **{token_type: binary_comparison for token_type in functions.COMPARISON_OPERATORS},
+    **{token_type: binary_calculation for token_type in functions.CALC_OPERATORS},
+}
+
+
+def binary_operation(operator: Token, left: Closure, right: Closure) -> Closure:
+    factory = BINARY_OPERATIONS.get(operator.token_type, binary_unknown)
+    return factory(operator, left, right)
+
+
+def unary_operation(operator: Token, right: Closure) -> Closure:
+    token_type = operator.token_type
+
+    if token_type == TokenType.DICE:
+        start = 0 if operator.lexeme == "z" else 1
+
+        def dice(runtime: Runtime):
+            sides = right(runtime)
+            if runtime.average:
+                return (sides + start) / 2
+            return runtime.random.randint(start, sides)
+
+        return dice
+
+    if token_type == TokenType.SUM:
+
+        def total(runtime: Runtime):
+            value = right(runtime)
+            if isinstance(value, (int, float)):
+                return value
+            return sum(value)
+
+        return total
+
+    if token_type == TokenType.MINUS:
+
+        def negate(runtime: Runtime):
+            return -right(runtime)
+
+        return negate
+
+    if token_type == TokenType.COUNT:
+
+        def count(runtime: Runtime):
+            return len(right(runtime))
+
+        return count
+
+    unary_expression = functions.unary_expression
+
+    def run(runtime: Runtime):
+        return unary_expression(token_type, right(runtime), operator, runtime.average, runtime.random)
+
+    return run
+
+
+class ClosureCompiler(expression.ExpressionVisitor[Closure], statement.StatementVisitor[Closure]):
+    """Compile syntax trees to closures."""
+
+    # Functions compiled so far, shared by their declaration and resolved calls.
+    functions: Dict[statement.Function, CompiledFunction]
+
+    # Pure functions among those declared in the program compiled.
+    purity: Purity
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        # Compiling does not roll any dice.
+        self.functions = {}
+        self.purity = Purity({})
+
+    def compile(self, statements: Sequence[Union[expression.Expression, statement.Statement]]) -> ClosureProgram:
+        # Functions are declared before anything else runs, and compositionals as they are reached.
+        declared: Dict[str, Union[statement.Function, statement.Compositional]] = {}
+        for kind in (statement.Function, statement.Compositional):
+            for stmt in statements:
+                if isinstance(stmt, kind) and isinstance(stmt.name.literal, str):
+                    declared[stmt.name.literal] = stmt
+        self.purity = Purity(declared)
+
+        declarations = tuple(stmt.accept(self) for stmt in statements if isinstance(stmt, statement.Function))
+        others = tuple(stmt.accept(self) for stmt in statements if not isinstance(stmt, statement.Function))
+        return ClosureProgram(declarations, others, recursive(declared))
+
+    def visit_Literal_Expression(self, expr: expression.Literal) -> Closure:
+        value = literal_value(expr.value)
+        if isinstance(value, list):
+            raw = expr.value
+            return lambda _: literal_value(raw)
+        return constant(value)
+
+    def visit_Unary_Expression(self, expr: expression.Unary) -> Closure:
+        return unary_operation(expr.operator, expr.right.accept(self))
+
+    def visit_Binary_Expression(self, expr: expression.Binary) -> Closure:
+        return binary_operation(expr.operator, expr.left.accept(self), expr.right.accept(self))
+
+    def visit_Grouping_Expression(self, expr: expression.Grouping) -> Closure:
+        return expr.expression.accept(self)
+
+    def visit_Block_Expression(self, expr: expression.Block) -> Closure:
+        statements = tuple(stmt.accept(self) for stmt in expr.statements)
+
+        def run(runtime: Runtime):
+            val = None
+            runtime.push()
+            for stmt in statements:
+                val = stmt(runtime)
+            runtime.pop()
+            return val
+
+        return run
+
+    def visit_Pair_Expression(self, expr: expression.Pair) -> Closure:
+        first_value = expr.first.accept(self)
+        second_value = expr.second.accept(self)
+
+        def run(runtime: Runtime):
+            return (first_value(runtime), second_value(runtime))
+
+        return run
+
+    def visit_List_Expression(self, expr: expression.List) -> Closure:
+        values = tuple(value.accept(self) for value in expr.value)
+
+        def run(runtime: Runtime):
+            output: List[Any] = []
+            for value in values:
+                res = value(runtime)
+                if isinstance(res, list):
+                    output += res
+                else:
+                    output.append(res)
+            return output
+
+        return run
+
+    def visit_Assign_Expression(self, expr: expression.Assign) -> Closure:
+        name = expr.name.literal
+        value = expr.value.accept(self)
+
+        if not isinstance(name, str):
+            raise TypeError("Variable name must be string")
+
+        def run(runtime: Runtime):
+            runtime.variables[name] = value(runtime)
+
+        return run
+
+    def visit_Variable_Expression(self, expr: expression.Variable) -> Closure:
+        name = expr.name.literal
+
+        if not isinstance(name, str):
+            raise TypeError("Variable name must be string")
+
+        def run(runtime: Runtime):
+            return runtime.variables.current.get(name)
+
+        return run
+
+    def visit_Conditional_Expression(self, stmt: expression.Conditional) -> Closure:
+        condition = stmt.condition.accept(self)
+        truth = stmt.truth.accept(self)
+        falsy = stmt.falsy.accept(self)
+
+        def run(runtime: Runtime):
+            if condition(runtime):
+                return truth(runtime)
+            return falsy(runtime)
+
+        return run
+
+    def visit_Foreach_Expression(self, expr: expression.Foreach) -> Closure:
+        name = expr.iterator.name.literal
+        source = expr.source.accept(self)
+        block = expr.block.accept(self)
+
+        if not isinstance(name, str):
+            raise TypeError("Variable name must be string")
+
+        def run(runtime: Runtime):
+            output: List[Any] = []
+            runtime.push()
+            variables = runtime.variables
+            for count, val in enumerate(source(runtime), 1):
+                if runtime.guard is not None:
+                    runtime.guard.iteration(count, expr)
+                variables[name] = val
+                output.append(block(runtime))
+            runtime.pop()
+            return output
+
+        return run
+
+    def visit_Repeat_Expression(self, stmt: expression.Repeat) -> Closure:
+        name = stmt.action.name.literal
+        action = stmt.action.accept(self)
+        qualifier = stmt.qualifier.accept(self)
+        until = stmt.condition.token_type == TokenType.UNTIL
+
+        if not isinstance(name, str):
+            raise TypeError(f"Expected string, got {name}")
+
+        def run(runtime: Runtime):
+            runtime.push()
+            action(runtime)
+            count = 1
+            while bool(qualifier(runtime)) != until and not runtime.average:
+                count += 1
+                if runtime.guard is not None:
+                    runtime.guard.iteration(count, stmt)
+                action(runtime)
+            res = runtime.variables.get(name)
+            runtime.pop()
+            return res
+
+        return run
+
+    def visit_Accumulate_Expression(self, stmt: expression.Accumulate) -> Closure:
+        name = stmt.action.name.literal
+        action = stmt.action.accept(self)
+        qualifier = stmt.qualifier.accept(self)
+
+        if not isinstance(name, str):
+            raise TypeError(f"Expected string, got {name}")
+
+        def run(runtime: Runtime):
+            runtime.push()
+            action(runtime)
+            result: List[Any] = [runtime.variables.get(name)]
+
+            count = 1
+            while qualifier(runtime):
+                count += 1
+                if runtime.guard is not None:
+                    runtime.guard.iteration(count, stmt)
+                    runtime.guard.length(len(result) + 1, stmt)
+                action(runtime)
+                val = runtime.variables.get(name)
+                if isinstance(val, (int, float)):
+                    result.append(val)
+                elif isinstance(val, list):
+                    result += val
+                else:
+                    raise UnknownType(f"Unknown type: {type(val)}")
+
+            runtime.pop()
+            return result
+
+        return run
+
+    def function(self, stmt: statement.Function) -> CompiledFunction:
+        """STMT compiled, once however many times it is declared or called."""
+        if stmt not in self.functions:
+            parameters: List[str] = []
+            for parameter in stmt.parameters:
+                if not isinstance(parameter.literal, str):
+                    raise TypeError("Name of variable must be string")
+                parameters.append(parameter.literal)
+
+            closed, pure = self.purity.check(stmt)
+            body = self.tail_position(stmt.expression) if isinstance(stmt.expression, expression.Expression) else None
+            self.functions[stmt] = CompiledFunction(tuple(parameters), body, closed, pure)
+        return self.functions[stmt]
+
+    def tail_position(self, expr: expression.Expression) -> Closure:
+        """Compile the body of a function, returning calls to closed functions as TailCall."""
+        if isinstance(expr, expression.Grouping):
+            return self.tail_position(expr.expression)
+
+        if isinstance(expr, expression.Conditional):
+            condition = expr.condition.accept(self)
+            truth = self.tail_position(expr.truth)
+            falsy = self.tail_position(expr.falsy)
+
+            def conditional(runtime: Runtime):
+                if condition(runtime):
+                    return truth(runtime)
+                return falsy(runtime)
+
+            return conditional
+
+        if isinstance(expr, expression.Block) and expr.statements:
+            statements = tuple(stmt.accept(self) for stmt in expr.statements[:-1])
+            last = self.tail_position(expr.statements[-1])
+
+            def block(runtime: Runtime):
+                runtime.push()
+                for stmt in statements:
+                    stmt(runtime)
+                val = last(runtime)
+                runtime.pop()
+                return val
+
+            return block
+
+        if not isinstance(expr, expression.Call):
+            return expr.accept(self)
+
+        call = expr.accept(self)
+        name = expr.name.literal
+        parameters = tuple(parameter.accept(self) for parameter in expr.parameters)
+        resolved = self.function(expr.function) if expr.function is not None else None
+
+        def tail_call(runtime: Runtime):
+            function = resolved if resolved is not None else runtime.functions.get(name)
+            if not isinstance(function, CompiledFunction) or not function.closed or len(parameters) != len(function.parameters):
+                return call(runtime)
+
+            bind_arguments(runtime, function, parameters)
+            scope = runtime.variables.innermost()
+            runtime.pop()
+            return TailCall(expr.name, function, scope)
+
+        return tail_call
+
+    def visit_Function_Statement(self, stmt: statement.Function) -> Closure:
+        name = stmt.name.literal
+        if not isinstance(name, str):
+            raise TypeError(f"Expected string, got {name}")
+
+        function = self.function(stmt)
+
+        def run(runtime: Runtime):
+            runtime.functions[name] = function
+
+        return run
+
+    def visit_Compositional_Statement(self, stmt: statement.Compositional) -> Closure:
+        name = stmt.name.literal
+        if not isinstance(name, str):
+            raise TypeError(f"Expected string, got {name}")
+
+        if not isinstance(stmt.singleton, Token):
+            raise TypeError(f"Expected token, got {stmt.singleton}")
+
+        if not isinstance(stmt.union, Token):
+            raise TypeError(f"Expected Token, got {stmt.union}")
+
+        compositional = CompiledCompositional(stmt.empty.value, stmt.singleton, stmt.union)
+
+        def run(runtime: Runtime):
+            runtime.functions[name] = compositional
+
+        return run
+
+    def visit_Call_Expression(self, expr: expression.Call) -> Closure:
+        name = expr.name.literal
+        if not isinstance(name, str):
+            raise TypeError("Function name must be string")
+
+        parameters = tuple(parameter.accept(self) for parameter in expr.parameters)
+        elements: Optional[Tuple[Closure, ...]] = None
+        if expr.parameters and isinstance(expr.parameters[0], expression.List):
+            elements = tuple(value.accept(self) for value in expr.parameters[0].value)
+        resolved = self.function(expr.function) if expr.function is not None else None
+
+        def run(runtime: Runtime):
+            function = resolved if resolved is not None else runtime.functions[name]
+            if runtime.guard is not None:
+                runtime.guard.enter(expr.name)
+            if isinstance(function, CompiledCompositional):
+                res = call_compositional(runtime, function, parameters[0], elements)
+            else:
+                res = call_function(runtime, function, parameters)
+            if runtime.guard is not None:
+                runtime.guard.leave()
+            return res
+
+        return run
+
+    def visit_Print_Statement(self, stmt: statement.Print) -> Closure:
+        repeats = stmt.repeats
+        expr = stmt.expression.accept(self)
+
+        def run(runtime: Runtime):
+            output = []
+            for _ in range(repeats):
+                if runtime.guard is not None:
+                    runtime.guard.step(stmt)
+                output.append(str(expr(runtime)))
+            return output
+
+        return run
+
+    def visit_TextAlign_Expression(self, expr: expression.TextAlign) -> Closure:
+        align_operator = expr.operator.lexeme
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+
+        def run(runtime: Runtime):
+            left_value = left(runtime)
+            return functions.text_align(left_value, right(runtime), align_operator)
+
+        return run
+
+
+def bind_arguments(runtime: Runtime, function: CompiledFunction, arguments: Sequence[Closure]) -> List[Any]:
+    """Set the parameters of FUNCTION to ARGUMENTS, in a new scope, returning their values."""
+    runtime.push()
+    values = []
+    for name, argument in zip(function.parameters, arguments):
+        value = runtime.variables[name] = argument(runtime)
+        values.append(value)
+    return values
+
+
+def call_function(runtime: Runtime, function: CompiledFunction, arguments: Sequence[Closure]):
+    depth = runtime.variables.depth
+    values = bind_arguments(runtime, function, arguments)
+
+    # Tail calls returned by function bodies are made in this loop, in place of the call they return from.
+    keys = []
+    calls = 0
+    while True:
+        # Pure functions are run once for each list of arguments.
+        if function.pure and len(values) == len(function.parameters):
+            key = (function, arguments_key(values))
+            if key in runtime.memo:
+                res = recall(runtime.memo[key])
+                break
+            keys.append(key)
+
+        res = function.body(runtime) if function.body is not None else None
+        if not isinstance(res, TailCall):
+            break
+
+        # Tail calls do not nest, so they count as iterations of a loop rather than against the depth.
+        calls += 1
+        if runtime.guard is not None:
+            runtime.guard.iteration(calls, res.name)
+        # The callee only reads its own variables, so the scopes of the call it replaces are left.
+        function = res.function
+        runtime.variables.restore(depth)
+        runtime.variables.push(res.scope)
+        values = [res.scope[name] for name in function.parameters]
+
+    runtime.variables.restore(depth)
+    for key in keys:
+        remember(runtime.memo, key, recall(res))
+    return res
+
+
+def call_compositional(
+    runtime: Runtime,
+    compositional: CompiledCompositional,
+    parameter: Closure,
+    elements: Optional[Sequence[Closure]],
+):
+    runtime.push()
+
+    res = compositional.empty
+
+    if elements is not None:
+        operator = compositional.union
+        for next_val in elements:
+            if not isinstance(res, (str, int, float, type(None))):
+                raise TypeError(f"Unsupported type error: {res}")
+
+            previous = constant(literal_value(res))
+            if operator.token_type == TokenType.IDENTIFIER:
+                res = call_named(runtime, operator, (previous, next_val))
+            else:
+                res = binary_operation(operator, previous, next_val)(runtime)
+    else:
+        operator = compositional.singleton
+        if operator.token_type == TokenType.IDENTIFIER:
+            res = call_named(runtime, operator, (constant(literal_value(res)),))
+        else:
+            res = unary_operation(operator, parameter)(runtime)
+
+    runtime.pop()
+
+    if not isinstance(res, (str, int, float)):
+        raise TypeError(f"Unexpected type: {type(res)}")
+    return res
+
+
+def call_named(runtime: Runtime, name: Token, arguments: Sequence[Closure]):
+    if not isinstance(name.literal, str):
+        raise TypeError("Function name must be string")
+
+    function = runtime.functions[name.literal]
+    if runtime.guard is not None:
+        runtime.guard.enter(name)
+    if isinstance(function, CompiledCompositional):
+        res = call_compositional(runtime, function, arguments[0], None)
+    else:
+        res = call_function(runtime, function, arguments)
+    if runtime.guard is not None:
+        runtime.guard.leave()
+    return res
+
+
+class ClosureInterpreter:
+    """Run Troll programs by compiling them to closures."""
+
+    random: RandomSource
+
+    guard: Optional[Guard] = None
+
+    def __init__(self, seed: Optional[int] = None, rng: Optional[RandomSource] = None):
+        self.random = rng if rng is not None else random.Random(seed)
+
+    def __repr__(self):
+        return "<ClosureInterpreter >"
+
+    def run(self, program: ClosureProgram, average: bool = False) -> List[Any]:
+        runtime = Runtime(average, self.random)
+        runtime.guard = self.guard
+        with recursion_limit(self.guard, program.recursive):
+            return program.run(runtime)
+
+    def interpret(
+        self,
+        statements: Sequence[Union[expression.Expression, statement.Statement]],
+        average: bool = False,
+    ) -> List[Any]:
+        return self.run(ClosureCompiler().compile(statements), average=average)
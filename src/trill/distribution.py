@@ -0,0 +1,318 @@
+"""Probability distributions for the calculator.
+
+Distributions over integers are kept as dense lists of weights, so sums of
+dice can be found by convolution instead of enumerating every roll.
+
+Pools can be given a checkpoint, called every so often while enumerating
+their rolls, so a long enumeration can be stopped by raising.
+"""
+import itertools
+from collections import Counter
+from dataclasses import dataclass
+from math import comb, factorial
+from typing import Any, Callable, Dict, Iterable, Iterator, Mapping, Optional, Tuple, Union
+
+from .functions import GroupProbabilities, Probabilities
+
+Weight = Union[int, float]
+Distribution = Mapping[Any, float]
+Checkpoint = Optional[Callable[[], None]]
+
+# Rolls enumerated between calls to the checkpoint of a pool.
+CHECK_EVERY = 1024
+
+
+@dataclass(frozen=True)
+class PairOutcome:
+    """A pair, as an outcome in a distribution."""
+
+    first: Any
+    second: Any
+
+    def __getitem__(self, index: int):
+        return (self.first, self.second)[index]
+
+    def __str__(self):
+        return f"[{self.first}, {self.second}]"
+
+
+@dataclass(frozen=True)
+class Dense:
+    """Weights of the integers OFFSET, OFFSET + 1, ..."""
+
+    offset: int
+    weights: Tuple[Weight, ...]
+
+    @classmethod
+    def from_dict(cls, probabilities: Probabilities) -> "Dense":
+        low = min(probabilities)
+        weights = [0] * (max(probabilities) - low + 1)
+        for value, weight in probabilities.items():
+            weights[value - low] += weight
+        return cls(low, tuple(weights))
+
+    def to_dict(self) -> Probabilities:
+        return {self.offset + i: weight for i, weight in enumerate(self.weights) if weight}
+
+    def total(self) -> Weight:
+        return sum(self.weights)
+
+    def negate(self) -> "Dense":
+        return Dense(-(self.offset + len(self.weights) - 1), tuple(reversed(self.weights)))
+
+    def convolve(self, other: "Dense") -> "Dense":
+        """Distribution of the sum of two independent values."""
+        weights = [0] * (len(self.weights) + len(other.weights) - 1)
+        for i, a in enumerate(self.weights):
+            if not a:
+                continue
+            for j, b in enumerate(other.weights):
+                weights[i + j] += a * b
+        return Dense(self.offset + other.offset, tuple(weights))
+
+    def power(self, count: int) -> "Dense":
+        """Distribution of the sum of COUNT independent values, by repeated squaring."""
+        result = Dense(0, (1,))
+        base = self
+        while count > 0:
+            if count & 1:
+                result = result.convolve(base)
+            count >>= 1
+            if count:
+                base = base.convolve(base)
+        return result
+
+
+def is_scalar(probabilities: Mapping) -> bool:
+    """Check if all outcomes are plain integers."""
+    return all(isinstance(k, int) and not isinstance(k, bool) for k in probabilities)
+
+
+def uniform(values: Iterable[Any]) -> Dict[Any, float]:
+    """Every value equally likely, counting repeated values repeatedly."""
+    counts = Counter(values)
+    total = sum(counts.values())
+    return {value: count / total for value, count in counts.items()}
+
+
+def mix(parts: Iterable[Tuple[float, Distribution]]) -> Distribution:
+    """Mixture of distributions, each chosen with the given probability."""
+    parts = [(weight, distribution) for weight, distribution in parts if weight]
+    if len(parts) == 1 and abs(parts[0][0] - 1) < 1e-12:
+        return parts[0][1]
+
+    probabilities: Dict[Any, float] = {}
+    for weight, distribution in parts:
+        for value, chance in distribution.items():
+            probabilities[value] = probabilities.get(value, 0) + weight * chance
+    return probabilities
+
+
+def combine(left: Distribution, right: Distribution, func: Callable[[Any, Any], Any]) -> Dict[Any, float]:
+    """Distribution of FUNC of two independent values."""
+    probabilities: Dict[Any, float] = {}
+    for (a, a_chance), (b, b_chance) in itertools.product(left.items(), right.items()):
+        key = func(a, b)
+        probabilities[key] = probabilities.get(key, 0) + a_chance * b_chance
+    return probabilities
+
+
+def multiset_weights(count: int, die: Probabilities, checkpoint: Checkpoint = None) -> GroupProbabilities:
+    """Weights of every sorted tuple of COUNT rolls of DIE."""
+    multisets: GroupProbabilities = {}
+    for index, dice in enumerate(itertools.combinations_with_replacement(sorted(die), count)):
+        if checkpoint is not None and index % CHECK_EVERY == 0:
+            checkpoint()
+        arrangements = factorial(count)
+        weight: Weight = 1
+        for face, multiplicity in Counter(dice).items():
+            arrangements //= factorial(multiplicity)
+            weight *= die[face] ** multiplicity
+        multisets[dice] = arrangements * weight
+    return multisets
+
+
+class Pool(Mapping):
+    """Outcomes of a collection of dice, as sorted tuples.
+
+    The tuples of every possible roll are only enumerated when an operator
+    needs them, while sums are calculated directly.
+    """
+
+    _multisets: Optional[GroupProbabilities] = None
+
+    # Called every CHECK_EVERY rolls enumerated, and while finding sums.
+    checkpoint: Checkpoint = None
+
+    @property
+    def multisets(self) -> GroupProbabilities:
+        if self._multisets is None:
+            self._multisets = self.enumerate()
+        return self._multisets
+
+    def enumerate(self) -> GroupProbabilities:
+        raise NotImplementedError
+
+    def sum_distribution(self) -> Probabilities:
+        """Distribution of the sum of the dice."""
+        raise NotImplementedError
+
+    def __getitem__(self, key: Tuple[int, ...]):
+        return self.multisets[key]
+
+    def __iter__(self) -> Iterator[Tuple[int, ...]]:
+        return iter(self.multisets)
+
+    def __len__(self):
+        return len(self.multisets)
+
+
+class DicePool(Pool):
+    """Outcomes of rolling a number of identical dice.
+
+    Sums are found by convolution.
+    """
+
+    counts: Probabilities
+    die: Probabilities
+
+    def __init__(self, counts: Probabilities, die: Probabilities, checkpoint: Checkpoint = None):
+        self.counts = counts
+        self.die = die
+        self.checkpoint = checkpoint
+
+    def __repr__(self):
+        return f"<DicePool {self.counts} x {self.die}>"
+
+    def enumerate(self) -> GroupProbabilities:
+        total = sum(self.counts.values())
+        multisets: GroupProbabilities = {}
+        for count, weight in self.counts.items():
+            dice_total = sum(self.die.values()) ** count
+            for dice, chance in multiset_weights(count, self.die, self.checkpoint).items():
+                multisets[dice] = multisets.get(dice, 0) + chance / dice_total * weight / total
+        return multisets
+
+    def sum_distribution(self) -> Probabilities:
+        total = sum(self.counts.values())
+
+        probabilities: Probabilities = {}
+        for count, weight in self.counts.items():
+            if is_scalar(self.die):
+                rolls = Dense.from_dict(self.die).power(count)
+                sums = rolls.to_dict()
+            else:
+                sums = {0: 1}
+                for _ in range(count):
+                    sums = combine(sums, self.die, lambda a, b: a + b)
+
+            sums_total = sum(sums.values())
+            for value, chance in sums.items():
+                probabilities[value] = probabilities.get(value, 0) + chance / sums_total * weight / total
+        return probabilities
+
+    def count_distribution(self) -> Probabilities:
+        """Distribution of the number of dice."""
+        total = sum(self.counts.values())
+        return {count: weight / total for count, weight in self.counts.items()}
+
+    def filter(self, check: Callable[[Any], bool]) -> Distribution:
+        """The dice for which CHECK holds.
+
+        Each die passes independently, so the number of passing dice is
+        binomially distributed, and the passing dice are still independent.
+        """
+        die = {face: weight for face, weight in self.die.items() if check(face)}
+        if not die:
+            return {(): 1.0}
+
+        chance = sum(die.values()) / sum(self.die.values())
+        total = sum(self.counts.values())
+
+        counts: Dict[int, float] = {}
+        for count, weight in self.counts.items():
+            for passed in range(count + 1):
+                probability = comb(count, passed) * chance**passed * (1 - chance) ** (count - passed)
+                counts[passed] = counts.get(passed, 0) + probability * weight / total
+
+        return DicePool({count: weight for count, weight in counts.items() if weight}, die, self.checkpoint)
+
+
+class KeepPool(Pool):
+    """The KEEP largest or least dice of a dice pool.
+
+    Sums are found by dynamic programming over the faces of the die,
+    counting how many dice land on each face, highest first for largest
+    and lowest first for least.
+    """
+
+    def __init__(self, pool: DicePool, keep: int, largest: bool):
+        self.pool = pool
+        self.keep = keep
+        self.largest = largest
+        self.checkpoint = pool.checkpoint
+
+    def __repr__(self):
+        return f"<KeepPool {'largest' if self.largest else 'least'} {self.keep} of {self.pool}>"
+
+    def enumerate(self) -> GroupProbabilities:
+        multisets: GroupProbabilities = {}
+        for index, (dice, chance) in enumerate(self.pool.items()):
+            if self.checkpoint is not None and index % CHECK_EVERY == 0:
+                self.checkpoint()
+            selected_dice = tuple(sorted(sorted(dice, reverse=self.largest)[: self.keep]))
+            multisets[selected_dice] = multisets.get(selected_dice, 0) + chance
+        return multisets
+
+    def sum_distribution(self) -> Probabilities:
+        total = sum(self.pool.counts.values())
+
+        probabilities: Probabilities = {}
+        for count, weight in self.pool.counts.items():
+            sums = keep_sum_weights(count, self.keep, self.pool.die, self.largest, self.checkpoint)
+            sums_total = sum(sums.values())
+            for value, chance in sums.items():
+                probabilities[value] = probabilities.get(value, 0) + chance / sums_total * weight / total
+        return probabilities
+
+
+def keep_sum_weights(count: int, keep: int, die: Probabilities, largest: bool, checkpoint: Checkpoint = None) -> Probabilities:
+    """Weights of the sum of the KEEP largest (or least) of COUNT dice.
+
+    Faces are visited from the best to the worst, choosing how many of the
+    remaining dice land on each. As the dice are visited in order, the first
+    KEEP dice assigned are the ones kept. Once they are all assigned, the
+    rest of the dice can land on any of the worse faces, without changing
+    the sum.
+    """
+    keep = max(min(keep, count), 0)
+    faces = sorted(die, reverse=largest)
+    worse_weights = [sum(die[face] for face in faces[i + 1 :]) for i in range(len(faces))]
+
+    sums: Probabilities = {}
+    if keep == 0:
+        sums[0] = sum(die.values()) ** count
+        return sums
+
+    # (dice assigned, sum of kept dice) -> weight, for fewer than KEEP dice assigned.
+    states: Dict[Tuple[int, int], Weight] = {(0, 0): 1}
+    for face, worse in zip(faces, worse_weights):
+        weight = die[face]
+        next_states: Dict[Tuple[int, int], Weight] = {}
+        for (assigned, total), ways in states.items():
+            if checkpoint is not None:
+                checkpoint()
+            remaining = count - assigned
+            power = 1
+            for landed in range(remaining + 1):
+                kept = min(assigned + landed, keep) - assigned
+                value = total + face * kept
+                chance = ways * comb(remaining, landed) * power
+                if assigned + landed < keep:
+                    next_states[(assigned + landed, value)] = next_states.get((assigned + landed, value), 0) + chance
+                else:
+                    sums[value] = sums.get(value, 0) + chance * worse ** (remaining - landed)
+                power *= weight
+        states = next_states
+
+    return {value: weight for value, weight in sums.items() if weight}
@@ -1,4 +1,10 @@
-"""Error handling."""
+"""Error handling.
+
+Errors of each tokenize and parse are collected by an ErrorHandler of
+their own. The module level handler refers to the handler of the last
+tokenizer created in the current thread or asyncio task.
+"""
+from contextvars import ContextVar
 from dataclasses import dataclass
 from typing import List, Optional
 
@@ -25,15 +31,19 @@ class ParserError(Error):
 
 @dataclass
 class InterpreterError(Error):
-    ...
+    def __str__(self):
+        if self.message is None:
+            return f"Interpreter-error at line {self.line}, column {self.column}"
+        return f"Interpreter-error at line {self.line}, column {self.column}: {self.message}"
 
 
 class ErrorHandler:
-    had_error: bool = False
-    error_report: List[Error] = []
+    had_error: bool
+    error_report: List[Error]
 
     def __init__(self):
-        ...
+        self.had_error = False
+        self.error_report = []
 
     def reset(self):
         self.had_error = False
@@ -44,4 +54,40 @@ class ErrorHandler:
         self.error_report.append(error)
 
 
-handler = ErrorHandler()
+_current: ContextVar[ErrorHandler] = ContextVar("error_handler")
+
+
+def current() -> ErrorHandler:
+    """Error handler of the current thread or asyncio task."""
+    try:
+        return _current.get()
+    except LookupError:
+        errors = ErrorHandler()
+        _current.set(errors)
+        return errors
+
+
+def use(errors: ErrorHandler):
+    """Make ERRORS the error handler of the current thread or asyncio task."""
+    _current.set(errors)
+
+
+class CurrentErrorHandler:
+    """Stand-in for the error handler of the current thread or asyncio task."""
+
+    @property
+    def had_error(self) -> bool:
+        return current().had_error
+
+    @property
+    def error_report(self) -> List[Error]:
+        return current().error_report
+
+    def reset(self):
+        current().reset()
+
+    def report(self, error: Error):
+        current().report(error)
+
+
+handler = CurrentErrorHandler()
@@ -0,0 +1,165 @@
+"""Probability estimates by sampling, for programs without an exact distribution.
+
+Rolls are split in chunks of a fixed size, each rolled with its own seed
+derived from the master seed, so estimates are reproducible whatever the
+number of worker processes. Limits are checked with a guard for each chunk.
+"""
+import math
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from . import batch
+from .ast import expression
+from .ast import statement
+from .calculator import summarize, to_outcome
+from .compiler import ClosureCompiler, ClosureInterpreter
+from .functions import derive_seed
+from .limits import Limits, guard
+
+CHUNK_SIZE = 10_000
+
+# Two-sided 95% quantile of the normal distribution.
+Z_95 = 1.959963984540054
+
+Statements = Sequence[Union[expression.Expression, statement.Statement]]
+
+
+def batch_outcomes(results: Any) -> Counter:
+    """Count outcomes of a vectorized roll."""
+    if isinstance(results, list):
+        return Counter(to_outcome(result) for result in results)
+
+    if results.ndim == 1:
+        return Counter(results.tolist())
+
+    return Counter(tuple(sorted(row)) for row in results.tolist())
+
+
+def sample_outcomes(
+    statements: Statements,
+    samples: int,
+    seed: int,
+    deadline: Optional[float] = None,
+    average: bool = False,
+    limits: Optional[Limits] = None,
+) -> Counter:
+    """Roll STATEMENTS up to SAMPLES times, counting the outcomes of the last statement.
+
+    Stops early if the wall clock passes DEADLINE. Raises LimitExceeded if
+    a roll goes over LIMITS.
+    """
+    if deadline is not None and time.time() > deadline:
+        return Counter()
+
+    chunk_guard = guard(limits)
+
+    if len(statements) == 1 and batch.np is not None:
+        evaluator = batch.BatchEvaluator(samples, seed, average)
+        evaluator.guard = chunk_guard
+        try:
+            return batch_outcomes(evaluator.evaluate(statements[0]))
+        except batch.NotVectorizable:
+            pass
+
+    program = ClosureCompiler().compile(statements)
+    interpreter = ClosureInterpreter(seed)
+    interpreter.guard = chunk_guard
+
+    outcomes: Counter = Counter()
+    for _ in range(samples):
+        if chunk_guard is not None:
+            chunk_guard.next_roll()
+        outcomes[to_outcome(interpreter.run(program, average)[-1])] += 1
+        if deadline is not None and time.time() > deadline:
+            break
+    return outcomes
+
+
+class Estimator:
+    """Estimate the distribution of a program by rolling it many times."""
+
+    samples: int
+    budget: Optional[float]
+    jobs: int
+    seed: Optional[int]
+    limits: Optional[Limits]
+
+    rolled: int = 0
+    intervals: Dict[Any, Tuple[float, float]]
+    average_interval: Optional[Tuple[float, float]] = None
+
+    def __init__(
+        self,
+        samples: int = 100_000,
+        budget: Optional[float] = None,
+        jobs: int = 1,
+        seed: Optional[int] = None,
+        limits: Optional[Limits] = None,
+    ):
+        """Create an estimator.
+
+        Keyword arguments:
+        samples -- Number of rolls
+        budget -- Wall clock seconds to stop rolling after, if not all samples are done
+        jobs -- Number of worker processes
+        seed -- Master seed, the seeds of each chunk of rolls are derived from it
+        limits -- Limits on each roll, the timeout on each chunk of rolls
+        """
+        self.samples = samples
+        self.budget = budget
+        self.jobs = jobs
+        self.seed = seed
+        self.limits = limits
+        self.intervals = {}
+
+    def __repr__(self):
+        return f"<Estimator {self.samples} samples>"
+
+    def interpret(self, statements: Statements, average: bool = False):
+        """Estimate the distribution, returning the same values as Calculator.interpret.
+
+        Raises LimitExceeded if a roll goes over the limits.
+        """
+        seed = self.seed if self.seed is not None else random.randrange(sys.maxsize)
+        deadline = None if self.budget is None else time.time() + self.budget
+
+        chunks = [min(CHUNK_SIZE, self.samples - start) for start in range(0, self.samples, CHUNK_SIZE)]
+        statements = list(statements)
+
+        outcomes: Counter = Counter()
+        if self.jobs > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(self.jobs) as executor:
+                futures = [
+                    executor.submit(sample_outcomes, statements, size, derive_seed(seed, index), deadline, average, self.limits)
+                    for index, size in enumerate(chunks)
+                ]
+                for future in futures:
+                    outcomes.update(future.result())
+        else:
+            for index, size in enumerate(chunks):
+                outcomes.update(sample_outcomes(statements, size, derive_seed(seed, index), deadline, average, self.limits))
+
+        self.rolled = sum(outcomes.values())
+        if not self.rolled:
+            raise TimeoutError("No rolls finished within the time budget")
+
+        histogram, average_value, spread, mean_deviation = summarize(outcomes)
+        self.intervals = {value: self.interval(chance) for value, chance in histogram.items()}
+
+        self.average_interval = None
+        if average_value is not None and spread is not None:
+            error = Z_95 * spread / math.sqrt(self.rolled)
+            self.average_interval = (average_value - error, average_value + error)
+
+        return histogram, average_value, spread, mean_deviation
+
+    def interval(self, chance: float) -> Tuple[float, float]:
+        """95% confidence interval of a probability, by the Wilson score."""
+        n = self.rolled
+        centre = (chance + Z_95**2 / (2 * n)) / (1 + Z_95**2 / n)
+        error = Z_95 / (1 + Z_95**2 / n) * math.sqrt(chance * (1 - chance) / n + Z_95**2 / (4 * n * n))
+        return (max(centre - error, 0.0), min(centre + error, 1.0))
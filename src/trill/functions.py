@@ -2,10 +2,11 @@
 import itertools
 import random
 import operator
-from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union, cast
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union, cast
 from trill.tokens import Token, TokenType
 
-from trill.types import Number, NumberList
+from trill.types import Number, NumberList, RandomSource
 
 CALC_OPERATORS = {
     TokenType.PLUS: operator.add,
@@ -43,8 +44,50 @@ def dice_average(sides: int, count: int = 1, start: int = 1):
     return [(sides + start) / 2] * count
 
 
-def dice_roll(sides: int, count: int = 1, start: int = 1):
-    return [random.randint(start, sides) for _ in range(int(count))]
+def dice_roll(sides: int, count: int = 1, start: int = 1, rng: RandomSource = random):
+    if isinstance(rng, NumpyRandom):
+        return rng.dice(start, sides, int(count))
+    randint = rng.randint
+    return [randint(start, sides) for _ in range(int(count))]
+
+
+class NumpyRandom:
+    """Roll dice with a NumPy Generator, in place of random.Random.
+
+    Many dice are rolled with a single call to the generator.
+    """
+
+    def __init__(self, generator: Any):
+        self.generator = generator
+
+    def __repr__(self):
+        return f"<NumpyRandom {self.generator}>"
+
+    @classmethod
+    def from_seed(cls, seed: Optional[int] = None) -> "NumpyRandom":
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        return cls(np.random.default_rng(seed))
+
+    def randint(self, a: int, b: int) -> int:
+        return int(self.generator.integers(a, b + 1))
+
+    def random(self) -> float:
+        return float(self.generator.random())
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        return seq[int(self.generator.integers(len(seq)))]
+
+    def sample(self, population: Sequence[Any], k: int) -> List[Any]:
+        return [population[i] for i in self.generator.choice(len(population), k, replace=False)]
+
+    def dice(self, start: int, sides: int, count: int) -> List[int]:
+        return self.generator.integers(start, sides + 1, size=count).tolist()
+
+
+def derive_seed(seed: int, index: int) -> int:
+    """Seed for the INDEX-th independent stream of rolls derived from SEED."""
+    return random.Random(f"{seed}:{index}").randrange(sys.maxsize)
 
 
 def dice_probabilities(sides: int, z: bool = False) -> Dict[int, Union[int, float]]:
@@ -108,7 +151,11 @@ def text_align(
 
 
 def unary_expression(
-    token_type: TokenType, value: Any, expression_operator: Token, average: bool = False
+    token_type: TokenType,
+    value: Any,
+    expression_operator: Token,
+    average: bool = False,
+    rng: RandomSource = random,
 ):
     if token_type == TokenType.NOT:
         if not value:
@@ -130,7 +177,7 @@ def unary_expression(
         if average:
             return dice_average(value, start=start)[0]
 
-        return dice_roll(value, start=start)[0]
+        return dice_roll(value, start=start, rng=rng)[0]
 
     if token_type == TokenType.SUM:
         if isinstance(value, (int, float)):
@@ -147,7 +194,7 @@ def unary_expression(
         if average:
             return value[len(value) // 2]
 
-        return random.choice(value)
+        return rng.choice(value)
 
     if token_type == TokenType.MIN:
         return min(value)
@@ -184,7 +231,7 @@ def unary_expression(
             else:
                 val = 0.0
         else:
-            val = random.random()
+            val = rng.random()
 
         if val < value:
             return 1
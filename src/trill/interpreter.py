@@ -1,12 +1,15 @@
 """Troll interpreter."""
-from typing import ChainMap, Dict, TypeVar, List, Any, Union
-import random
+from typing import Dict, Iterator, Optional, Tuple, TypeVar, List, Any, Union
 from trill import functions
 from trill.string import process_string
 
-from trill.types import Number, NumberList
+from trill.types import Number, NumberList, RandomSource
 from .ast import expression
 from .ast import statement
+from .limits import Guard, recursion_limit
+from .profile import Profile
+from .purity import Purity, arguments_key, recall, recursive, remember
+from .scope import Scope
 from .tokens import Token, TokenType
 
 T = TypeVar("T")
@@ -17,20 +20,48 @@ class UnknownType(Exception):
 
 
 class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]):
-    average: bool = False
+    average: bool
+    variables: Scope
+    functions: Dict[str, Union[statement.Function, statement.Compositional]]
 
-    # variables: Dict[str, Union[int, str]] = {}
-    variables: ChainMap[str, Union[Number, NumberList, str]] = ChainMap({})
-    functions: Dict[str, Union[statement.Function, statement.Compositional]] = {}
+    profile: Optional[Profile] = None
+
+    # Checks loops, calls and collection lengths against limits, if set.
+    guard: Optional[Guard] = None
+
+    # Functions that give the same result for the same arguments, and their results in this run.
+    purity: Purity
+    memo: Dict[Tuple[statement.Function, Tuple[Any, ...]], Any]
+
+    def __init__(self, seed: Optional[int] = None, rng: Optional[RandomSource] = None, profile: bool = False):
+        """Create an interpreter, recording a Profile of the nodes visited if PROFILE is set."""
+        super().__init__(seed, rng)
+        self.average = False
+        self.variables = Scope()
+        self.functions = {}
+        self.purity = Purity(self.functions)
+        self.memo = {}
+
+        if profile:
+            self.profile = Profile()
+            self.profile.instrument(self)
 
     def __repr__(self):
         return "<Interpreter >"
 
     def push(self):
-        self.variables = self.variables.new_child()
+        self.variables.push()
 
     def pop(self):
-        self.variables = self.variables.parents
+        self.variables.pop()
+
+    def recursive(self, statements: List[Union[expression.Expression, statement.Statement]]) -> bool:
+        """Whether the functions known, or declared in STATEMENTS, can call themselves."""
+        functions = dict(self.functions)
+        for stmt in statements:
+            if isinstance(stmt, (statement.Function, statement.Compositional)) and isinstance(stmt.name.literal, str):
+                functions[stmt.name.literal] = stmt
+        return recursive(functions)
 
     def interpret(
         self,
@@ -38,21 +69,51 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
         average: bool = False,
     ) -> List[Union[Number, NumberList, str]]:
         self.average = average
-        self.variables = ChainMap({})
+        self.variables = Scope()
+        self.purity = Purity(self.functions)
+        self.memo = {}
         output: List[Any] = []
 
-        # Find all function delcarations first, so that they are available on run.
-        for stmt in statements:
-            if isinstance(stmt, statement.Function):
-                output.append(stmt.accept(self))
+        with recursion_limit(self.guard, self.recursive(statements)):
+            # Find all function delcarations first, so that they are available on run.
+            for stmt in statements:
+                if isinstance(stmt, statement.Function):
+                    output.append(stmt.accept(self))
 
-        # Run statements, skip function declarations, as they are already done.
-        for stmt in statements:
-            if isinstance(stmt, statement.Function):
-                continue
-            output.append(stmt.accept(self))
+            # Run statements, skip function declarations, as they are already done.
+            for stmt in statements:
+                if isinstance(stmt, statement.Function):
+                    continue
+                output.append(stmt.accept(self))
         return output
 
+    def iterate(
+        self,
+        statements: List[Union[expression.Expression, statement.Statement]],
+        average: bool = False,
+    ) -> Iterator[Tuple[int, Union[expression.Expression, statement.Statement], Any]]:
+        """Run STATEMENTS like interpret, yielding the index in the output, the statement and its value.
+
+        Each line of a print statement is yielded as soon as it is rolled.
+        """
+        self.average = average
+        self.variables = Scope()
+        self.purity = Purity(self.functions)
+        self.memo = {}
+
+        ordered = [stmt for stmt in statements if isinstance(stmt, statement.Function)]
+        ordered += [stmt for stmt in statements if not isinstance(stmt, statement.Function)]
+
+        with recursion_limit(self.guard, self.recursive(statements)):
+            for index, stmt in enumerate(ordered):
+                if isinstance(stmt, statement.Print):
+                    for _ in range(stmt.repeats):
+                        if self.guard is not None:
+                            self.guard.step(stmt)
+                        yield index, stmt, str(stmt.expression.accept(self))
+                else:
+                    yield index, stmt, stmt.accept(self)
+
     def visit_Literal_Expression(self, expr: expression.Literal) -> Union[str, int, float, List[str], List[List[str]], None]:
         if isinstance(expr.value, str):
             return process_string(expr.value)
@@ -67,6 +128,7 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
             right,
             expr.operator,
             self.average,
+            self.random,
         )
 
     def visit_Binary_Expression(self, expr: expression.Binary):
@@ -81,6 +143,9 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
         right_value = expr.right.accept(self)
 
         if token_type in functions.COLLECTION_TOKENS:
+            if token_type == TokenType.SAMPLES and self.guard is not None:
+                size = len(right_value) if isinstance(right_value, list) else 1
+                self.guard.length(int(left_value) * size, expr.operator)
             return functions.collection_operation(token_type, left_value, right_value)
 
         left = self.variables.get(left_value, left_value) if isinstance(left_value, str) else left_value
@@ -93,15 +158,19 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
             start = 0 if expr.operator.lexeme == "z" else 1
             if not (isinstance(right, int) and isinstance(left, (int, float))):
                 raise TypeError(f"Dice average only support ints, got {right} and {left}")
+            if self.guard is not None:
+                self.guard.length(int(left), expr.operator)
 
             if self.average:
                 return functions.dice_average(right, int(left), start)
 
-            return functions.dice_roll(right, int(left), start)
+            return functions.dice_roll(right, int(left), start, self.random)
 
         if token_type == TokenType.RANGE:
             if not (isinstance(right, int) and isinstance(left, (int,))):
                 raise TypeError(f"Range only support ints, got {right} and {left}")
+            if self.guard is not None:
+                self.guard.length(right - left + 1, expr.operator)
             return list(range(left, right + 1))
 
         if token_type == TokenType.UNION:
@@ -111,6 +180,8 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
             if not isinstance(right, list):
                 right = [right]
 
+            if self.guard is not None:
+                self.guard.length(len(left) + len(right), expr.operator)
             return left + right
 
         if token_type == TokenType.PICK:
@@ -126,7 +197,7 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
                 mid_point = len(left) // 2
                 return left[mid_point - offset : mid_point + offset + 1]
 
-            return random.sample(left, samples)
+            return self.random.sample(left, samples)
 
         if token_type in [TokenType.DROP, TokenType.KEEP, TokenType.MINUSMINUS]:
             if not isinstance(left, list):
@@ -212,7 +283,7 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
         if not isinstance(expr.name.literal, str):
             raise TypeError("Variable name must be string")
 
-        return self.variables.get(expr.name.literal, None)
+        return self.variables.current.get(expr.name.literal)
 
     def visit_Conditional_Expression(self, stmt: expression.Conditional):
         if stmt.condition.accept(self):
@@ -228,7 +299,9 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
         if not isinstance(expr.iterator.name.literal, str):
             raise TypeError("Variable name must be string")
 
-        for val in values:
+        for count, val in enumerate(values, 1):
+            if self.guard is not None:
+                self.guard.iteration(count, expr)
             self.variables[expr.iterator.name.literal] = val
             output.append(expr.block.accept(self))
         self.pop()
@@ -241,14 +314,21 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
 
         self.push()
         action_variable_name = action.name
+        count = 1
         if condition.token_type == TokenType.WHILE:
             res = action.accept(self)
             while qualifier.accept(self) and not self.average:
+                count += 1
+                if self.guard is not None:
+                    self.guard.iteration(count, stmt)
                 res = action.accept(self)
 
         if condition.token_type == TokenType.UNTIL:
             res = action.accept(self)
             while not qualifier.accept(self) and not self.average:
+                count += 1
+                if self.guard is not None:
+                    self.guard.iteration(count, stmt)
                 res = action.accept(self)
 
         if not isinstance(action_variable_name.literal, str):
@@ -272,7 +352,12 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
 
         result.append(self.variables.get(action_variable_name.literal))
 
+        count = 1
         while qualifier.accept(self):
+            count += 1
+            if self.guard is not None:
+                self.guard.iteration(count, stmt)
+                self.guard.length(len(result) + 1, stmt)
             action.accept(self)
             val = self.variables.get(action_variable_name.literal)
             if isinstance(val, (int, float)):
@@ -302,12 +387,19 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
         if not isinstance(expr.name.literal, str):
             raise TypeError("Function name must be string")
 
-        stmt = self.functions[expr.name.literal]
+        stmt = expr.function if expr.function is not None else self.functions[expr.name.literal]
+
+        if self.guard is not None:
+            self.guard.enter(expr.name)
 
         if isinstance(stmt, statement.Compositional):
-            return self.call_compositional(expr, stmt)
+            res = self.call_compositional(expr, stmt)
+        else:
+            res = self.call_function(expr, stmt)
 
-        return self.call_function(expr, stmt)
+        if self.guard is not None:
+            self.guard.leave()
+        return res
 
     def call_compositional(self, expr: expression.Call, stmt: statement.Compositional):
         self.push()
@@ -351,27 +443,96 @@ class Interpreter(expression.ExpressionVisitor[T], statement.StatementVisitor[T]
         return res
 
     def call_function(self, expr: expression.Call, stmt: statement.Function):
+        depth = self.variables.depth
+        arguments = self.bind_arguments(expr, stmt)
+
+        # Tail calls to closed functions are made in this loop, in place of the call they return from.
+        keys = []
+        calls = 0
+        while True:
+            # Pure functions are run once for each list of arguments.
+            if len(arguments) == len(stmt.parameters) and self.purity.pure(stmt):
+                key = (stmt, arguments_key(arguments))
+                if key in self.memo:
+                    res = recall(self.memo[key])
+                    break
+                keys.append(key)
+
+            if not isinstance(stmt.expression, statement.Expression):
+                res = stmt.accept(self)
+                break
+
+            node = stmt.expression if self.profile is not None else self.tail(stmt.expression)
+            callee = self.tail_callee(node)
+            if callee is None:
+                res = node.accept(self)
+                break
+
+            # Tail calls do not nest, so they count as iterations of a loop rather than against the depth.
+            assert isinstance(node, expression.Call)
+            calls += 1
+            if self.guard is not None:
+                self.guard.iteration(calls, node.name)
+
+            # The callee only reads its own variables, so the scopes of the call it replaces are left.
+            arguments = self.bind_arguments(node, callee)
+            bindings = self.variables.innermost()
+            self.variables.restore(depth)
+            self.variables.push(bindings)
+            stmt = callee
+
+        self.variables.restore(depth)
+        for key in keys:
+            remember(self.memo, key, recall(res))
+        return res
+
+    def bind_arguments(self, expr: expression.Call, stmt: statement.Function) -> List[Any]:
+        """Set the parameters of STMT to the arguments of EXPR, in a new scope, returning their values."""
         self.push()
+        arguments = []
         for name, value in zip(stmt.parameters, expr.parameters):
             if not isinstance(name.literal, str):
                 raise TypeError("Name of variable must be string")
 
-            self.variables[name.literal] = value.accept(self)
+            argument = self.variables[name.literal] = value.accept(self)
+            arguments.append(argument)
+        return arguments
+
+    def tail(self, node: expression.Expression) -> expression.Expression:
+        """The expression giving the value of NODE, running the conditions and statements before it."""
+        while True:
+            if isinstance(node, expression.Grouping):
+                node = node.expression
+            elif isinstance(node, expression.Conditional):
+                node = node.truth if node.condition.accept(self) else node.falsy
+            elif isinstance(node, expression.Block) and node.statements:
+                self.push()
+                for stmt in node.statements[:-1]:
+                    stmt.accept(self)
+                node = node.statements[-1]
+            else:
+                return node
 
-        if isinstance(stmt.expression, statement.Expression):
-            res = stmt.expression.accept(self)
-            self.pop()
-            return res
+    def tail_callee(self, node: expression.Expression) -> Optional[statement.Function]:
+        """The function NODE calls, if it is closed, so the call can replace the one returning it."""
+        if not isinstance(node, expression.Call) or not isinstance(node.name.literal, str):
+            return None
 
-        res = stmt.accept(self)
-        self.pop()
-        return res
+        callee = node.function if node.function is not None else self.functions.get(node.name.literal)
+        if not isinstance(callee, statement.Function) or len(node.parameters) != len(callee.parameters):
+            return None
+        return callee if self.purity.closed(callee) else None
 
     def visit_Print_Statement(self, stmt: statement.Print):
         repeats = stmt.repeats
         expr = stmt.expression
 
-        return [str(expr.accept(self)) for _ in range(repeats)]
+        output = []
+        for _ in range(repeats):
+            if self.guard is not None:
+                self.guard.step(stmt)
+            output.append(str(expr.accept(self)))
+        return output
 
     def visit_TextAlign_Expression(self, expr: expression.TextAlign):
         align_operator = expr.operator
@@ -0,0 +1,187 @@
+"""Limits on the work of a roll, for running programs that can not be trusted.
+
+A Guard counts the work of one roll, and raises LimitExceeded when it goes
+over its Limits. Steps are loop iterations, function calls and lines
+printed, so programs without loops or calls are only limited by the length
+of their collections. Calculators count every node they calculate as a
+step. Tail calls do not nest, so they count as iterations of a loop rather
+than against the depth. Interpreters, calculators and compiled closures only
+check a guard if they are given one. Estimates use one guard for each chunk
+of rolls, so each roll is counted on its own, and the timeout covers the chunk.
+
+Function calls nest Python calls, so rolls are also limited by the Python
+recursion limit. While a roll with recursive functions runs, recursion_limit
+raises it far enough for the depth limit of the roll, or DEPTH nested calls
+without one. Other rolls nest no deeper than their source, and leave the
+limit of the process alone.
+"""
+import argparse
+import contextlib
+import dataclasses
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+from .error import InterpreterError
+from .profile import node_location
+from .tokens import Token
+
+# Nested function calls allowed when no depth limit is set.
+DEPTH = 5000
+
+# Python frames used by each nested function call, with room for the expressions around it.
+FRAMES_PER_CALL = 16
+
+
+@dataclasses.dataclass(frozen=True)
+class Limits:
+    """Limits on a roll, None for no limit.
+
+    STEPS - loop iterations, function calls and lines printed
+    ITERATIONS - iterations of a single loop
+    LENGTH - values in a single collection
+    DEPTH - nested function calls
+    TIMEOUT - seconds
+    """
+
+    steps: Optional[int] = None
+    iterations: Optional[int] = None
+    length: Optional[int] = None
+    depth: Optional[int] = None
+    timeout: Optional[float] = None
+
+
+class LimitExceeded(Exception):
+    """A roll went over one of its limits, at NODE."""
+
+    def __init__(self, message: str, node: Any = None):
+        super().__init__(message)
+        self.message = message
+        self.node = node
+
+    def __reduce__(self):
+        return (LimitExceeded, (self.message, self.node))
+
+    @property
+    def error(self) -> InterpreterError:
+        """The error to report, at the location of the node."""
+        location = (self.node.line, self.node.column) if isinstance(self.node, Token) else node_location(self.node)
+        line, column = location if location is not None else (0, 0)
+        return InterpreterError(line, column, self.message)
+
+
+class Guard:
+    """Counts the work of one roll against LIMITS.
+
+    CHECKPOINT, if given, is called on every step, so the roll can also be
+    stopped from outside by raising.
+    """
+
+    def __init__(self, limits: Limits = Limits(), checkpoint: Optional[Callable[[], None]] = None):
+        self.limits = limits
+        self.checkpoint = checkpoint
+        self.steps = 0
+        self.depth = 0
+        self.deadline = None if limits.timeout is None else time.monotonic() + limits.timeout
+
+    def __repr__(self):
+        return f"<Guard {self.steps} steps>"
+
+    def next_roll(self):
+        """Count the work of another roll, keeping the deadline."""
+        self.steps = 0
+        self.depth = 0
+
+    def step(self, node: Any):
+        self.steps += 1
+        if self.limits.steps is not None and self.steps > self.limits.steps:
+            raise LimitExceeded(f"Roll took more than {self.limits.steps} steps", node)
+        self.check(node)
+
+    def check(self, node: Any):
+        """Check the time, and call the checkpoint, at NODE without counting a step."""
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise LimitExceeded(f"Roll took more than {self.limits.timeout} seconds", node)
+        if self.checkpoint is not None:
+            self.checkpoint()
+
+    def iteration(self, count: int, node: Any):
+        """Step into iteration COUNT of the loop at NODE."""
+        self.step(node)
+        if self.limits.iterations is not None and count > self.limits.iterations:
+            raise LimitExceeded(f"Loop ran more than {self.limits.iterations} times", node)
+
+    def length(self, size: int, node: Any):
+        """Check the SIZE of a collection about to be made at NODE."""
+        if self.limits.length is not None and size > self.limits.length:
+            raise LimitExceeded(f"Collection of {size} values is longer than {self.limits.length}", node)
+
+    def enter(self, node: Any):
+        """Step into a function call at NODE."""
+        self.step(node)
+        self.depth += 1
+        if self.limits.depth is not None and self.depth > self.limits.depth:
+            raise LimitExceeded(f"Function calls nested more than {self.limits.depth} deep", node)
+
+    def leave(self):
+        self.depth -= 1
+
+
+# Rolls running with a raised recursion limit, and the limit before the first of them.
+_recursion_lock = threading.Lock()
+_recursion_rolls = 0
+_recursion_default = sys.getrecursionlimit()
+
+
+@contextlib.contextmanager
+def recursion_limit(guard: Optional[Guard] = None, recursive: bool = True) -> Iterator[None]:
+    """Raise the Python recursion limit for the nested function calls GUARD allows, DEPTH by default.
+
+    The limit is only raised for RECURSIVE programs. Only Python 3.11 and
+    later run nested Python calls without growing the C stack, so older
+    versions keep their limit.
+    """
+    global _recursion_rolls, _recursion_default  # pylint: disable=global-statement
+
+    if not recursive or sys.version_info < (3, 11):
+        yield
+        return
+
+    depth = guard.limits.depth if guard is not None and guard.limits.depth is not None else DEPTH
+    frames = depth * FRAMES_PER_CALL
+
+    with _recursion_lock:
+        if _recursion_rolls == 0:
+            _recursion_default = sys.getrecursionlimit()
+        _recursion_rolls += 1
+        sys.setrecursionlimit(max(frames, sys.getrecursionlimit()))
+    try:
+        yield
+    finally:
+        with _recursion_lock:
+            _recursion_rolls -= 1
+            if _recursion_rolls == 0:
+                sys.setrecursionlimit(_recursion_default)
+
+
+def guard(limits: Optional[Limits] = None, checkpoint: Optional[Callable[[], None]] = None) -> Optional[Guard]:
+    """A guard for one roll, or None if there is nothing to check."""
+    if limits is None and checkpoint is None:
+        return None
+    return Guard(limits or Limits(), checkpoint)
+
+
+def add_limit_arguments(parser: argparse.ArgumentParser, defaults: Limits = Limits()):
+    """Add options for each limit to PARSER."""
+    parser.add_argument("--max-steps", type=int, default=defaults.steps, help="Loop iterations and calls per roll")
+    parser.add_argument("--max-iterations", type=int, default=defaults.iterations, help="Iterations of a single loop")
+    parser.add_argument("--max-length", type=int, default=defaults.length, help="Values in a single collection")
+    parser.add_argument("--max-depth", type=int, default=defaults.depth, help="Nested function calls")
+    parser.add_argument("--timeout", type=float, default=defaults.timeout, help="Seconds per roll")
+
+
+def limits_from_arguments(args: argparse.Namespace) -> Optional[Limits]:
+    """Limits from the options added by add_limit_arguments, or None if none are set."""
+    limits = Limits(args.max_steps, args.max_iterations, args.max_length, args.max_depth, args.timeout)
+    return None if limits == Limits() else limits
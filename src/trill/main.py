@@ -1,14 +1,32 @@
 """Run Trill dice roller."""
 
 import argparse
+import itertools
+import sys
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, Mapping, Optional, TextIO, Tuple
 
-from .tokenizer import Tokenizer
-from .interpreter import Interpreter
-from .calculator import Calculator
-from .parser import Parser
-from .error import handler as error_handler
+from .analysis import analysis_lines
+from .ast import statement
+from .ast.printer import ASTPrinter
+from .calculator import CalculationError, Calculator
+from .error import Error
+from .limits import LimitExceeded, Limits, add_limit_arguments, guard, limits_from_arguments
+from .parallel import roll_parallel
+from .profile import Profile
+from .program import ENGINES, CompiledRoll, compile_roll
+from .report import (
+    Record,
+    print_table,
+    json_value,
+    probability_rows,
+    summary_lines,
+    write_csv,
+    write_json,
+    write_ndjson,
+)
+
+FORMATS = ("text", "csv", "json", "ndjson")
 
 
 def parse_args(arg_list: list[str] | None):
@@ -19,6 +37,18 @@ def parse_args(arg_list: list[str] | None):
     parser.add_argument("-p", "--probabilities", default=False, action="store_true")
     parser.add_argument("-d", "--digits", type=int, default=3)
     parser.add_argument("-m", "--multiplier", type=int, default=100)
+    parser.add_argument("-e", "--engine", choices=ENGINES, default="auto")
+    parser.add_argument("--estimate", default=False, action="store_true", help="Estimate probabilities by sampling")
+    parser.add_argument("--samples", type=int, default=100_000, help="Number of rolls when estimating probabilities")
+    parser.add_argument("--budget", type=float, default=None, help="Seconds to spend at most when estimating probabilities")
+    parser.add_argument("--profile", default=False, action="store_true", help="Show time spent per node of the roll")
+    parser.add_argument("--top", type=int, default=None, help="Only show the most likely values")
+    parser.add_argument("--bucket", type=int, default=None, help="Group values in ranges of this size")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="text", help="Output format")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Roll statements in this many worker processes")
+    parser.add_argument("--ast", default=False, action="store_true", help="Print the optimized syntax tree instead of rolling")
+    parser.add_argument("--analyze", default=False, action="store_true", help="Print the engines that can run the roll")
+    add_limit_arguments(parser)
 
     args = parser.parse_args(arg_list)
     return args
@@ -31,6 +61,18 @@ def run(
     probabilities: bool = False,
     digits: int = 3,
     multiplier: int = 100,
+    engine: str = "auto",
+    estimate: bool = False,
+    samples: int = 100_000,
+    budget: Optional[float] = None,
+    jobs: Optional[int] = None,
+    profile: bool = False,
+    top: Optional[int] = None,
+    bucket: Optional[int] = None,
+    output_format: str = "text",
+    limits: Optional[Limits] = None,
+    ast: bool = False,
+    analyze: bool = False,
 ):
     """
     Use SOURCE to roll dice according to the Troll language.
@@ -41,70 +83,262 @@ def run(
     PROBABILITIES - Calculate probabilities
     DIGITS - Number of digits in probabilities
     MULTIPLIER - Use 100 for percent (default)
+    ENGINE - Evaluate with the "interpreter" or the "closure" compiler, or pick one with "auto" (default)
+    ESTIMATE - Estimate probabilities by sampling, also used when they can not be calculated exactly
+    SAMPLES - Number of rolls when estimating
+    BUDGET - Seconds to spend at most when estimating
+    JOBS - Roll independent statements, and chunks of repeats, in this many worker processes
+    PROFILE - Show time spent per node of the roll, and of calculating probabilities
+    TOP - Only show the TOP most likely values
+    BUCKET - Group values in ranges of BUCKET values
+    OUTPUT_FORMAT - "text" (default), "csv" for probabilities only,
+        or "json" and "ndjson" for records of rolls, errors and probabilities
+    LIMITS - Stop rolls and calculations going over these limits, each statement on its own with JOBS
+    AST - Print the syntax tree, with constants folded, instead of rolling
+    ANALYZE - Print the engines that can run the roll, and its number of outcomes, instead of rolling
     """
     if Path(source).exists():
         with open(Path(source), "r", encoding="utf-8") as f:
             source = f.read()
 
-    tokens = Tokenizer(source).scan_tokens()
-    parsed = Parser(tokens).parse()
-    result = Interpreter(seed).interpret(parsed, average=average)
+    program = compile_roll(source)
 
-    if error_handler.had_error:
-        for error in error_handler.error_report:
+    if ast or analyze:
+        for error in program.errors:
             print(error)
+        lines = ASTPrinter().print(program.statements) if ast else analysis_lines(program.analysis)
+        for line in lines:
+            print(line)
         return
 
-    for line in result:
-        print(line)
+    roll_profile = Profile() if profile else None
+    profile_file = sys.stderr if output_format in ("json", "ndjson") else None
 
-    if probabilities:
-        from rich.console import Console  # pylint: disable=import-outside-toplevel
-        from rich.table import Table  # pylint: disable=import-outside-toplevel
-        from rich.bar import Bar  # pylint: disable=import-outside-toplevel
+    if output_format in ("json", "ndjson"):
+        records = roll_records(program, seed, average, engine, jobs, roll_profile, limits)
+        if probabilities:
+            records = until_error(
+                records,
+                lambda: probability_records(
+                    program, top, bucket, estimate, samples, budget, jobs, seed, profile, profile_file, limits
+                ),
+            )
+        if output_format == "json":
+            write_json(records, sys.stdout)
+        else:
+            write_ndjson(records, sys.stdout)
+
+        if roll_profile is not None:
+            roll_profile.print("Roll profile", file=profile_file)
+        return
+
+    if profile:
+        result, errors = program.roll(seed, average, profile=roll_profile, limits=limits)
+    elif jobs is None:
+        result, errors = program.roll(seed, average, engine, limits=limits)
+    else:
+        result, errors = roll_parallel(source, seed, average, engine, jobs, limits)
+
+    if errors:
+        for error in errors:
+            print(error)
+        return
+
+    if not (probabilities and output_format == "csv"):
+        for line in result:
+            print(line)
 
-        histogram, roll_average, spread, mean_deviation = Calculator().interpret(parsed)
-        total = 1.0
+    if roll_profile is not None:
+        roll_profile.print("Roll profile")
 
-        table = Table(title="Probabilities")
+    if probabilities:
+        try:
+            histogram, summary, calculator = calculate(program, estimate, samples, budget, jobs, seed, profile, limits)
+        except (LimitExceeded, CalculationError) as e:
+            print(e.error)
+            return
 
-        table.add_column("Value", justify="right")
-        if multiplier == 100:
-            table.add_column("% =", justify="right")
-            table.add_column("% ≥", justify="right")
+        rows = probability_rows(histogram, top, bucket)
+        if output_format == "csv":
+            write_csv(rows, sys.stdout)
         else:
-            table.add_column(f"x{multiplier} =", justify="right")
-            table.add_column(f"x{multiplier} ≥", justify="right")
+            print_table(rows, multiplier, digits)
+            for line in summary_lines(summary):
+                print(line)
 
-        table.add_column("Probability graph")
+        if calculator.profile is not None and "rolls" not in summary:
+            calculator.profile.print("Probability profile")
 
-        for value, chance in dict(sorted(histogram.items())).items():
-            if isinstance(value, tuple):
-                value = " ".join(str(x) for x in value)
 
-            table.add_row(
-                f"{value}",
-                f"{round(chance * multiplier, digits):.{digits}f}",
-                f"{round(total * multiplier, digits):.{digits}f}",
-                Bar(1, 0, chance),
-            )
+def calculate(
+    program: CompiledRoll,
+    estimate: bool = False,
+    samples: int = 100_000,
+    budget: Optional[float] = None,
+    jobs: Optional[int] = None,
+    seed: Optional[int] = None,
+    profile: bool = False,
+    limits: Optional[Limits] = None,
+) -> Tuple[Mapping[Any, float], Dict[str, Any], Calculator]:
+    """Distribution of PROGRAM, with a summary, estimated if it can not be calculated exactly.
+
+    Programs are only calculated if their analysis finds them exact, and
+    small enough. Raises LimitExceeded if calculating or estimating goes over LIMITS,
+    and CalculationError if an outcome can not be calculated, like a division by zero.
+    """
+    calculated = None
+    calculator = Calculator(profile=profile)
+    calculator.guard = guard(limits)
+    if not estimate and program.analysis.calculable:
+        try:
+            calculated = calculator.interpret(list(program.statements))
+        except (NotImplementedError, RecursionError):
+            pass
+        except (ArithmeticError, ValueError) as e:
+            raise CalculationError(f"Probabilities can not be calculated: {e}", program.statements[-1]) from e
+
+    if calculated is not None:
+        histogram, roll_average, spread, mean_deviation = calculated
+        return histogram, {"average": roll_average, "spread": spread, "mean_deviation": mean_deviation}, calculator
 
-            total -= chance
+    from .estimator import Estimator  # pylint: disable=import-outside-toplevel
 
-        console = Console()
-        console.print(table)
-        if roll_average:
-            console.print(f"Average: {roll_average}")
-        if spread:
-            console.print(f"Spread: {spread}")
-        if mean_deviation:
-            console.print(f"Mean deviation: {mean_deviation}")
+    estimator = Estimator(samples, budget, jobs or 1, seed, limits)
+    histogram, roll_average, spread, mean_deviation = estimator.interpret(program.statements)
+    summary = {
+        "average": roll_average,
+        "spread": spread,
+        "mean_deviation": mean_deviation,
+        "rolls": estimator.rolled,
+        "average_interval": estimator.average_interval,
+    }
+    return histogram, summary, calculator
+
+
+def until_error(records: Iterator[Record], then: Callable[[], Iterator[Record]]) -> Iterator[Record]:
+    """RECORDS, followed by the records of THEN unless there was an error record."""
+    failed = False
+    for record in records:
+        failed = failed or record[0] == "error"
+        yield record
+    if not failed:
+        yield from then()
+
+
+def error_record(error: Error) -> Record:
+    return ("error", {"kind": type(error).__name__, "line": error.line, "column": error.column, "message": error.message})
+
+
+def roll_records(
+    program: CompiledRoll,
+    seed: Optional[int] = None,
+    average: bool = False,
+    engine: str = "auto",
+    jobs: Optional[int] = None,
+    profile: Optional[Profile] = None,
+    limits: Optional[Limits] = None,
+) -> Iterator[Record]:
+    """Records of the results of rolling PROGRAM, or of its errors.
+
+    With the interpreter, picked by "auto" too, each result is given as soon as it is rolled.
+    """
+    if program.errors:
+        for error in program.errors:
+            yield error_record(error)
+        return
+
+    results: Iterable[Tuple[int, Any, Any]]
+    if profile is not None:
+        result, errors = program.roll(seed, average, profile=profile, limits=limits)
+    elif engine in ("auto", "interpreter") and jobs is None:
+        result, errors = None, []
+    elif jobs is None:
+        result, errors = program.roll(seed, average, engine, limits=limits)
+    else:
+        result, errors = roll_parallel(program.source, seed, average, engine, jobs, limits)
+
+    for error in errors:
+        yield error_record(error)
+    if errors:
+        return
+
+    streamed = engine in ("auto", "interpreter") and jobs is None and profile is None
+    if streamed:
+        results = program.iterate(seed, average, limits=limits)
+    else:
+        results = zip(itertools.count(), program.output_statements, result)
+
+    try:
+        for index, stmt, value in results:
+            if isinstance(stmt, statement.Print):
+                for line in [value] if streamed else value:
+                    yield ("line", {"statement": index, "line": line})
+            else:
+                yield ("result", {"statement": index, "value": json_value(value)})
+    except LimitExceeded as e:
+        yield error_record(e.error)
+
+
+def probability_records(
+    program: CompiledRoll,
+    top: Optional[int] = None,
+    bucket: Optional[int] = None,
+    estimate: bool = False,
+    samples: int = 100_000,
+    budget: Optional[float] = None,
+    jobs: Optional[int] = None,
+    seed: Optional[int] = None,
+    profile: bool = False,
+    profile_file: Optional[TextIO] = None,
+    limits: Optional[Limits] = None,
+) -> Iterator[Record]:
+    """Records of the probability of each value of PROGRAM, and of its summary."""
+    try:
+        histogram, summary, calculator = calculate(program, estimate, samples, budget, jobs, seed, profile, limits)
+    except (LimitExceeded, CalculationError) as e:
+        yield error_record(e.error)
+        return
+
+    for row in probability_rows(histogram, top, bucket):
+        yield ("probability", {"value": json_value(row.value), "probability": row.chance, "at_least": row.at_least})
+    yield ("summary", summary)
+
+    if calculator.profile is not None and "rolls" not in summary:
+        calculator.profile.print("Probability profile", file=profile_file)
 
 
 def main(arg_list: list[str] | None = None):
+    if arg_list is None:
+        arg_list = sys.argv[1:]
+
+    if arg_list[:1] == ["serve"]:
+        from .serve import main as serve  # pylint: disable=import-outside-toplevel
+
+        serve(arg_list[1:])
+        return
+
     args = parse_args(arg_list)
 
-    run(args.source, args.average, args.seed, args.probabilities, args.digits, args.multiplier)
+    run(
+        args.source,
+        args.average,
+        args.seed,
+        args.probabilities,
+        args.digits,
+        args.multiplier,
+        args.engine,
+        args.estimate,
+        args.samples,
+        args.budget,
+        args.jobs,
+        args.profile,
+        args.top,
+        args.bucket,
+        args.format,
+        limits_from_arguments(args),
+        args.ast,
+        args.analyze,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,261 @@
+"""Static simplification of parsed Troll programs.
+
+The optimizer rewrites a syntax tree once, after parsing, so that work which
+is the same on every roll is not repeated by the engines:
+
+- Deterministic operators on constants are folded to literals, like
+  `3 + 2`, `1..6`, `sum {1, 2, 3}` and `count 1..6`.
+- Conditionals on constants are replaced by the branch taken.
+- Groupings, and blocks holding a single expression without assignments,
+  are unwrapped.
+- Calls to functions that are not recursive are resolved to the function
+  declaration, so engines do not look them up by name on every call.
+
+Dice, choices and probabilities are never folded, so rolls with the same
+seed give the same results before and after optimizing. Operations that
+fail, and collections longer than FOLD_LENGTH, are left to the engines, so
+they still fail, or check their limits, at run time.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Set, Union
+
+from .ast import expression
+from .ast import statement
+from .ast.base import Node
+from .calculator import RANDOM_UNARY
+from .compiler import Closure, Runtime, binary_operation, constant, unary_operation
+from .functions import CALC_OPERATORS, COLLECTION_TOKENS, COMPARISON_OPERATORS
+from .tokens import TokenType
+
+# Longest collection folded into the tree.
+FOLD_LENGTH = 256
+
+FOLDED_BINARY = {
+    *CALC_OPERATORS,
+    *COMPARISON_OPERATORS,
+    *COLLECTION_TOKENS,
+    TokenType.AND,
+    TokenType.RANGE,
+    TokenType.UNION,
+    TokenType.DROP,
+    TokenType.KEEP,
+    TokenType.MINUSMINUS,
+}
+
+# Value of nodes that are not constant.
+UNKNOWN = object()
+
+
+def constant_value(node: Any) -> Any:
+    """Value of NODE if it is a constant number, collection or pair, else UNKNOWN."""
+    if isinstance(node, expression.Literal):
+        return node.value if type(node.value) in (int, float) else UNKNOWN
+
+    if isinstance(node, expression.List):
+        values: List[Any] = []
+        for item in node.value:
+            value = constant_value(item)
+            if isinstance(value, list):
+                values += value
+            elif type(value) in (int, float):
+                values.append(value)
+            else:
+                return UNKNOWN
+        return values
+
+    if isinstance(node, expression.Pair):
+        first, second = constant_value(node.first), constant_value(node.second)
+        if first is UNKNOWN or second is UNKNOWN:
+            return UNKNOWN
+        return (first, second)
+
+    return UNKNOWN
+
+
+def constant_node(value: Any) -> Optional[expression.Expression]:
+    """Node evaluating to VALUE, or None if VALUE can not be written as one."""
+    if type(value) in (int, float):
+        return expression.Literal(value)
+
+    if isinstance(value, list):
+        if len(value) > FOLD_LENGTH or any(type(v) not in (int, float) for v in value):
+            return None
+        return expression.List([expression.Literal(v) for v in value])
+
+    if isinstance(value, tuple) and len(value) == 2:
+        first, second = constant_node(value[0]), constant_node(value[1])
+        if first is None or second is None:
+            return None
+        return expression.Pair(first, second)
+
+    return None
+
+
+def folded_length(token_type: TokenType, left: Any, right: Any) -> int:
+    """Length of the collection an operator would make, checked before making it."""
+    if token_type == TokenType.RANGE and isinstance(left, int) and isinstance(right, int):
+        return right - left + 1
+    if token_type == TokenType.SAMPLES and isinstance(left, int):
+        return left * (len(right) if isinstance(right, list) else 1)
+    return 0
+
+
+def assigns(node: Any) -> bool:
+    """Whether NODE assigns a variable, in the scope it is evaluated in or below."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, expression.Assign):
+            return True
+        if isinstance(current, Node):
+            stack.extend(getattr(current, name) for name in current.__dataclass_fields__)
+        elif isinstance(current, (list, tuple)):
+            stack.extend(current)
+    return False
+
+
+class Optimizer(expression.ExpressionVisitor[Any], statement.StatementVisitor[Any]):
+    """Rewrite syntax trees, folding constants and resolving calls."""
+
+    # Function declarations by name, and their optimized versions.
+    declarations: Dict[str, statement.Function]
+    resolved: Dict[str, statement.Function]
+
+    # Names of the functions being optimized, whose calls are recursive.
+    resolving: Set[str]
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        # Optimizing does not roll any dice.
+        self.declarations = {}
+        self.resolved = {}
+        self.resolving = set()
+
+    def __repr__(self):
+        return "<Optimizer >"
+
+    def optimize(
+        self, statements: Sequence[Union[expression.Expression, statement.Statement]]
+    ) -> List[Union[expression.Expression, statement.Statement]]:
+        """Optimized copies of STATEMENTS, in the same order."""
+        self.declarations = {}
+        self.resolved = {}
+        self.resolving = set()
+
+        # Functions are declared before anything runs, so later declarations can be called.
+        for stmt in statements:
+            if isinstance(stmt, statement.Function) and isinstance(stmt.name.literal, str):
+                self.declarations[stmt.name.literal] = stmt
+
+        return [self.function(stmt) if isinstance(stmt, statement.Function) else stmt.accept(self) for stmt in statements]
+
+    def function(self, stmt: statement.Function) -> statement.Function:
+        """The optimized version of a function declaration."""
+        name = stmt.name.literal
+        if not isinstance(name, str) or self.declarations.get(name) is not stmt:
+            # Shadowed by a later declaration of the same name.
+            return stmt.accept(self)
+
+        if name not in self.resolved:
+            self.resolving.add(name)
+            self.resolved[name] = stmt.accept(self)
+            self.resolving.discard(name)
+        return self.resolved[name]
+
+    def fold(self, node: expression.Expression, closure: Closure) -> expression.Expression:
+        """The constant CLOSURE evaluates to, in place of NODE, unless it fails or can not be written as a node."""
+        try:
+            folded = constant_node(closure(Runtime()))
+        except Exception:  # pylint: disable=broad-except
+            # Left for the engines to fail on, at the location of the node.
+            return node
+        return folded if folded is not None else node
+
+    def visit_Literal_Expression(self, expr: expression.Literal):
+        return expr
+
+    def visit_Variable_Expression(self, expr: expression.Variable):
+        return expr
+
+    def visit_Unary_Expression(self, expr: expression.Unary):
+        node = expression.Unary(expr.operator, expr.right.accept(self))
+        if expr.operator.token_type in RANDOM_UNARY or constant_value(node.right) is UNKNOWN:
+            return node
+        return self.fold(node, unary_operation(node.operator, constant(constant_value(node.right))))
+
+    def visit_Binary_Expression(self, expr: expression.Binary):
+        node = expression.Binary(expr.left.accept(self), expr.operator, expr.right.accept(self))
+        token_type = expr.operator.token_type
+        left = constant_value(node.left)
+
+        if token_type == TokenType.DEFAULT and left is not UNKNOWN:
+            return node.left if left else node.right
+
+        if token_type not in FOLDED_BINARY or left is UNKNOWN:
+            return node
+
+        right = constant_value(node.right)
+        if right is UNKNOWN or folded_length(token_type, left, right) > FOLD_LENGTH:
+            return node
+        return self.fold(node, binary_operation(node.operator, constant(left), constant(right)))
+
+    def visit_Grouping_Expression(self, expr: expression.Grouping):
+        return expr.expression.accept(self)
+
+    def visit_Block_Expression(self, expr: expression.Block):
+        statements = [stmt.accept(self) for stmt in expr.statements]
+        if len(statements) == 1 and not assigns(statements[0]):
+            return statements[0]
+        return expression.Block(statements)
+
+    def visit_Pair_Expression(self, expr: expression.Pair):
+        return expression.Pair(expr.first.accept(self), expr.second.accept(self))
+
+    def visit_List_Expression(self, expr: expression.List):
+        node = expression.List([value.accept(self) for value in expr.value])
+        folded = constant_node(constant_value(node))
+        return folded if folded is not None else node
+
+    def visit_Assign_Expression(self, expr: expression.Assign):
+        return expression.Assign(expr.name, expr.value.accept(self))
+
+    def visit_Conditional_Expression(self, stmt: expression.Conditional):
+        condition = stmt.condition.accept(self)
+        value = constant_value(condition)
+        if value is not UNKNOWN:
+            return stmt.truth.accept(self) if value else stmt.falsy.accept(self)
+        return expression.Conditional(condition, stmt.truth.accept(self), stmt.falsy.accept(self))
+
+    def visit_Foreach_Expression(self, expr: expression.Foreach):
+        return expression.Foreach(expr.iterator, expr.source.accept(self), expr.block.accept(self))
+
+    def visit_Repeat_Expression(self, stmt: expression.Repeat):
+        return expression.Repeat(stmt.condition, stmt.action.accept(self), stmt.qualifier.accept(self))
+
+    def visit_Accumulate_Expression(self, stmt: expression.Accumulate):
+        return expression.Accumulate(stmt.action.accept(self), stmt.qualifier.accept(self))
+
+    def visit_Call_Expression(self, expr: expression.Call):
+        parameters = [parameter.accept(self) for parameter in expr.parameters]
+        name = expr.name.literal
+        function = None
+        if isinstance(name, str) and name in self.declarations and name not in self.resolving:
+            function = self.function(self.declarations[name])
+        return expression.Call(expr.name, parameters, function)
+
+    def visit_Function_Statement(self, stmt: statement.Function):
+        return statement.Function(stmt.name, stmt.parameters, stmt.expression.accept(self))
+
+    def visit_Compositional_Statement(self, stmt: statement.Compositional):
+        return stmt
+
+    def visit_Print_Statement(self, stmt: statement.Print):
+        return statement.Print(stmt.expression.accept(self), stmt.repeats)
+
+    def visit_TextAlign_Expression(self, expr: expression.TextAlign):
+        return expression.TextAlign(expr.left.accept(self), expr.operator, expr.right.accept(self))
+
+
+def optimize(
+    statements: Sequence[Union[expression.Expression, statement.Statement]]
+) -> List[Union[expression.Expression, statement.Statement]]:
+    """Fold constants and resolve calls in STATEMENTS."""
+    return Optimizer().optimize(statements)
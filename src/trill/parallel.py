@@ -0,0 +1,148 @@
+"""Rolling independent parts of a program in worker processes.
+
+A program is split in tasks: one per top level statement, and repeated
+print statements in chunks of repeats. Each task is rolled with its own
+seed derived from the master seed, so results are the same whatever the
+number of workers. Limits apply to each task on its own.
+"""
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from .ast import expression
+from .ast import statement
+from .functions import derive_seed
+from .limits import Limits
+from .program import CompiledRoll, compile_roll
+
+# Number of repeats of a print statement rolled by each task.
+CHUNK_SIZE = 1000
+
+
+class Task(NamedTuple):
+    """A part of SOURCE to roll in a worker.
+
+    INDEX is the top level statement to roll, or None for the whole
+    program. REPEATS replaces the repeats of a print statement. Rolls
+    going over LIMITS stop with an error.
+    """
+
+    source: str
+    index: Optional[int]
+    repeats: Optional[int]
+    seed: int
+    average: bool
+    engine: str
+    limits: Optional[Limits] = None
+
+
+def is_declaration(stmt: Any) -> bool:
+    return isinstance(stmt, (statement.Function, statement.Compositional))
+
+
+def roll_task(task: Task) -> List[Any]:
+    """Roll a task, returning [result, errors] for its statement, or for the whole program."""
+    program = compile_roll(task.source)
+
+    if task.index is None:
+        return program.roll(task.seed, task.average, task.engine, limits=task.limits)
+
+    stmt = program.statements[task.index]
+    if task.repeats is not None:
+        stmt = replace(stmt, repeats=task.repeats)
+
+    declarations = tuple(declaration for declaration in program.statements if is_declaration(declaration))
+    part = CompiledRoll(task.source, declarations + (stmt,), program.functions)
+    result, errors = part.roll(task.seed, task.average, task.engine, limits=task.limits)
+    return [None if errors else result[-1], errors]
+
+
+def split(
+    program: CompiledRoll, seed: int, average: bool, engine: str, limits: Optional[Limits] = None
+) -> List[Tuple[Any, List[Task]]]:
+    """Each statement of PROGRAM with the tasks rolling it, in the order of its output.
+
+    Programs assigning variables at the top level share them between
+    statements, and are rolled as a single task.
+    """
+    if any(isinstance(stmt, expression.Assign) for stmt in program.statements):
+        return [(None, [Task(program.source, None, None, derive_seed(seed, 0), average, engine, limits)])]
+
+    # The interpreter declares functions before running the other statements.
+    order = [i for i, stmt in enumerate(program.statements) if isinstance(stmt, statement.Function)]
+    order += [i for i, stmt in enumerate(program.statements) if not isinstance(stmt, statement.Function)]
+
+    statement_tasks: List[Tuple[Any, List[Task]]] = []
+    count = 0
+    for index in order:
+        stmt = program.statements[index]
+        if is_declaration(stmt):
+            statement_tasks.append((stmt, []))
+            continue
+
+        chunks: List[Optional[int]] = [None]
+        if isinstance(stmt, statement.Print):
+            chunks = [min(CHUNK_SIZE, stmt.repeats - start) for start in range(0, stmt.repeats, CHUNK_SIZE)]
+
+        tasks = []
+        for repeats in chunks:
+            tasks.append(Task(program.source, index, repeats, derive_seed(seed, count), average, engine, limits))
+            count += 1
+        statement_tasks.append((stmt, tasks))
+
+    return statement_tasks
+
+
+def roll_parallel(
+    roll: str,
+    seed: Optional[int] = None,
+    average: bool = False,
+    engine: str = "auto",
+    jobs: Optional[int] = None,
+    limits: Optional[Limits] = None,
+) -> List[Any]:
+    """Roll ROLL using JOBS worker processes, returning [result, errors] like `trill()`.
+
+    Top level statements, and chunks of repeated print statements, are
+    rolled independently. JOBS defaults to the number of processors.
+    Each of them going over LIMITS is reported as an error.
+    """
+    program = compile_roll(roll)
+
+    if program.errors:
+        return [None, list(program.errors)]
+
+    if seed is None:
+        seed = random.randrange(sys.maxsize)
+
+    statement_tasks = split(program, seed, average, engine, limits)
+    if statement_tasks and statement_tasks[0][0] is None:
+        return roll_task(statement_tasks[0][1][0])
+
+    all_tasks = [task for _, tasks in statement_tasks for task in tasks]
+    if jobs == 1 or len(all_tasks) <= 1:
+        results = [roll_task(task) for task in all_tasks]
+    else:
+        with ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(roll_task, all_tasks))
+
+    errors = [error for _, task_errors in results for error in task_errors]
+    if errors:
+        return [None, errors]
+
+    output: List[Any] = []
+    position = 0
+    for stmt, tasks in statement_tasks:
+        parts = [result for result, _ in results[position : position + len(tasks)]]
+        position += len(tasks)
+
+        if is_declaration(stmt):
+            output.append(None)
+        elif isinstance(stmt, statement.Print):
+            output.append([line for part in parts for line in part])
+        else:
+            output.append(parts[0])
+
+    return [output, []]
@@ -4,7 +4,8 @@ from typing import Any, List, Optional, Union
 from .tokens import Token, TokenType
 from .ast import expression
 from .ast import statement
-from .error import handler as error_handler, ParserError
+from . import error
+from .error import ErrorHandler, ParserError
 
 
 class ParserException(Exception):
@@ -17,15 +18,20 @@ class Parser:
     tokens: List[Token]
     current: int = 0
 
-    def __init__(self, tokens: List[Token]):
+    def __init__(self, tokens: List[Token], errors: Optional[ErrorHandler] = None):
+        """Create a parser reporting to ERRORS, or to the error handler of the current thread."""
         self.tokens = tokens
+        self.errors = errors if errors is not None else error.current()
 
     def __repr__(self):
         return f"<Parser {self.current} / {len(self.tokens)}>"
 
+    # These are called for every token, so they index the tokens directly,
+    # and compare token types by identity.
+
     def is_at_end(self):
         # Check if end of source is reached.
-        return self.peek().token_type == TokenType.EOF
+        return self.tokens[self.current].token_type is TokenType.EOF
 
     def peek(self, lookahead: int = 0):
         return self.tokens[self.current + lookahead]
@@ -37,27 +43,28 @@ class Parser:
         """Check next token.
         Return True if next token is of type _type
         """
-        if self.is_at_end():
-            return False
-        return self.peek().token_type == _type
+        token_type = self.tokens[self.current].token_type
+        return token_type is _type and token_type is not TokenType.EOF
 
     def advance(self):
-        if not self.is_at_end():
-            self.current += 1
+        token = self.tokens[self.current]
+        if token.token_type is TokenType.EOF:
+            return self.tokens[self.current - 1]
 
-        return self.previous()
+        self.current += 1
+        return token
 
     def match(self, *types: TokenType):
         """Check and consume a token of given types."""
-        for _type in types:
-            if self.check(_type):
-                self.advance()
-                return True
-        return False
+        token_type = self.tokens[self.current].token_type
+        if token_type is TokenType.EOF or token_type not in types:
+            return False
+        self.current += 1
+        return True
 
     def error(self, message: str):
         token = self.tokens[self.current]
-        error_handler.report(ParserError(token.line, token.column, message))
+        self.errors.report(ParserError(token.line, token.column, message))
 
     def consume(self, _type: TokenType, message: str):
         if self.check(_type):
@@ -72,7 +79,7 @@ class Parser:
             if expr:
                 statements.append(expr)
 
-            if expr is None and error_handler.had_error:
+            if expr is None and self.errors.had_error:
                 break
 
         return statements
@@ -303,7 +310,7 @@ class Parser:
         count = self.parse_expression()
         selection = self.diceroll()
 
-        if error_handler.had_error:
+        if self.errors.had_error:
             return None
 
         if not count:
@@ -601,7 +608,7 @@ class Parser:
                 return expression.Grouping(expr)
 
             self.consume(TokenType.SEMICOLON, "Expected a semi colon")
-            if error_handler.had_error:
+            if self.errors.had_error:
                 return None
 
             statements: List[expression.Expression] = [expr]
@@ -0,0 +1,163 @@
+"""Profiling of interpreters and calculators.
+
+A profile replaces the visit methods of a visitor with timed wrappers,
+recording calls, time and result sizes per node type and per location in
+the source. Visitors that are not profiled run their methods unwrapped.
+"""
+import dataclasses
+import time
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
+
+from .ast.base import Node, Visitor
+from .distribution import Pool
+from .tokens import Token
+
+# (line, column) of a node in the source.
+Location = Tuple[int, int]
+
+
+@dataclasses.dataclass
+class NodeStats:
+    """Measurements of visits to nodes.
+
+    TOTAL includes the time of visiting child nodes, OWN does not. Nodes
+    visited within themselves, like recursive calls, add to TOTAL only in the
+    outermost visit, as cumulative time is counted by cProfile.
+    """
+
+    calls: int = 0
+    total: float = 0.0
+    own: float = 0.0
+    result_size: int = 0
+
+    def add(self, total: float, own: float, result_size: int):
+        self.calls += 1
+        self.total += total
+        self.own += own
+        self.result_size = max(self.result_size, result_size)
+
+
+def node_label(node: Node) -> str:
+    """Node type, with the operator for unary and binary expressions."""
+    operator = getattr(node, "operator", None)
+    if isinstance(operator, Token):
+        return f"{type(node).__name__} {operator.lexeme}"
+    return type(node).__name__
+
+
+def node_location(node: Any) -> Optional[Location]:
+    """Location of the first token of NODE, or of its children."""
+    if not dataclasses.is_dataclass(node):
+        return None
+
+    values = [getattr(node, field.name) for field in dataclasses.fields(node)]
+    for value in values:
+        if isinstance(value, Token):
+            return (value.line, value.column)
+
+    for value in values:
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            location = node_location(child)
+            if location is not None:
+                return location
+
+    return None
+
+
+def result_size(result: Any) -> int:
+    """Number of values in a collection, or outcomes in a distribution."""
+    if isinstance(result, Pool):
+        # Counting the outcomes of a pool would enumerate them.
+        return 1
+    if isinstance(result, (Mapping, list, tuple)):
+        return len(result)
+    return 1
+
+
+class Profile:
+    """Calls, time and result sizes of the nodes visited by a visitor."""
+
+    by_type: Dict[str, NodeStats]
+    by_location: Dict[Tuple[str, Optional[Location]], NodeStats]
+
+    def __init__(self):
+        self.by_type = {}
+        self.by_location = {}
+        self._children: List[float] = []
+        self._locations: Dict[Node, Optional[Location]] = {}
+        # Visits in progress for each label, and for each label and location.
+        self._active: Dict[Any, int] = {}
+
+    def __repr__(self):
+        return f"<Profile {sum(stats.calls for stats in self.by_type.values())} visits>"
+
+    def instrument(self, visitor: Visitor[Any]):
+        """Time every visit method of VISITOR."""
+        for name in dir(visitor):
+            if name.startswith("visit_") and name != "visit_generic":
+                setattr(visitor, name, self.timed(getattr(visitor, name)))
+
+    def timed(self, method: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        active = self._active
+
+        def visit(node: Any):
+            label = node_label(node)
+            if node not in self._locations:
+                self._locations[node] = node_location(node)
+            key = (label, self._locations[node])
+
+            active[label] = active.get(label, 0) + 1
+            active[key] = active.get(key, 0) + 1
+            self._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                result = method(node)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = self._children.pop()
+                if self._children:
+                    self._children[-1] += elapsed
+                active[label] -= 1
+                active[key] -= 1
+
+            own, size = elapsed - children, result_size(result)
+            self.by_type.setdefault(label, NodeStats()).add(0.0 if active[label] else elapsed, own, size)
+            self.by_location.setdefault(key, NodeStats()).add(0.0 if active[key] else elapsed, own, size)
+            return result
+
+        return visit
+
+    def hot_spots(self, limit: Optional[int] = None) -> List[Tuple[str, Optional[Location], NodeStats]]:
+        """Nodes by location, those taking the most time of their own first."""
+        rows = sorted(self.by_location.items(), key=lambda item: item[1].own, reverse=True)
+        return [(label, location, stats) for (label, location), stats in rows[:limit]]
+
+    def print(self, title: str = "Profile", limit: Optional[int] = 20, file: Optional[TextIO] = None):
+        """Print tables of time per node type, and the hot spots by location, to FILE or stdout."""
+        from rich.console import Console  # pylint: disable=import-outside-toplevel
+        from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+        console = Console(file=file)
+
+        types = Table(title=f"{title} by node type")
+        types.add_column("Node")
+        for column in ("Calls", "Own ms", "Total ms", "Max size"):
+            types.add_column(column, justify="right")
+        for label, stats in sorted(self.by_type.items(), key=lambda item: item[1].own, reverse=True):
+            types.add_row(label, *self.columns(stats))
+        console.print(types)
+
+        spots = Table(title=f"{title} hot spots")
+        spots.add_column("Node")
+        spots.add_column("Line:column", justify="right")
+        for column in ("Calls", "Own ms", "Total ms", "Max size"):
+            spots.add_column(column, justify="right")
+        for label, location, stats in self.hot_spots(limit):
+            spots.add_row(label, "" if location is None else f"{location[0]}:{location[1]}", *self.columns(stats))
+        console.print(spots)
+
+    @staticmethod
+    def columns(stats: NodeStats) -> List[str]:
+        return [str(stats.calls), f"{stats.own * 1000:.3f}", f"{stats.total * 1000:.3f}", str(stats.result_size)]
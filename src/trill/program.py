@@ -0,0 +1,160 @@
+"""Compiled Troll programs, parsed once and rolled many times."""
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+from .analysis import Analysis, analyze
+from .ast import expression
+from .ast import statement
+from .compiler import ClosureCompiler, ClosureInterpreter, ClosureProgram
+from .error import Error, ErrorHandler
+from .interpreter import Interpreter
+from .limits import LimitExceeded, Limits, guard
+from .optimizer import optimize
+from .parser import Parser
+from .profile import Profile
+from .tokenizer import Tokenizer
+from .types import RandomSource
+
+CACHE_SIZE = 1024
+
+ENGINES = ("auto", "interpreter", "closure")
+
+FunctionTable = Mapping[str, Union[statement.Function, statement.Compositional]]
+
+
+@dataclass(frozen=True)
+class CompiledRoll:
+    """A parsed Troll program, ready to be rolled."""
+
+    source: str
+    statements: Tuple[Union[expression.Expression, statement.Statement], ...]
+    functions: FunctionTable = field(default_factory=lambda: MappingProxyType({}))
+    errors: Tuple[Error, ...] = ()
+
+    @property
+    def had_error(self) -> bool:
+        return bool(self.errors)
+
+    @cached_property
+    def analysis(self) -> Analysis:
+        """What engines can run the program, found on first use."""
+        return analyze(self.statements)
+
+    @cached_property
+    def closures(self) -> ClosureProgram:
+        """The program compiled to closures, built on first use."""
+        return ClosureCompiler().compile(self.statements)
+
+    def roll(
+        self,
+        seed: Optional[int] = None,
+        average: bool = False,
+        engine: str = "auto",
+        rng: Optional[RandomSource] = None,
+        profile: Optional[Profile] = None,
+        checkpoint: Optional[Callable[[], None]] = None,
+        limits: Optional[Limits] = None,
+    ) -> List[Any]:
+        """Roll the program, returning [result, errors] like `trill()`.
+
+        ENGINE selects how the program is evaluated, either by the
+        tree-walking "interpreter" or by the "closure" compiler. With "auto",
+        compiled closures are used, as they are kept with the program, and
+        the interpreter when profiling, whatever the analysis of the program.
+        Dice are rolled with RNG if given, such as a random.Random or a
+        functions.NumpyRandom, and otherwise with a generator seeded with SEED.
+        PROFILE records the nodes visited, and needs the "interpreter" engine.
+        CHECKPOINT is called on every loop iteration and function call, and
+        can stop a long roll by raising. A roll going over LIMITS is stopped,
+        and reported as an InterpreterError at the node that went over.
+        """
+        if self.errors:
+            return [None, list(self.errors)]
+
+        if engine == "auto":
+            engine = "closure" if profile is None else "interpreter"
+
+        if profile is not None and engine != "interpreter":
+            raise ValueError("Profiling needs the interpreter engine")
+
+        try:
+            if engine == "closure":
+                closure_interpreter = ClosureInterpreter(seed, rng)
+                closure_interpreter.guard = guard(limits, checkpoint)
+                result = closure_interpreter.run(self.closures, average=average)
+            elif engine == "interpreter":
+                interpreter: Interpreter[Any] = Interpreter(seed, rng)
+                interpreter.functions = dict(self.functions)
+                interpreter.guard = guard(limits, checkpoint)
+                if profile is not None:
+                    interpreter.profile = profile
+                    profile.instrument(interpreter)
+                result = interpreter.interpret(list(self.statements), average=average)
+            else:
+                raise ValueError(f"Unknown engine {engine}, expected one of {', '.join(ENGINES)}")
+        except LimitExceeded as e:
+            return [None, [e.error]]
+
+        return [result, list(self.errors)]
+
+    @property
+    def output_statements(self) -> Tuple[Union[expression.Expression, statement.Statement], ...]:
+        """Statements in the order of their results, with function declarations first."""
+        functions = tuple(stmt for stmt in self.statements if isinstance(stmt, statement.Function))
+        return functions + tuple(stmt for stmt in self.statements if not isinstance(stmt, statement.Function))
+
+    def iterate(
+        self,
+        seed: Optional[int] = None,
+        average: bool = False,
+        rng: Optional[RandomSource] = None,
+        checkpoint: Optional[Callable[[], None]] = None,
+        limits: Optional[Limits] = None,
+    ) -> Iterator[Tuple[int, Union[expression.Expression, statement.Statement], Any]]:
+        """Roll the program with the interpreter, yielding results as they are rolled.
+
+        See Interpreter.iterate. Nothing is yielded if the program has errors.
+        Going over LIMITS raises LimitExceeded.
+        """
+        if self.errors:
+            return
+
+        interpreter: Interpreter[Any] = Interpreter(seed, rng)
+        interpreter.functions = dict(self.functions)
+        interpreter.guard = guard(limits, checkpoint)
+        yield from interpreter.iterate(list(self.statements), average=average)
+
+
+def function_table(statements: List[Union[expression.Expression, statement.Statement]]) -> FunctionTable:
+    """Collect function and compositional declarations by name."""
+    functions: Dict[str, Union[statement.Function, statement.Compositional]] = {}
+    for stmt in statements:
+        if isinstance(stmt, (statement.Function, statement.Compositional)) and isinstance(stmt.name.literal, str):
+            functions[stmt.name.literal] = stmt
+    return MappingProxyType(functions)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_roll(source: str, optimized: bool = True) -> CompiledRoll:
+    """Tokenize and parse SOURCE once, and fold its constants unless OPTIMIZED is False.
+
+    Results are cached on the source text, so compiling the same roll
+    again returns the same CompiledRoll without re-parsing.
+    """
+    errors = ErrorHandler()
+    tokens = Tokenizer(source, errors).scan_tokens()
+
+    if errors.had_error:
+        return CompiledRoll(source, (), errors=tuple(errors.error_report))
+
+    parsed = Parser(tokens, errors).parse()
+
+    if errors.had_error:
+        return CompiledRoll(source, (), errors=tuple(errors.error_report))
+
+    if optimized:
+        parsed = optimize(parsed)
+
+    return CompiledRoll(source, tuple(parsed), function_table(parsed))
@@ -0,0 +1,203 @@
+"""Which functions depend only on their arguments, and which roll dice.
+
+Function bodies are evaluated in a scope nested in the scope of their
+caller, so a body reading a variable that is not one of its parameters, or
+bound in the body itself, reads the variables of whoever called it. Strings
+are looked up as variable names too. Functions that only read their own
+variables, and only call functions that do, are closed: their results
+depend on their arguments alone. Closed functions that roll no dice are
+pure, and give the same result for the same arguments.
+
+Calls are followed by name, so a function is only closed if every function
+it can call is. Recursive calls are closed if the rest of the function is.
+Functions that can call themselves, directly or through others, are also
+what makes calls nest deeper than the source does.
+"""
+import copy
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Tuple, Union
+
+from .ast import expression
+from .ast import statement
+from .ast.base import Node
+from .tokens import Token, TokenType
+
+RANDOM_UNARY = (TokenType.DICE, TokenType.CHOOSE, TokenType.PROBABILITY)
+RANDOM_BINARY = (TokenType.DICE, TokenType.PICK)
+
+# Most results of pure calls kept per roll.
+MEMO_SIZE = 4096
+
+
+class Body(NamedTuple):
+    """What a function body does, apart from the functions it calls.
+
+    CLOSED - only reads its own variables
+    DICE - rolls dice, or chooses at random
+    CALLS - names of the functions called, with their number of arguments
+    """
+
+    closed: bool
+    dice: bool
+    calls: Tuple[Tuple[str, int], ...]
+
+
+class BodyWalker:
+    """Collect what a function body does."""
+
+    def __init__(self):
+        self.closed = True
+        self.dice = False
+        self.calls: List[Tuple[str, int]] = []
+
+    def walk(self, node: Any, bound: FrozenSet[str]):
+        if isinstance(node, (list, tuple)):
+            for child in node:
+                self.walk(child, bound)
+            return
+
+        if not isinstance(node, Node):
+            return
+
+        if isinstance(node, expression.Literal):
+            if isinstance(node.value, str):
+                # Strings are looked up as variable names.
+                self.closed = False
+        elif isinstance(node, expression.Variable):
+            if node.name.literal not in bound:
+                self.closed = False
+        elif isinstance(node, expression.Block):
+            for stmt in node.statements:
+                self.walk(stmt, bound)
+                if isinstance(stmt, expression.Assign) and isinstance(stmt.name.literal, str):
+                    bound = bound | {stmt.name.literal}
+        elif isinstance(node, expression.Foreach):
+            self.walk(node.source, bound)
+            self.walk(node.block, bound | {str(node.iterator.name.literal)})
+        elif isinstance(node, (expression.Repeat, expression.Accumulate)):
+            # The first roll of the action is made before its variable is set.
+            self.walk(node.action.value, bound)
+            self.walk(node.qualifier, bound | {str(node.action.name.literal)})
+        elif isinstance(node, expression.Call):
+            self.calls.append((str(node.name.literal), len(node.parameters)))
+            self.walk(node.parameters, bound)
+        else:
+            if isinstance(node, expression.Unary) and node.operator.token_type in RANDOM_UNARY:
+                self.dice = True
+            if isinstance(node, expression.Binary) and node.operator.token_type in RANDOM_BINARY:
+                self.dice = True
+            # The resolved function of a call is not part of the body.
+            self.walk([getattr(node, name) for name in node.__dataclass_fields__], bound)
+
+
+def function_body(stmt: statement.Function) -> Body:
+    """What the body of STMT does, apart from the functions it calls."""
+    if not isinstance(stmt.expression, expression.Expression):
+        return Body(False, False, ())
+
+    walker = BodyWalker()
+    walker.walk(stmt.expression, frozenset(str(parameter.literal) for parameter in stmt.parameters))
+    return Body(walker.closed, walker.dice, tuple(walker.calls))
+
+
+def callees(stmt: Union[statement.Function, statement.Compositional]) -> List[str]:
+    """Names of the functions STMT can call."""
+    if isinstance(stmt, statement.Function):
+        return [name for name, _ in function_body(stmt).calls]
+    operators = (stmt.singleton, stmt.union)
+    return [str(op.literal) for op in operators if isinstance(op, Token) and op.token_type == TokenType.IDENTIFIER]
+
+
+def recursive(functions: Mapping[str, Union[statement.Function, statement.Compositional]]) -> bool:
+    """Whether any of FUNCTIONS can call itself, directly or through the others."""
+    # Names on the path being walked are True, and finished names False.
+    walking: Dict[str, bool] = {}
+    for root in functions:
+        if root in walking:
+            continue
+        walking[root] = True
+        stack = [(root, iter(callees(functions[root])))]
+        while stack:
+            name, names = stack[-1]
+            for callee in names:
+                if callee not in functions:
+                    continue
+                if walking.get(callee):
+                    return True
+                if callee not in walking:
+                    walking[callee] = True
+                    stack.append((callee, iter(callees(functions[callee]))))
+                    break
+            else:
+                walking[name] = False
+                stack.pop()
+    return False
+
+
+class Purity:
+    """Closed and pure functions among FUNCTIONS, found on first use."""
+
+    functions: Mapping[str, Union[statement.Function, statement.Compositional]]
+    results: Dict[statement.Function, Tuple[bool, bool]]
+
+    def __init__(self, functions: Mapping[str, Union[statement.Function, statement.Compositional]]):
+        self.functions = functions
+        self.results = {}
+
+    def __repr__(self):
+        return f"<Purity {len(self.functions)} functions>"
+
+    def check(self, stmt: statement.Function) -> Tuple[bool, bool]:
+        """Whether STMT is closed, and whether it is pure."""
+        if stmt not in self.results:
+            closed, dice = True, False
+            seen = {stmt}
+            stack = [stmt]
+            while stack:
+                body = function_body(stack.pop())
+                closed = closed and body.closed
+                dice = dice or body.dice
+                for name, count in body.calls:
+                    callee = self.functions.get(name)
+                    if not isinstance(callee, statement.Function) or count < len(callee.parameters):
+                        # Compositionals, unknown functions, and parameters left to the caller.
+                        closed = False
+                    elif callee not in seen:
+                        seen.add(callee)
+                        stack.append(callee)
+            self.results[stmt] = (closed, closed and not dice)
+        return self.results[stmt]
+
+    def closed(self, stmt: statement.Function) -> bool:
+        return self.check(stmt)[0]
+
+    def pure(self, stmt: statement.Function) -> bool:
+        return self.check(stmt)[1]
+
+
+# Pairs in memo keys, apart from collections of two values.
+PAIR = object()
+
+
+def memo_key(value: Any) -> Any:
+    """Hashable key of a value, telling apart numbers of different types."""
+    if isinstance(value, list):
+        return tuple(memo_key(v) for v in value)
+    if isinstance(value, tuple):
+        return (PAIR, memo_key(value[0]), memo_key(value[1]))
+    return (type(value), value)
+
+
+def arguments_key(arguments: Iterable[Any]) -> Tuple[Any, ...]:
+    return tuple(memo_key(argument) for argument in arguments)
+
+
+def remember(memo: Dict[Any, Any], key: Any, value: Any):
+    """Keep VALUE in MEMO, forgetting the oldest result when it is full."""
+    if len(memo) >= MEMO_SIZE:
+        del memo[next(iter(memo))]
+    memo[key] = value
+
+
+def recall(value: Any) -> Any:
+    """A remembered result, copied if it is a collection its caller may change."""
+    return copy.deepcopy(value) if isinstance(value, list) else value
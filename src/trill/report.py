@@ -0,0 +1,212 @@
+"""Reports of rolls and probability distributions.
+
+Rows and records are produced lazily, so CSV and JSON reports are written
+as they are generated. Large distributions can be cut to the most likely
+outcomes, or grouped in ranges of values.
+"""
+import bisect
+import csv
+import heapq
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, TextIO, Tuple, Union
+
+
+class Bucket(NamedTuple):
+    """A range of values, from LOW to HIGH inclusive."""
+
+    low: Union[int, float]
+    high: Union[int, float]
+
+    def __str__(self):
+        return f"{self.low}..{self.high}"
+
+
+# A kind of record, like "result" or "error", and its fields.
+Record = Tuple[str, Mapping[str, Any]]
+
+# Lists that records of each kind are collected in by write_json.
+SECTIONS = {"result": "results", "line": "results", "error": "errors", "probability": "probabilities"}
+
+
+class Row(NamedTuple):
+    """Probability of a value, and of values at least as large if known."""
+
+    value: Any
+    chance: float
+    at_least: Optional[float]
+
+
+def outcome_order(value: Any):
+    """Sort numbers before collections, and anything else last."""
+    if isinstance(value, Bucket):
+        return (0, value.low, ())
+    if isinstance(value, (int, float)):
+        return (0, value, ())
+    if isinstance(value, tuple):
+        return (1, len(value), value)
+    return (2, 0, str(value))
+
+
+def outcome_label(value: Any) -> str:
+    if isinstance(value, tuple) and not isinstance(value, Bucket):
+        return " ".join(str(x) for x in value)
+    return str(value)
+
+
+def bucketed(histogram: Mapping[Any, float], width: Union[int, float]) -> Dict[Any, float]:
+    """Group numbers in ranges of WIDTH values. Other outcomes are kept as they are."""
+    buckets: Dict[Any, float] = {}
+    for value, chance in histogram.items():
+        if isinstance(value, (int, float)):
+            low = value // width * width
+            high = low + width - 1 if isinstance(value, int) and isinstance(width, int) else low + width
+            value = Bucket(low, high)
+        buckets[value] = buckets.get(value, 0) + chance
+    return buckets
+
+
+def probability_rows(
+    histogram: Mapping[Any, float],
+    top: Optional[int] = None,
+    bucket: Optional[Union[int, float]] = None,
+) -> Iterator[Row]:
+    """Rows of HISTOGRAM, in order of the values.
+
+    With TOP, only the TOP most likely values are given. The probability of
+    values at least as large is still that of the whole distribution.
+    Outcomes are grouped in buckets as they are read, and only the TOP
+    values, or the buckets, are sorted.
+    """
+    if bucket is not None:
+        histogram = bucketed(histogram, bucket)
+
+    if top is not None:
+        yield from top_rows(histogram, top)
+        return
+
+    total = 1.0
+    for value, chance in sorted(histogram.items(), key=lambda item: outcome_order(item[0])):
+        yield Row(value, chance, total)
+        total -= chance
+
+
+def top_rows(histogram: Mapping[Any, float], top: int) -> List[Row]:
+    """Rows of the TOP most likely values of HISTOGRAM, in order of the values.
+
+    The probability of the values before each of them is summed in a single
+    pass over HISTOGRAM, without sorting it.
+    """
+    likely = sorted(heapq.nlargest(top, histogram.items(), key=lambda item: item[1]), key=lambda item: outcome_order(item[0]))
+    keys = [outcome_order(value) for value, _ in likely]
+
+    # Probability of the values from each kept value up to the next, and of those before the first.
+    between = [0.0] * (len(likely) + 1)
+    for value, chance in histogram.items():
+        between[bisect.bisect_right(keys, outcome_order(value))] += chance
+
+    rows = []
+    before = 0.0
+    for index, (value, chance) in enumerate(likely):
+        before += between[index]
+        rows.append(Row(value, chance, 1.0 - before))
+    return rows
+
+
+def print_table(rows: Iterable[Row], multiplier: int = 100, digits: int = 3):
+    from rich.console import Console  # pylint: disable=import-outside-toplevel
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+    from rich.bar import Bar  # pylint: disable=import-outside-toplevel
+
+    table = Table(title="Probabilities")
+
+    table.add_column("Value", justify="right")
+    if multiplier == 100:
+        table.add_column("% =", justify="right")
+        table.add_column("% ≥", justify="right")
+    else:
+        table.add_column(f"x{multiplier} =", justify="right")
+        table.add_column(f"x{multiplier} ≥", justify="right")
+
+    table.add_column("Probability graph")
+
+    for row in rows:
+        table.add_row(
+            outcome_label(row.value),
+            f"{round(row.chance * multiplier, digits):.{digits}f}",
+            "" if row.at_least is None else f"{round(row.at_least * multiplier, digits):.{digits}f}",
+            Bar(1, 0, row.chance),
+        )
+
+    Console().print(table)
+
+
+def json_value(value: Any) -> Any:
+    if isinstance(value, Bucket):
+        return str(value)
+    if isinstance(value, (tuple, list)):
+        return [json_value(x) for x in value]
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+def write_csv(rows: Iterable[Row], stream: TextIO):
+    """Write rows as CSV, one line at a time."""
+    writer = csv.writer(stream)
+    writer.writerow(["value", "probability", "at_least"])
+    for row in rows:
+        writer.writerow([outcome_label(row.value), row.chance, "" if row.at_least is None else row.at_least])
+
+
+def write_ndjson(records: Iterable[Record], stream: TextIO):
+    """Write each record as a line of JSON, with its kind as "type"."""
+    for kind, record in records:
+        stream.write(json.dumps({"type": kind, **record}, default=str) + "\n")
+
+
+def write_json(records: Iterable[Record], stream: TextIO):
+    """Write records as a single JSON object, one record at a time.
+
+    Records of each kind in SECTIONS are listed together, other records
+    are written as objects of their own, with their kind as key.
+    """
+    stream.write("{")
+    keys = 0
+    section = None
+    for kind, record in records:
+        name = SECTIONS.get(kind)
+        if name is not None and name == section:
+            stream.write(",\n  " + json.dumps(record, default=str))
+            continue
+
+        if section is not None:
+            stream.write("\n]")
+        stream.write(", " if keys else "")
+        keys += 1
+
+        section = name
+        if name is None:
+            stream.write(f"{json.dumps(kind)}: {json.dumps(record, default=str)}")
+        else:
+            stream.write(f"{json.dumps(name)}: [\n  {json.dumps(record, default=str)}")
+
+    if section is not None:
+        stream.write("\n]")
+    stream.write("}\n")
+
+
+def summary_lines(summary: Mapping[str, Any]) -> List[str]:
+    """Summary of a distribution, as shown below the probability table."""
+    lines = []
+    if summary.get("rolls"):
+        lines.append(f"Estimated from {summary['rolls']} rolls")
+    if summary.get("average"):
+        lines.append(f"Average: {summary['average']}")
+    if summary.get("average_interval"):
+        low, high = summary["average_interval"]
+        lines.append(f"Average 95% confidence interval: {low} - {high}")
+    if summary.get("spread"):
+        lines.append(f"Spread: {summary['spread']}")
+    if summary.get("mean_deviation"):
+        lines.append(f"Mean deviation: {summary['mean_deviation']}")
+    return lines
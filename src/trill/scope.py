@@ -0,0 +1,86 @@
+"""Variables of a running program, in nested scopes.
+
+Troll scopes are dynamic: function bodies see the variables of their
+callers, and strings are looked up as variable names while rolling, so
+variables can not be resolved to fixed places before a roll. Scope keeps
+the innermost value of every variable in a single dict instead, so reading
+a variable is one lookup however deeply scopes are nested. Each scope saves
+the values it shadows when it first assigns them, and puts them back when
+it is popped.
+"""
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+# Saved in place of variables that were not set before a scope assigned them.
+UNSET = object()
+
+
+class Scope:
+    """Variables, with scopes pushed and popped around blocks, loops and calls.
+
+    CURRENT holds the value each variable has in the innermost scope, and
+    SAVED the values shadowed by each scope, innermost last.
+    """
+
+    __slots__ = ("current", "saved")
+
+    current: Dict[str, Any]
+    saved: List[Dict[str, Any]]
+
+    def __init__(self, variables: Optional[Mapping[str, Any]] = None):
+        self.current = dict(variables) if variables is not None else {}
+        self.saved = [{}]
+
+    def __repr__(self):
+        return f"<Scope {len(self.saved)} deep {self.current}>"
+
+    def __getitem__(self, name: str) -> Any:
+        return self.current[name]
+
+    def __setitem__(self, name: str, value: Any):
+        """Set NAME in the innermost scope."""
+        saved = self.saved[-1]
+        if name not in saved:
+            saved[name] = self.current.get(name, UNSET)
+        self.current[name] = value
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.current
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.current)
+
+    def __len__(self) -> int:
+        return len(self.current)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.current.get(name, default)
+
+    @property
+    def depth(self) -> int:
+        """Number of scopes, including the outermost one."""
+        return len(self.saved)
+
+    def push(self, variables: Optional[Mapping[str, Any]] = None):
+        """Enter a new scope, setting VARIABLES in it."""
+        self.saved.append({})
+        if variables:
+            for name, value in variables.items():
+                self[name] = value
+
+    def pop(self):
+        """Leave the innermost scope, putting back the values it shadowed."""
+        current = self.current
+        for name, value in self.saved.pop().items():
+            if value is UNSET:
+                del current[name]
+            else:
+                current[name] = value
+
+    def restore(self, depth: int):
+        """Leave scopes until DEPTH are left."""
+        while len(self.saved) > depth:
+            self.pop()
+
+    def innermost(self) -> Dict[str, Any]:
+        """The variables set in the innermost scope."""
+        return {name: self.current[name] for name in self.saved[-1]}
@@ -0,0 +1,216 @@
+"""Long running roll server.
+
+Requests are JSON objects, with the roll and its options:
+
+    {"id": 1, "roll": "sum 3d6", "seed": 42, "average": false, "probabilities": true}
+
+A line of plain text is also accepted as the roll. Each response is a JSON
+object with the result, errors and, if asked for, the probabilities, and
+the time taken to handle the request. Programs are compiled once per
+source, and exact distributions are calculated once per source.
+
+Rolls are run with limits on their steps, loops, collections, calls and
+time, so a program that would never stop is answered with an error.
+
+Requests are read one per line from stdin, from a Unix socket, or posted
+to a local HTTP server.
+"""
+import argparse
+import json
+import os
+import socketserver
+import sys
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Mapping, Optional, TextIO, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .analysis import EXACT_SPACE
+from .calculator import Calculator
+from .error import Error
+from .limits import LimitExceeded, Limits, add_limit_arguments, guard, limits_from_arguments
+from .program import CACHE_SIZE, compile_roll
+from .report import json_value, probability_rows
+
+# Limits of rolls from requests, unless others are given on the command line.
+SERVE_LIMITS = Limits(steps=1_000_000, iterations=100_000, length=100_000, depth=200, timeout=5.0)
+
+
+def error_dict(error: Error) -> Dict[str, Any]:
+    return {"kind": type(error).__name__, "line": error.line, "column": error.column, "message": error.message}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def distribution(source: str, limits: Optional[Limits] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Probability rows and summary of SOURCE, calculated exactly within LIMITS."""
+    program = compile_roll(source)
+    analysis = program.analysis
+    if not analysis.exact:
+        raise NotImplementedError(analysis.reasons[0])
+    if not analysis.calculable:
+        raise LimitExceeded(f"Distribution has more than {EXACT_SPACE} outcomes to calculate", program.statements[-1])
+
+    calculator = Calculator()
+    calculator.guard = guard(limits)
+    histogram, average, spread, mean_deviation = calculator.interpret(list(program.statements))
+    rows = [
+        {"value": json_value(row.value), "probability": row.chance, "at_least": row.at_least}
+        for row in probability_rows(histogram)
+    ]
+    return rows, {"average": average, "spread": spread, "mean_deviation": mean_deviation}
+
+
+def parse_request(text: str) -> Dict[str, Any]:
+    """A request from a line of JSON, or from a line holding just the roll."""
+    text = text.strip()
+    if text.startswith("{"):
+        request = json.loads(text)
+        if not isinstance(request, dict):
+            raise ValueError("Request must be a JSON object")
+        return request
+    return {"roll": text}
+
+
+def handle(request: Mapping[str, Any], limits: Optional[Limits] = SERVE_LIMITS) -> Dict[str, Any]:
+    """Roll a request within LIMITS, returning the response."""
+    start = time.perf_counter()
+    response: Dict[str, Any] = {}
+    if "id" in request:
+        response["id"] = request["id"]
+
+    try:
+        source = request["roll"]
+        if not isinstance(source, str):
+            raise TypeError("roll must be a string")
+
+        program = compile_roll(source)
+        result, errors = program.roll(
+            seed=request.get("seed"),
+            average=bool(request.get("average", False)),
+            engine=request.get("engine", "closure"),
+            limits=limits,
+        )
+        response["result"] = json_value(result)
+        response["errors"] = [error_dict(error) for error in errors]
+
+        if request.get("probabilities") and not errors:
+            rows, summary = distribution(source, limits)
+            response["probabilities"] = rows
+            response["summary"] = summary
+    except LimitExceeded as e:
+        response["errors"] = [error_dict(e.error)]
+    except Exception as e:  # pylint: disable=broad-except
+        response["errors"] = [{"kind": type(e).__name__, "message": str(e)}]
+
+    response["latency_ms"] = (time.perf_counter() - start) * 1000
+    return response
+
+
+def handle_line(line: str, limits: Optional[Limits] = SERVE_LIMITS) -> str:
+    """Handle a line of the line protocol, returning the response line."""
+    try:
+        response = handle(parse_request(line), limits)
+    except ValueError as e:
+        response = {"errors": [{"kind": "RequestError", "message": str(e)}]}
+    return json.dumps(response, default=str) + "\n"
+
+
+def serve_stdio(stdin: Optional[TextIO] = None, stdout: Optional[TextIO] = None, limits: Optional[Limits] = SERVE_LIMITS):
+    """Answer a request for each line of STDIN, until it ends."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        if not line.strip():
+            continue
+        stdout.write(handle_line(line, limits))
+        stdout.flush()
+
+
+class LineHandler(socketserver.StreamRequestHandler):
+    """The line protocol, over a socket."""
+
+    def handle(self):
+        for line in self.rfile:
+            text = line.decode("utf-8")
+            if not text.strip():
+                continue
+            self.wfile.write(handle_line(text, getattr(self.server, "limits", SERVE_LIMITS)).encode("utf-8"))
+            self.wfile.flush()
+
+
+class HTTPHandler(BaseHTTPRequestHandler):
+    """Requests posted as JSON, or given as query parameters to GET."""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.respond(self.rfile.read(length).decode("utf-8"))
+
+    def do_GET(self):
+        query = {key: values[-1] for key, values in parse_qs(urlparse(self.path).query).items()}
+        if "roll" not in query:
+            self.send_error(400, "Missing roll")
+            return
+
+        request: Dict[str, Any] = {"roll": query["roll"]}
+        if "seed" in query:
+            if not query["seed"].lstrip("-").isdigit():
+                self.send_error(400, "Seed must be an integer")
+                return
+            request["seed"] = int(query["seed"])
+        for flag in ("average", "probabilities"):
+            if flag in query:
+                request[flag] = query[flag].lower() in ("1", "true", "yes")
+        self.respond(json.dumps(request))
+
+    def respond(self, text: str):
+        body = handle_line(text, getattr(self.server, "limits", SERVE_LIMITS)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any):  # pylint: disable=redefined-builtin
+        ...
+
+
+def http_server(host: str, port: int, limits: Optional[Limits] = SERVE_LIMITS) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), HTTPHandler)
+    setattr(server, "limits", limits)
+    return server
+
+
+def unix_server(path: str, limits: Optional[Limits] = SERVE_LIMITS) -> "socketserver.ThreadingUnixStreamServer":
+    server = socketserver.ThreadingUnixStreamServer(path, LineHandler)
+    setattr(server, "limits", limits)
+    return server
+
+
+def main(arg_list: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="trill serve", description="Answer roll requests, keeping compiled rolls cached.")
+    parser.add_argument("--http", type=int, default=None, metavar="PORT", help="Serve HTTP on this port")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to serve HTTP on")
+    parser.add_argument("--socket", default=None, metavar="PATH", help="Serve the line protocol on this Unix socket")
+    add_limit_arguments(parser, SERVE_LIMITS)
+    args = parser.parse_args(arg_list)
+    limits = limits_from_arguments(args)
+
+    server: Optional[socketserver.BaseServer] = None
+    if args.http is not None:
+        server = http_server(args.host, args.http, limits)
+    elif args.socket is not None:
+        server = unix_server(args.socket, limits)
+
+    if server is None:
+        serve_stdio(limits=limits)
+        return
+
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if args.socket is not None and os.path.exists(args.socket):
+                os.unlink(args.socket)
@@ -97,4 +97,28 @@ testcases: Sequence[TestCase] = [
             (2, 2, 2): 12.5,
         },
     ),
+    TestCase("d2 + d2", {2: 25.0, 3: 50.0, 4: 25.0}, 3.0, 0.70710678119, 0.5),
+    TestCase("d2 - d2", {-1: 25.0, 0: 50.0, 1: 25.0}, 0.0, 0.70710678119, 0.5),
+    TestCase("sum (d2)d2", {1: 25.0, 2: 37.5, 3: 25.0, 4: 12.5}, 2.25, 0.96824583655, 0.8125),
+    TestCase(
+        "x := d6; x*x",
+        {1: 16.667, 4: 16.667, 9: 16.667, 16: 16.667, 25: 16.667, 36: 16.667},
+        15.16666666667,
+        12.21224340115,
+        10.5,
+    ),
+    TestCase("count 5 < 2d6", {0: 69.444, 1: 27.778, 2: 2.778}, 0.33333333333, 0.52704627669, 0.462962962963),
+    TestCase("if d2 = 1 then 5 else 7", {5: 50.0, 7: 50.0}, 6.0, 1.0, 1.0),
+    TestCase("repeat x := d6 until x > 4", {5: 50.0, 6: 50.0}, 5.5, 0.5, 0.5),
+    TestCase("max 2d4", {1: 6.25, 2: 18.75, 3: 31.25, 4: 43.75}, 3.125, 0.92702481089, 0.765625),
+    TestCase("choose {1, 2, 2}", {1: 33.333, 2: 66.667}, 1.66666666667, 0.47140452079, 0.444444444444),
+    TestCase("function foo(v) = v * v\ncall foo(d2)", {1: 50.0, 4: 50.0}, 2.5, 1.5, 1.5),
+    TestCase("sum (foreach x in 1..2 do d x)", {2: 50.0, 3: 50.0}, 2.5, 0.5, 0.5),
+    TestCase("different 2d2", {(1,): 25.0, (1, 2): 50.0, (2,): 25.0}),
+    TestCase("x := 2; (x := 1; x) U x", {(1, 2): 100.0}),
+    TestCase("%1 [d2, 3]", {1: 50.0, 2: 50.0}, 1.5, 0.5, 0.5),
+    TestCase("?0.25", {1: 25.0, (): 75.0}),
+    TestCase("{1, 2, 3} pick 2", {(1, 2): 33.333, (1, 3): 33.333, (2, 3): 33.333}),
+    TestCase("x ~ 4", {4: 100.0}, 4.0, 0.0, 0.0),
+    TestCase("compositional product(1,sum,*)\ncall product({2, d2})", {2: 50.0, 4: 50.0}, 3.0, 1.0, 1.0),
 ]
@@ -0,0 +1,140 @@
+"""Test rolling from asyncio code."""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from trill import aiterate, aprobabilities, atrill, trill
+from trill.aio import run
+
+ENDLESS = "repeat x := d6 until x > 7"
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure"])
+def test_atrill(engine):
+    roll = "x := 4d6; sum largest 3 x\n3'sum 2d6"
+    assert asyncio.run(atrill(roll, seed=42, engine=engine)) == trill(roll, seed=42, engine=engine)
+
+
+def test_atrill_errors():
+    result, errors = asyncio.run(atrill("3d"))
+    assert result is None
+    assert errors
+
+
+def test_aprobabilities():
+    (histogram, average, _, _), errors = asyncio.run(aprobabilities("sum 2d6"))
+    assert not errors
+    assert histogram[7] == pytest.approx(6 / 36)
+    assert average == pytest.approx(7)
+
+
+def test_aprobabilities_errors():
+    distribution, errors = asyncio.run(aprobabilities("3d"))
+    assert distribution is None
+    assert errors
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure"])
+def test_timeout_stops_worker(engine):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+
+        async def main():
+            with pytest.raises(asyncio.TimeoutError):
+                await atrill(ENDLESS, engine=engine, executor=executor, timeout=0.05)
+            # The single worker is free again once the endless roll has stopped.
+            return await asyncio.wait_for(atrill("d6", seed=1, executor=executor), 5)
+
+        result, errors = asyncio.run(main())
+    assert not errors
+    assert result == trill("d6", seed=1)[0]
+
+
+def test_cancel():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+
+        async def main():
+            task = asyncio.ensure_future(atrill(ENDLESS, executor=executor))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return await asyncio.wait_for(atrill("d6", executor=executor), 5)
+
+        _, errors = asyncio.run(main())
+    assert not errors
+
+
+def test_run_passes_checkpoint():
+    def work(checkpoint):
+        start = time.perf_counter()
+        while time.perf_counter() - start < 5:
+            checkpoint()
+        return "finished"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+
+        async def main():
+            with pytest.raises(asyncio.TimeoutError):
+                await run(work, executor, timeout=0.05)
+            future = executor.submit(lambda: "free")
+            return future.result(timeout=2)
+
+        assert asyncio.run(main()) == "free"
+
+
+def test_aiterate():
+    roll = "sum 3d6\n4'sum 2d6"
+
+    async def main():
+        return [(index, value) async for index, _, value in aiterate(roll, seed=7)]
+
+    output = asyncio.run(main())
+    assert [index for index, _ in output] == [0, 1, 1, 1, 1]
+    result, _ = trill(roll, seed=7)
+    assert output[0][1] == result[0]
+    assert [value for _, value in output[1:]] == result[1]
+
+
+def test_aiterate_close_stops_roll():
+    async def main():
+        seen = []
+        async for _, _, value in aiterate("1000000'sum 4d6", seed=1):
+            seen.append(value)
+            if len(seen) == 3:
+                break
+        return seen
+
+    assert len(asyncio.run(main())) == 3
+
+
+def test_aiterate_timeout():
+    async def main():
+        async for _ in aiterate(ENDLESS, timeout=0.05):
+            pass
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+
+
+def test_process_pool():
+    roll = "x := 4d6; sum largest 3 x"
+    with ProcessPoolExecutor(max_workers=1) as executor:
+
+        async def main():
+            rolled = await atrill(roll, seed=42, executor=executor)
+            (histogram, _, _, _), errors = await aprobabilities("sum 2d6", executor=executor)
+            assert not errors and histogram[7] == pytest.approx(6 / 36)
+
+            # The worker stops by itself at the timeout, and is free for the next roll.
+            with pytest.raises(asyncio.TimeoutError):
+                await atrill(ENDLESS, executor=executor, timeout=0.05)
+            await asyncio.wait_for(atrill("d6", executor=executor), 5)
+
+            with pytest.raises(TypeError):
+                async for _ in aiterate(roll, executor=executor):
+                    pass
+            return rolled
+
+        assert asyncio.run(main()) == trill(roll, seed=42)
@@ -0,0 +1,115 @@
+"""Test the static analysis of programs."""
+import math
+
+import pytest
+
+from trill import trill
+from trill.analysis import EXACT_SPACE, analyze
+from trill.calculator import Calculator
+from trill.main import calculate, main
+from trill.program import compile_roll
+
+from trill.tests.probability_cases import testcases
+
+
+def analysis(roll: str):
+    return compile_roll(roll).analysis
+
+
+@pytest.mark.parametrize("roll", [case.roll for case in testcases])
+def test_probability_cases_are_exact(roll):
+    assert analysis(roll).kind == "exact"
+
+
+@pytest.mark.parametrize(
+    "roll, kind",
+    [
+        ("sum 3d6", "exact"),
+        ("sum largest 3 4d6", "exact"),
+        ("function f(x) = x * 2\ncall f(d6)", "exact"),
+        ("x := 100d100; sum (largest 50 x) - sum (least 50 x)", "vectorized"),
+        ("count (accumulate x := d10 while x = 10)", "interpreter"),
+        ("repeat x := d6 + x until x > 10", "interpreter"),
+        ("3'sum 3d6", "interpreter"),
+    ],
+)
+def test_kind(roll, kind):
+    assert analysis(roll).kind == kind
+
+
+def test_vectorizable():
+    assert analysis("x := 3; sum largest 2 x d6").vectorizable
+    assert analysis("sum (3 + 2)d6 + d8").vectorizable
+    assert not analysis("x := d3; x d6").vectorizable
+    assert not analysis("sum 3d6\nsum 2d6").vectorizable
+    assert not analysis("[d6, d8]").vectorizable
+
+
+def test_reasons():
+    result = analysis("count (accumulate x := d10 while x = 10)")
+    assert not result.exact
+    assert "Accumulate has no finite distribution" in result.reasons
+
+
+def test_outcomes():
+    assert analysis("d6").outcomes == 6
+    assert analysis("d6 + d8").outcomes == 13
+    assert analysis("count 4d6").outcomes == 5
+    # Sorted collections of 3 dice.
+    assert analysis("3d6").outcomes == math.comb(3 + 6 - 1, 3)
+    # Sorted collections of up to 3 dice.
+    assert analysis("3 < 3d6").outcomes == math.comb(3 + 6, 3)
+    assert analysis("accumulate x := d6 while x > 2").outcomes is None
+
+
+@pytest.mark.parametrize("roll", ["3d6", "largest 2 4d6", "(d3)d4", "2#d3"])
+def test_outcomes_of_dice_pools(roll):
+    histogram, _, _, _ = Calculator().interpret(list(compile_roll(roll).statements))
+    assert analysis(roll).outcomes == len(histogram)
+
+
+@pytest.mark.parametrize("roll", ["2d4 U d3", "1..4", "{d4, 2}", "x := d3; x..3", "3 < 3d6"])
+def test_outcomes_bound_collections(roll):
+    histogram, _, _, _ = Calculator().interpret(list(compile_roll(roll).statements))
+    assert analysis(roll).outcomes >= len(histogram)
+
+
+def test_space_of_assignments():
+    small = analysis("x := d6; y := d8; x + y")
+    assert small.space == 6 * 8
+
+    large = analysis("x := 100d100; sum (largest 50 x)")
+    assert large.exact
+    assert large.space > EXACT_SPACE
+    assert not large.calculable
+
+
+def test_unknown_space_of_recursion():
+    result = analysis("function f(n) = if n > 1 then n + call f(n - 1) else 1\ncall f(d4)")
+    assert result.exact
+    assert result.space is None
+    assert result.calculable
+
+
+def test_analyze_statements():
+    assert analyze(compile_roll("sum 2d6").statements) == analysis("sum 2d6")
+
+
+def test_calculate_estimates_large_programs():
+    program = compile_roll("10#(sum 5d6)")
+    assert not program.analysis.calculable
+
+    _, summary, _ = calculate(program, samples=100, seed=1)
+    assert summary["rolls"] == 100
+
+
+def test_auto_engine():
+    roll = "x := d6; sum largest 2 (x d6)\nfunction f(n) = n + d4\ncall f(3)"
+    assert trill(roll, seed=5) == trill(roll, seed=5, engine="closure")
+
+
+def test_print_analysis(capsys):
+    main(["--analyze", "sum 3d6"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Engine: exact"
+    assert "Vectorizable: yes" in lines
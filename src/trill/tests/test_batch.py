@@ -0,0 +1,76 @@
+"""Test bulk rolling."""
+from typing import Any, List
+
+import pytest
+
+from trill import trill
+from trill.batch import BatchEvaluator, NotVectorizable, roll_many
+from trill.parser import Parser
+from trill.tokenizer import Tokenizer
+from trill.tests.cases import testcases
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize(
+    "roll,result",
+    [(case.roll, case.interpret_result) for case in testcases if case.interpret_result],
+)
+def test_batch_average(roll: str, result: List[Any]):
+    parsed = Parser(Tokenizer(roll).scan_tokens()).parse()
+    if len(parsed) != 1:
+        return
+
+    try:
+        res = BatchEvaluator(3, average=True).evaluate(parsed[0])
+    except NotVectorizable:
+        return
+
+    for trial in res:
+        trial = trial.tolist() if isinstance(trial, np.ndarray) else trial
+        assert trial == result[-1], roll
+
+
+def test_roll_many_vectorized():
+    res, err = roll_many("sum largest 3 4d6", 10000, seed=1)
+    assert not err
+    assert isinstance(res, np.ndarray)
+    assert res.shape == (10000,)
+    assert 3 <= res.min() and res.max() <= 18
+    assert abs(res.mean() - 12.24) < 0.2
+
+    assert roll_many("3d6", 5, seed=1)[0].shape == (5, 3)
+
+
+def test_roll_many_filtered():
+    res, _ = roll_many("5 < 4d10", 1000, seed=1)
+    assert len(res) == 1000
+    assert all(len(trial) <= 4 and all(v > 5 for v in trial) for trial in res)
+
+
+def test_roll_many_seed():
+    assert (roll_many("sum 3d6", 100, seed=3)[0] == roll_many("sum 3d6", 100, seed=3)[0]).all()
+
+
+def test_roll_many_fallback():
+    res, err = roll_many("repeat x:=d6 until x>3", 100, seed=1)
+    assert not err
+    assert isinstance(res, list)
+    assert len(res) == 100
+    assert all(4 <= v <= 6 for v in res)
+
+
+def test_roll_many_error():
+    res, err = roll_many("3d6;", 10)
+    assert res is None
+    assert err
+
+
+def test_roll_many_empty():
+    assert roll_many("", 3) == trill("") == [[], []]
+
+
+def test_roll_many_last_statement():
+    res, err = roll_many("sum 3d6\n100", 5)
+    assert not err
+    assert list(res) == [100] * 5
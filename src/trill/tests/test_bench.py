@@ -0,0 +1,20 @@
+"""Test the benchmarks."""
+from trill.bench import benchmark, compare
+
+
+def test_benchmark():
+    results = benchmark(("tokenize", "parse"), repeat=1, number=1)
+    assert set(results["results"]) == {"cases/tokenize", "cases/parse", "synthetic/tokenize", "synthetic/parse"}
+    assert all(result["best"] > 0 for result in results["results"].values())
+
+
+def test_compare():
+    baseline = {"results": {"cases/parse": {"best": 1.0, "mean": 1.0}, "cases/tokenize": {"best": 1.0, "mean": 1.0}}}
+    current = {
+        "results": {
+            "cases/parse": {"best": 1.5, "mean": 1.5},
+            "cases/tokenize": {"best": 1.05, "mean": 1.05},
+            "synthetic/parse": {"best": 9.0, "mean": 9.0},
+        }
+    }
+    assert compare(current, baseline) == ["cases/parse"]
@@ -0,0 +1,40 @@
+"""Test the closure compiler."""
+from typing import Any, List
+
+import pytest
+
+from trill import trill
+from trill.compiler import ClosureInterpreter
+from trill.interpreter import Interpreter
+from trill.parser import Parser
+from trill.tokenizer import Tokenizer
+
+from trill.tests.cases import testcases
+
+
+@pytest.mark.parametrize(
+    "roll,result",
+    [(case.roll, case.interpret_result) for case in testcases if case.interpret_result],
+)
+def test_compiled_average(roll: str, result: List[Any]):
+    scanner = Tokenizer(roll)
+    parser = Parser(scanner.scan_tokens())
+    expression = parser.parse()
+    res = ClosureInterpreter().interpret(expression, average=True)
+    assert res == result, roll
+
+
+@pytest.mark.parametrize("roll", [case.roll for case in testcases if case.interpret_result])
+@pytest.mark.parametrize("seed", [1, 42, 1234])
+def test_compiled_matches_interpreter(roll: str, seed: int):
+    expression = Parser(Tokenizer(roll).scan_tokens()).parse()
+    expected = Interpreter(seed).interpret(expression)
+    res = ClosureInterpreter(seed).interpret(expression)
+    assert res == expected, roll
+
+
+def test_trill_engine():
+    assert trill("sum 10d6", seed=7, engine="closure") == trill("sum 10d6", seed=7)
+
+    with pytest.raises(ValueError):
+        trill("d6", engine="unknown")
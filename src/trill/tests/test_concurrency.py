@@ -0,0 +1,72 @@
+"""Test rolling from many threads and asyncio tasks at once."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from trill import trill
+from trill.calculator import Calculator
+from trill.error import handler as error_handler
+from trill.parser import Parser
+from trill.tokenizer import Tokenizer
+
+CALLS = 2000
+
+
+def roll(index: int):
+    """Roll a program with its own function table, or with an error."""
+    if index % 3 == 0:
+        return trill(f"d({index}")
+    return trill(f"function f(x) = x + {index}\ncall f({index})", engine="interpreter" if index % 2 else "closure")
+
+
+def check(index: int, result):
+    value, errors = result
+    if index % 3 == 0:
+        assert value is None
+        assert errors and all(error.line == 1 for error in errors)
+    else:
+        assert value == [None, 2 * index]
+        assert not errors
+
+
+def test_threads():
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(roll, range(CALLS)))
+
+    for index, result in enumerate(results):
+        check(index, result)
+
+
+def test_asyncio():
+    async def main():
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(16) as executor:
+            return await asyncio.gather(*(loop.run_in_executor(executor, roll, index) for index in range(CALLS)))
+
+    for index, result in enumerate(asyncio.run(main())):
+        check(index, result)
+
+
+def test_thread_error_handlers():
+    def parse(index: int):
+        source = f"d({index}" if index % 2 else f"{index}d6"
+        Parser(Tokenizer(source).scan_tokens()).parse()
+        return error_handler.had_error
+
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(parse, range(CALLS)))
+
+    assert results == [bool(index % 2) for index in range(CALLS)]
+
+
+def test_calculators():
+    def calculate(sides: int):
+        statements = list(Parser(Tokenizer(f"function f(x) = d x\ncall f({sides})").scan_tokens()).parse())
+        return Calculator().interpret(statements)[1]
+
+    sides = [2 + index % 20 for index in range(200)]
+    with ThreadPoolExecutor(16) as executor:
+        averages = list(executor.map(calculate, sides))
+
+    assert averages == pytest.approx([(n + 1) / 2 for n in sides])
@@ -0,0 +1,64 @@
+"""Test probability distributions."""
+import pytest
+
+from trill.distribution import Dense, DicePool, KeepPool
+from trill.functions import dice_probabilities, group_probabilities
+from trill.calculator import Calculator
+from trill.parser import Parser
+from trill.tokenizer import Tokenizer
+
+
+def test_dense_convolve():
+    d2 = Dense.from_dict({1: 1, 2: 1})
+    assert d2.convolve(d2).to_dict() == {2: 1, 3: 2, 4: 1}
+    assert d2.convolve(d2.negate()).to_dict() == {-1: 1, 0: 2, 1: 1}
+
+
+def test_dense_power():
+    d6 = Dense.from_dict(dice_probabilities(6))
+    assert d6.power(0).to_dict() == {0: 1}
+    assert d6.power(1) == d6
+    assert d6.power(5) == d6.convolve(d6).convolve(d6).convolve(d6).convolve(d6)
+
+
+def test_dice_pool():
+    pool = DicePool({3: 1}, dice_probabilities(4))
+    multisets = group_probabilities(3, dice_probabilities(4))
+    assert dict(pool) == multisets
+
+    sums = {}
+    for dice, chance in multisets.items():
+        sums[sum(dice)] = sums.get(sum(dice), 0) + chance
+
+    assert pool.sum_distribution().keys() == sums.keys()
+    for value, chance in pool.sum_distribution().items():
+        assert abs(chance - sums[value]) < 1e-12
+
+
+def test_large_sum():
+    parsed = Parser(Tokenizer("sum 20d20").scan_tokens()).parse()
+    distribution, average, _, _ = Calculator().interpret(parsed)
+    assert len(distribution) == 381
+    assert abs(sum(distribution.values()) - 1) < 1e-9
+    assert round(average, 6) == 210
+
+
+@pytest.mark.parametrize("count,keep,sides,largest", [(3, 2, 3, True), (4, 3, 2, False), (5, 2, 4, True), (5, 5, 4, False), (3, 4, 6, True)])
+def test_keep_pool_sum(count: int, keep: int, sides: int, largest: bool):
+    pool = KeepPool(DicePool({count: 1}, dice_probabilities(sides)), keep, largest)
+
+    sums = {}
+    for dice, chance in pool.items():
+        sums[sum(dice)] = sums.get(sum(dice), 0) + chance
+
+    assert pool.sum_distribution().keys() == sums.keys()
+    for value, chance in pool.sum_distribution().items():
+        assert abs(chance - sums[value]) < 1e-12
+
+
+def test_large_keep_sum():
+    parsed = Parser(Tokenizer("sum largest 3 30d10").scan_tokens()).parse()
+    distribution, _, _, _ = Calculator().interpret(parsed)
+    assert min(distribution) == 3
+    assert max(distribution) == 30
+    assert abs(sum(distribution.values()) - 1) < 1e-9
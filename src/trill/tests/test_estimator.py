@@ -0,0 +1,62 @@
+"""Test estimating probabilities by sampling."""
+import pytest
+
+from trill.calculator import Calculator
+from trill.estimator import Estimator
+from trill.limits import LimitExceeded, Limits
+from trill.program import compile_roll
+
+
+def test_estimate_close_to_exact():
+    statements = list(compile_roll("sum 2d6").statements)
+    exact, exact_average, _, _ = Calculator().interpret(statements)
+
+    estimator = Estimator(samples=20_000, seed=1)
+    histogram, average, _, _ = estimator.interpret(statements)
+
+    assert estimator.rolled == 20_000
+    assert average == pytest.approx(exact_average, abs=0.1)
+    for value, chance in exact.items():
+        assert histogram[value] == pytest.approx(chance, abs=0.02)
+        low, high = estimator.intervals[value]
+        assert low <= histogram[value] <= high
+
+
+def test_estimate_independent_of_jobs():
+    statements = list(compile_roll("x := d6; if x = 6 then x + d6 else x").statements)
+    single = Estimator(samples=25_000, seed=7).interpret(statements)
+    parallel = Estimator(samples=25_000, jobs=2, seed=7).interpret(statements)
+    assert single == parallel
+
+
+def test_estimate_accumulate():
+    statements = list(compile_roll("count (accumulate x:=d10 while x=10)").statements)
+    with pytest.raises(NotImplementedError):
+        Calculator().interpret(statements)
+
+    histogram, average, _, _ = Estimator(samples=10_000, seed=3).interpret(statements)
+    assert histogram[1] == pytest.approx(0.9, abs=0.02)
+    assert average == pytest.approx(1 / 0.9, abs=0.02)
+
+
+@pytest.mark.parametrize(
+    "roll, limits, jobs, message",
+    [
+        ("repeat x := d6 until x > 7", Limits(iterations=10), 1, "Loop ran more than 10 times"),
+        ("count (accumulate x := d6 while x < 7)", Limits(timeout=0.2), 1, "Roll took more than 0.2 seconds"),
+        ("sum 1000d6", Limits(length=100), 1, "Collection of 1000 values is longer than 100"),
+        ("sum 1000d6", Limits(length=100), 2, "Collection of 1000 values is longer than 100"),
+    ],
+)
+def test_estimate_stops_at_limits(roll, limits, jobs, message):
+    statements = list(compile_roll(roll).statements)
+    with pytest.raises(LimitExceeded, match=message) as raised:
+        Estimator(samples=20_000, jobs=jobs, seed=1, limits=limits).interpret(statements)
+    assert raised.value.error.column > 0
+
+
+def test_estimate_limits_each_roll():
+    statements = list(compile_roll("count (accumulate x := d6 while x < 6)").statements)
+    estimator = Estimator(samples=20_000, seed=1, limits=Limits(steps=1000))
+    estimator.interpret(statements)
+    assert estimator.rolled == 20_000
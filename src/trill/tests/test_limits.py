@@ -0,0 +1,140 @@
+"""Test limits on the work of rolls."""
+import sys
+from typing import Optional
+
+import pytest
+
+from trill import Limits, compile, trill
+from trill.calculator import Calculator
+from trill.error import InterpreterError
+from trill.limits import DEPTH, FRAMES_PER_CALL, Guard, LimitExceeded, recursion_limit
+from trill.main import main
+
+ENGINES = ["interpreter", "closure"]
+
+
+def limit_error(roll: str, limits: Optional[Limits], engine: str) -> InterpreterError:
+    result, errors = trill(roll, seed=1, engine=engine, limits=limits)
+    assert result is None
+    assert len(errors) == 1
+    assert isinstance(errors[0], InterpreterError)
+    return errors[0]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "roll,limits,message,column",
+    [
+        ("repeat x := d6 until x > 7", Limits(iterations=100), "Loop ran more than 100 times", 15),
+        ("accumulate x := d6 while x < 7", Limits(steps=50), "Roll took more than 50 steps", 11),
+        ("foreach x in 1..20 do x", Limits(iterations=10), "Loop ran more than 10 times", 8),
+        ("sum 1000000#d6", Limits(length=1000), "Collection of 1000000 values is longer than 1000", 11),
+        ("sum 1000000d6", Limits(length=1000), "Collection of 1000000 values is longer than 1000", 11),
+        ("count (1..100000000)", Limits(length=1000), "Collection of 100000000 values is longer than 1000", 8),
+        ("x := 1..600; count (x U x)", Limits(length=1000), "Collection of 1200 values is longer than 1000", 22),
+        ("function f(n) = 1 + call f(n+1)\ncall f(1)", Limits(depth=50), "Function calls nested more than 50 deep", 25),
+        ("function f(n) = call f(n+1)\ncall f(1)", Limits(iterations=50), "Loop ran more than 50 times", 21),
+        ("1000000'sum 4d6", Limits(steps=100), "Roll took more than 100 steps", 8),
+    ],
+)
+def test_limits(roll, limits, message, column, engine):
+    error = limit_error(roll, limits, engine)
+    assert error.message == message
+    assert (error.line, error.column) == (1, column)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_timeout(engine):
+    error = limit_error("accumulate x := d6 while x < 7", Limits(timeout=0.05), engine)
+    assert error.message == "Roll took more than 0.05 seconds"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_within_limits(engine):
+    limits = Limits(steps=1000, iterations=100, length=1000, depth=50, timeout=10.0)
+    for roll in ["sum 3d6", "sum (foreach x in 1..10 do sum x d6)", "function f(n) = if n > 10 then n else call f(n+1)\ncall f(1)"]:
+        assert trill(roll, seed=3, engine=engine, limits=limits) == trill(roll, seed=3, engine=engine)
+
+
+def test_depth_is_nesting():
+    roll = "function f(n) = n + 1\n" + "\n".join(["call f(1)"] * 100)
+    assert not trill(roll, limits=Limits(depth=1))[1]
+
+
+def test_calculator_limits():
+    calculator = Calculator()
+    calculator.guard = Guard(Limits(length=1000))
+    with pytest.raises(LimitExceeded) as e:
+        calculator.interpret(list(compile("sum 100000d6").statements))
+    assert str(e.value.error) == "Interpreter-error at line 1, column 10: Collection of 100000 values is longer than 1000"
+
+    calculator = Calculator()
+    calculator.guard = Guard(Limits(depth=20))
+    with pytest.raises(LimitExceeded):
+        calculator.interpret(list(compile("function f(n) = if n > 100 then n else call f(n+1)\ncall f(1)").statements))
+
+    calculator = Calculator()
+    calculator.guard = Guard(Limits(steps=100))
+    histogram, *_ = calculator.interpret(list(compile("sum 2d6").statements))
+    assert histogram[7] == pytest.approx(6 / 36)
+
+
+def test_command_line(capsys):
+    main(["--max-iterations", "10", "accumulate x := d6 while x < 7"])
+    assert capsys.readouterr().out == "Interpreter-error at line 1, column 11: Loop ran more than 10 times\n"
+
+    main(["-p", "--max-length", "100", "sum 1000d6"])
+    assert "Collection of 1000 values is longer than 100" in capsys.readouterr().out
+
+    main(["-p", "--max-iterations", "10", "repeat x := d6 until x > 7"])
+    assert "Loop ran more than 10 times" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_deep_recursion(engine):
+    roll = "function f(n) = if n > 1 then n + call f(n - 1) else 1\ncall f(3000)"
+    assert trill(roll, engine=engine)[0][-1] == 3000 * 3001 // 2
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("limits", [None, Limits(depth=50), Limits(depth=50, iterations=10000, steps=20000)])
+def test_tail_calls(engine, limits):
+    roll = "function f(n) = if n > 0 then call f(n - 1) else 7\ncall f(6000)"
+    assert trill(roll, engine=engine, limits=limits) == [[None, 7], []]
+
+    roll = "function f(n, a) = if n = 0 then a else (x := d6; call f(n - 1, a + x))\ncall f(6000, 0)"
+    result, errors = trill(roll, seed=2, engine=engine, limits=limits)
+    assert not errors and 6000 <= result[-1] <= 36000
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tail_call_steps(engine):
+    roll = "function f(n) = call f(n+1)\ncall f(1)"
+    assert limit_error(roll, Limits(steps=1000), engine).message == "Roll took more than 1000 steps"
+    assert limit_error(roll, Limits(timeout=0.05), engine).message == "Roll took more than 0.05 seconds"
+
+
+def test_recursion_limit():
+    default = sys.getrecursionlimit()
+    with recursion_limit(Guard(Limits(depth=1000))):
+        if sys.version_info >= (3, 11):
+            assert sys.getrecursionlimit() >= 1000 * FRAMES_PER_CALL
+    assert sys.getrecursionlimit() == default
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_recursion_limit_only_for_recursive_rolls(engine):
+    default = sys.getrecursionlimit()
+    seen = []
+
+    def checkpoint():
+        seen.append(sys.getrecursionlimit())
+
+    compile("function f(n) = n + 1\nrepeat x := call f(d6) until x > 3").roll(engine=engine, checkpoint=checkpoint)
+    assert seen and set(seen) == {default}
+
+    seen.clear()
+    compile("function f(n) = if n > 0 then 1 + call f(n - 1) else 0\ncall f(3)").roll(engine=engine, checkpoint=checkpoint)
+    if sys.version_info >= (3, 11):
+        assert min(seen) >= DEPTH * FRAMES_PER_CALL
+    assert sys.getrecursionlimit() == default
@@ -0,0 +1,75 @@
+"""Test the command line."""
+import json
+
+from trill import compile, trill
+from trill.main import main
+
+
+def test_ndjson(capsys):
+    main(["-f", "ndjson", "-s", "1", "function f(x) = x * 2\n3'call f(d6)\n3d6"])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    (declaration, lines, value), _ = trill("function f(x) = x * 2\n3'call f(d6)\n3d6", seed=1)
+    assert declaration is None
+    assert records == [
+        {"type": "result", "statement": 0, "value": None},
+        *({"type": "line", "statement": 1, "line": line} for line in lines),
+        {"type": "result", "statement": 2, "value": value},
+    ]
+
+
+def test_json_probabilities(capsys):
+    main(["-f", "json", "-p", "-s", "2", "sum 2d4"])
+    output = json.loads(capsys.readouterr().out)
+
+    assert len(output["results"]) == 1
+    assert [row["value"] for row in output["probabilities"]] == list(range(2, 9))
+    assert output["summary"]["average"] == 5.0
+
+
+def test_json_errors(capsys):
+    main(["-f", "json", "-p", "d("])
+    errors = json.loads(capsys.readouterr().out)["errors"]
+    assert errors[0]["kind"] == "ParserError"
+    assert (errors[0]["line"], errors[0]["column"]) == (1, 2)
+
+
+def test_engines_agree(capsys):
+    main(["-f", "ndjson", "-s", "3", "5'sum 3d6"])
+    interpreted = capsys.readouterr().out
+    main(["-f", "ndjson", "-s", "3", "-e", "closure", "5'sum 3d6"])
+    assert capsys.readouterr().out == interpreted
+
+
+def test_iterate_matches_roll():
+    program = compile("x := 2d6\n4'sum x\n3 + d20")
+    lines = [value for _, _, value in program.iterate(seed=5)]
+    result, _ = program.roll(seed=5)
+    assert lines == [result[0], *result[1], result[2]]
+
+
+def test_top_keeps_at_least(capsys):
+    main(["-f", "json", "-p", "--top", "2", "sum 2d6"])
+    rows = json.loads(capsys.readouterr().out)["probabilities"]
+    assert [(row["value"], round(row["at_least"] * 36)) for row in rows] == [(6, 26), (7, 21)]
+
+    main(["-p", "--top", "2", "sum 2d6"])
+    assert "72.222" in capsys.readouterr().out
+
+
+def test_json_probabilities_stop_at_roll_errors(capsys):
+    main(["-f", "json", "--max-iterations", "5", "-p", "repeat x := d6 until x > 7"])
+    output = json.loads(capsys.readouterr().out)
+    assert [error["message"] for error in output["errors"]] == ["Loop ran more than 5 times"]
+    assert "probabilities" not in output
+
+
+def test_calculation_errors(capsys):
+    roll = "if d6 > 5 then 1/0 else 1"
+    main(["-f", "json", "-s", "1", "-p", roll])
+    output = json.loads(capsys.readouterr().out)
+    assert output["results"] == [{"statement": 0, "value": 1}]
+    assert output["errors"][0]["message"].startswith("Probabilities can not be calculated")
+
+    main(["-s", "1", "-p", roll])
+    assert "Probabilities can not be calculated" in capsys.readouterr().out
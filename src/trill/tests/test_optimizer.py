@@ -0,0 +1,90 @@
+"""Test the constant folding optimizer."""
+import pytest
+
+from trill.ast import expression
+from trill.ast.printer import ASTPrinter
+from trill.main import main
+from trill.optimizer import optimize
+from trill.program import compile_roll
+from trill.tokens import Token, TokenType
+
+
+def printed(roll: str, optimized: bool = True):
+    return ASTPrinter().print(compile_roll(roll, optimized).statements)
+
+
+@pytest.mark.parametrize(
+    "roll, expected",
+    [
+        ("3+2", ["5"]),
+        ("sum (3+2)d6", ["(sum (d 5 6))"]),
+        ("count (1..6)", ["6"]),
+        ("{1, 2, {3, 4}}", ["(collection 1 2 3 4)"]),
+        ("sum largest 2 {5, 1, 3}", ["8"]),
+        ("[1+1, 2*3]", ["(pair 2 6)"]),
+        ("if 1 then d6 else d8", ["(d 6)"]),
+        ("if {} then d6 else d8", ["(d 8)"]),
+        ("(2*3) ~ d6", ["6"]),
+        ("x ~ (2*3)", ["(~ x 6)"]),
+        ("x := (1..3); sum x", ["(block (assign x (collection 1 2 3)); (sum x))"]),
+    ],
+)
+def test_folds_constants(roll, expected):
+    assert printed(roll) == expected
+
+
+@pytest.mark.parametrize(
+    "roll",
+    [
+        "d6",
+        "3d6",
+        "choose {1, 2, 3}",
+        "?0.5",
+        "1..1000",
+        "1/0",
+    ],
+)
+def test_keeps_random_failing_and_long(roll):
+    assert printed(roll) == printed(roll, optimized=False)
+
+
+def test_unwraps_blocks_without_assignments():
+    single = compile_roll("(sum 3d6)").statements[0]
+    assert isinstance(single, expression.Unary)
+
+    # The assignment stays in the scope of the block.
+    name = Token(TokenType.IDENTIFIER, "x", "x", 1, 1)
+    block = expression.Block([expression.Assign(name, expression.Literal(3))])
+    assert isinstance(optimize([block])[0], expression.Block)
+
+
+def test_resolves_calls():
+    program = compile_roll("function f(n) = n * 2\nfunction g(n) = call f(n) + call g(n - 1)\ncall f(3)\ncall g(3)")
+    f, g, call_f, call_g = program.statements
+
+    assert isinstance(call_f, expression.Call) and call_f.function is f
+    assert isinstance(call_g, expression.Call) and call_g.function is g
+    assert isinstance(g.expression, expression.Binary)
+    assert g.expression.left.function is f
+    # Recursive calls are looked up by name.
+    assert g.expression.right.function is None
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure"])
+@pytest.mark.parametrize(
+    "roll",
+    [
+        "x := (2+3)d(4*2); y := sum largest (10/5) {1, 2, 3, 4}; sum x + y + count (1..20)",
+        "function f(n) = if n > 1 then n + call f(n - 1) else 1\ncall f(2 + 3)",
+        "3'sum (1+1)d6",
+        "sum (foreach x in 1..5 do sum x d(2*3))",
+    ],
+)
+def test_same_rolls(engine, roll):
+    for seed in range(5):
+        assert compile_roll(roll).roll(seed, engine=engine) == compile_roll(roll, False).roll(seed, engine=engine)
+
+
+def test_print_ast(capsys):
+    main(["--ast", "sum (3+2)d6"])
+    assert capsys.readouterr().out == "(sum (d 5 6))\n"
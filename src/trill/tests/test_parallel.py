@@ -0,0 +1,59 @@
+"""Test rolling in worker processes."""
+from trill import Limits, roll_parallel, trill
+from trill.main import main
+
+ROLLS = """function double(x) = 2 * x
+3d6
+call double(d4)
+2500'sum 4d6
+"""
+
+
+def test_independent_of_jobs():
+    serial = roll_parallel(ROLLS, seed=42, jobs=1)
+    assert serial == roll_parallel(ROLLS, seed=42, jobs=2)
+    assert serial == roll_parallel(ROLLS, seed=42, jobs=3, engine="closure")
+
+
+def test_output_shape():
+    result, errors = roll_parallel(ROLLS, seed=1, jobs=2)
+    assert not errors
+    assert len(result) == len(trill(ROLLS, seed=1)[0])
+    assert result[0] is None
+    assert len(result[1]) == 3
+    assert result[2] in (2, 4, 6, 8)
+    assert len(result[3]) == 2500
+
+
+def test_average():
+    assert roll_parallel(ROLLS, average=True, jobs=1) == trill(ROLLS, average=True)
+
+
+def test_shared_variables():
+    result, _ = roll_parallel("x := d6\nx + 10", seed=3, jobs=2)
+    assert result[0] is None
+    assert 11 <= result[1] <= 16
+
+
+def test_errors():
+    result, errors = roll_parallel("d(", jobs=2)
+    assert result is None
+    assert errors
+
+
+def test_limits():
+    endless = "d6\nrepeat x := d6 until x > 7"
+    result, errors = roll_parallel(endless, seed=1, jobs=2, limits=Limits(timeout=0.2))
+    assert result is None
+    assert [error.message for error in errors] == ["Roll took more than 0.2 seconds"]
+
+    result, errors = roll_parallel("x := 1\n" + endless, jobs=2, limits=Limits(iterations=10))
+    assert result is None
+    assert [error.message for error in errors] == ["Loop ran more than 10 times"]
+
+    assert roll_parallel(ROLLS, seed=42, jobs=2, limits=Limits(steps=2000)) == roll_parallel(ROLLS, seed=42, jobs=2)
+
+
+def test_command_line_limits(capsys):
+    main(["--jobs", "2", "--timeout", "0.2", "d6\nrepeat x := d6 until x > 7"])
+    assert "Roll took more than 0.2 seconds" in capsys.readouterr().out
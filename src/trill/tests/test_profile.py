@@ -0,0 +1,63 @@
+"""Test profiling of rolls."""
+import time
+
+import pytest
+
+from trill import compile
+from trill.calculator import Calculator
+from trill.interpreter import Interpreter
+from trill.profile import Profile
+
+
+def test_interpreter_profile():
+    program = compile("foreach x in 1..10 do\n  sum x d6")
+    interpreter = Interpreter(seed=1, profile=True)
+    interpreter.interpret(list(program.statements))
+
+    profile = interpreter.profile
+    assert profile is not None
+    assert profile.by_type["Foreach"].calls == 1
+    assert profile.by_type["Binary d"].calls == 10
+    assert profile.by_type["Binary d"].result_size == 10
+    assert profile.by_type["Foreach"].total >= profile.by_type["Binary d"].total
+
+    assert [location[0] for label, location in profile.by_location if label == "Binary d"] == [2]
+
+    _, _, slowest = profile.hot_spots()[0]
+    assert slowest.own == max(stats.own for stats in profile.by_location.values())
+
+
+def test_profile_same_results():
+    program = compile("sum largest 3 4d6")
+    assert program.roll(seed=3, profile=Profile()) == program.roll(seed=3)
+
+    with pytest.raises(ValueError):
+        program.roll(engine="closure", profile=Profile())
+
+
+def test_calculator_profile():
+    calculator = Calculator(profile=True)
+    calculator.interpret(list(compile("sum 3d6").statements))
+
+    assert calculator.profile is not None
+    assert calculator.profile.by_type["Unary sum"].result_size == 16
+
+
+def test_not_profiled():
+    assert Interpreter().profile is None
+    assert "visit_Binary_Expression" not in vars(Interpreter())
+
+
+def test_recursive_total():
+    program = compile("function f(n) = if n > 0 then 1 + call f(n - 1) else 0\ncall f(200)")
+    start = time.perf_counter()
+    interpreter = Interpreter(profile=True)
+    interpreter.interpret(list(program.statements))
+    elapsed = time.perf_counter() - start
+
+    profile = interpreter.profile
+    assert profile is not None
+    assert profile.by_type["Call"].calls == 201
+    # Nested calls are part of the outermost one, and not counted again.
+    assert profile.by_type["Call"].total <= elapsed
+    assert all(stats.total <= elapsed for stats in profile.by_location.values())
@@ -0,0 +1,39 @@
+"""Test compiled programs."""
+import pytest
+
+from trill import compile, trill  # pylint: disable=redefined-builtin
+from trill.program import CompiledRoll, compile_roll
+from trill.tests.cases import testcases
+
+
+def test_compile_is_cached():
+    assert compile("sum largest 3 4d6") is compile("sum largest 3 4d6")
+
+
+def test_compiled_roll_is_immutable():
+    program = compile("sum 3d6")
+    assert isinstance(program, CompiledRoll)
+    with pytest.raises(AttributeError):
+        program.source = "d6"  # type: ignore
+
+
+def test_compiled_function_table():
+    program = compile_roll("function foo(v) = v * v\ncall foo(5)")
+    assert list(program.functions) == ["foo"]
+    assert program.roll() == [[None, 25], []]
+
+
+def test_compiled_roll_seed():
+    program = compile("10d100")
+    assert program.roll(seed=42) == program.roll(seed=42)
+    assert program.roll(seed=42) == trill("10d100", seed=42)
+
+
+@pytest.mark.parametrize("roll,error", [(case.roll, case.error) for case in testcases if case.error])
+def test_compiled_error(roll: str, error: str):
+    program = compile(roll)
+    assert program.had_error
+    for _ in range(2):
+        res, err = program.roll()
+        assert res is None
+        assert str(err[0]) == error
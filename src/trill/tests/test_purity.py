@@ -0,0 +1,106 @@
+"""Test finding pure functions, and remembering their results."""
+import pytest
+
+from trill.ast import statement
+from trill.calculator import Calculator
+from trill.interpreter import Interpreter
+from trill.program import compile_roll
+from trill.purity import MEMO_SIZE, Purity, memo_key, recursive, remember
+
+FIB = "function fib(n) = if n < 2 then n else call fib(n - 1) + call fib(n - 2)\n"
+
+
+def purity(roll: str):
+    statements = compile_roll(roll).statements
+    functions = {stmt.name.literal: stmt for stmt in statements if isinstance(stmt, statement.Function)}
+    checker = Purity(functions)
+    return {name: checker.check(stmt) for name, stmt in functions.items()}
+
+
+@pytest.mark.parametrize(
+    "roll, closed, pure",
+    [
+        ("function f(n) = n * 2", True, True),
+        ("function f(n) = if n < 2 then n else call f(n - 1) + call f(n - 2)", True, True),
+        ("function f(n) = n + d6", True, False),
+        ("function f(n) = choose {n, 1}", True, False),
+        ("function f(n) = n + x", False, False),
+        ("function f(n) = (x := n * 2; x + 1)", True, True),
+        ("function f(n) = sum (foreach x in 1..n do x * x)", True, True),
+        ("function f(n) = accumulate x := d6 + n while x < 3", True, False),
+        ("function f(n) = repeat x := x + n until x > 3", False, False),
+        ("function f(n) = call g(n)\nfunction g(n) = n + d4", True, False),
+        ("function f(n) = call g(n)\nfunction g(n) = n + y", False, False),
+        ("function f(n) = call g(n)\nfunction g(n, m) = n + m", False, False),
+        ("function f(n) = call missing(n)", False, False),
+    ],
+)
+def test_purity(roll, closed, pure):
+    assert purity(roll)["f"] == (closed, pure)
+
+
+def test_memo_key():
+    assert memo_key(1) != memo_key(1.0)
+    assert memo_key([1, 2]) != memo_key((1, 2))
+    assert memo_key([2, 1]) != memo_key([1, 2])
+    assert memo_key([[1], 2]) == memo_key([[1], 2])
+
+
+def test_remember_is_bounded():
+    memo: dict = {}
+    for key in range(MEMO_SIZE + 10):
+        remember(memo, key, key)
+    assert len(memo) == MEMO_SIZE
+    assert 0 not in memo and MEMO_SIZE + 9 in memo
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure"])
+def test_remembers_pure_calls(engine):
+    program = compile_roll(FIB + "call fib(25)")
+    assert program.roll(engine=engine)[0][-1] == 75025
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure"])
+@pytest.mark.parametrize(
+    "roll",
+    [
+        "function f(n) = n + d6\ncall f(1) + call f(1) + call f(1)",
+        "function f(n) = n + x\nx := 1; y := call f(1); x := 5; y + call f(1)",
+        "function f(n) = {n, n}\nx := call f(2); sum (x @ {1}) + sum call f(2)",
+        FIB + "sum (foreach x in 3d10 do call fib(x))",
+    ],
+)
+def test_same_results(engine, roll):
+    for seed in range(5):
+        assert compile_roll(roll).roll(seed, engine=engine) == compile_roll(roll, False).roll(seed, engine=engine)
+
+
+def test_interpreter_memo():
+    interpreter: Interpreter = Interpreter(seed=1)
+    output = interpreter.interpret(list(compile_roll(FIB + "call fib(10)\ncall fib(d4)").statements))
+    assert output[1] == 55
+    assert len(interpreter.memo) == 11
+
+
+def test_calculator_calls():
+    calculator: Calculator = Calculator()
+    roll = "function f(n) = if n > 1 then n + call f(n - 1) else 1\ncall f(d6)"
+    histogram, average, _, _ = calculator.interpret(list(compile_roll(roll).statements))
+    assert histogram == pytest.approx({1: 1 / 6, 3: 1 / 6, 6: 1 / 6, 10: 1 / 6, 15: 1 / 6, 21: 1 / 6})
+    assert average == pytest.approx(56 / 6)
+    assert len(calculator.calls) == 6
+
+
+@pytest.mark.parametrize(
+    "roll, expected",
+    [
+        ("function f(n) = n * 2\nfunction g(n) = call f(n) + 1", False),
+        (FIB, True),
+        ("function f(n) = call g(n)\nfunction g(n) = if n > 0 then call f(n - 1) else 0", True),
+        ("function add(a, b) = a + b\ncompositional total(0, id, add)\nfunction id(n) = n", False),
+        ("function f(a, b) = call s({a, b})\ncompositional s(0, sgn, f)", True),
+    ],
+)
+def test_recursive(roll, expected):
+    functions = compile_roll(roll).functions
+    assert recursive(functions) == expected
@@ -0,0 +1,39 @@
+"""Test random number generators of interpreters."""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from trill import NumpyRandom, trill
+from trill.functions import dice_roll
+
+ROLL = "(sum 20d6) U (choose {1,2,3}) U (?0.5) U ((1..10) pick 3)"
+
+
+def test_global_random_untouched():
+    random.seed(5)
+    expected = random.random()
+    random.seed(5)
+    trill(ROLL, seed=1)
+    trill(ROLL, seed=1, engine="closure")
+    assert random.random() == expected
+
+
+def test_own_generator():
+    assert trill(ROLL, rng=random.Random(3)) == trill(ROLL, seed=3)
+    assert trill(ROLL, rng=random.Random(3), engine="closure") == trill(ROLL, seed=3)
+
+
+def test_threads_reproducible():
+    expected = [trill(ROLL, seed=seed) for seed in range(50)]
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda seed: trill(ROLL, seed=seed, engine="closure"), range(50)))
+    assert results == expected
+
+
+def test_numpy_generator():
+    pytest.importorskip("numpy")
+    assert trill(ROLL, rng=NumpyRandom.from_seed(4)) == trill(ROLL, rng=NumpyRandom.from_seed(4))
+    rolls = dice_roll(6, 1000, rng=NumpyRandom.from_seed(4))
+    assert len(rolls) == 1000
+    assert set(rolls) == {1, 2, 3, 4, 5, 6}
@@ -0,0 +1,93 @@
+"""Test probability reports."""
+import io
+import json
+
+import pytest
+
+from trill.calculator import Calculator
+from trill.program import compile_roll
+from trill.report import Bucket, Row, json_value, outcome_order, probability_rows, write_csv, write_json, write_ndjson
+
+HISTOGRAM = {3: 0.1, 1: 0.2, 2: 0.4, 7: 0.3}
+
+
+def test_rows_in_order():
+    rows = list(probability_rows(HISTOGRAM))
+    assert [row.value for row in rows] == [1, 2, 3, 7]
+    assert [row.at_least for row in rows] == pytest.approx([1.0, 0.8, 0.4, 0.3])
+
+
+def test_top():
+    rows = list(probability_rows(HISTOGRAM, top=2))
+    assert rows == [Row(2, 0.4, pytest.approx(0.8)), Row(7, 0.3, pytest.approx(0.3))]
+
+
+@pytest.mark.parametrize("bucket", [None, 4])
+def test_top_matches_all_rows(bucket):
+    histogram, _, _, _ = Calculator().interpret(list(compile_roll("sum 4d6 U (2 < 2d6)").statements))
+    every = {row.value: row for row in probability_rows(histogram, bucket=bucket)}
+    rows = list(probability_rows(histogram, top=5, bucket=bucket))
+    assert [row.value for row in rows] == sorted((row.value for row in rows), key=outcome_order)
+    assert sorted(row.chance for row in rows) == sorted(row.chance for row in every.values())[-5:]
+    for row in rows:
+        assert row.at_least == pytest.approx(every[row.value].at_least)
+
+
+def test_top_csv():
+    stream = io.StringIO()
+    write_csv(probability_rows(HISTOGRAM, top=1), stream)
+    assert stream.getvalue().splitlines() == ["value,probability,at_least", "2,0.4,0.8"]
+
+
+def test_bucket():
+    rows = list(probability_rows(HISTOGRAM, bucket=3))
+    assert [row.value for row in rows] == [Bucket(0, 2), Bucket(3, 5), Bucket(6, 8)]
+    assert [row.chance for row in rows] == pytest.approx([0.6, 0.1, 0.3])
+    assert str(rows[0].value) == "0..2"
+
+
+def test_collections():
+    rows = list(probability_rows({(1, 2): 0.5, 3: 0.25, (): 0.25}))
+    assert [row.value for row in rows] == [3, (), (1, 2)]
+
+
+def test_csv():
+    stream = io.StringIO()
+    write_csv(probability_rows({(1, 2): 0.5, 4: 0.5}), stream)
+    assert stream.getvalue().splitlines() == ["value,probability,at_least", "4,0.5,1.0", "1 2,0.5,0.5"]
+
+
+RECORDS = [
+    ("result", {"statement": 0, "value": 3}),
+    ("line", {"statement": 1, "line": "4"}),
+    ("probability", {"value": json_value(Bucket(4, 5)), "probability": 0.5, "at_least": 1.0}),
+    ("probability", {"value": json_value((1, 2)), "probability": 0.5, "at_least": 0.5}),
+    ("summary", {"average": None}),
+]
+
+
+def test_json():
+    stream = io.StringIO()
+    write_json(iter(RECORDS), stream)
+    assert json.loads(stream.getvalue()) == {
+        "results": [{"statement": 0, "value": 3}, {"statement": 1, "line": "4"}],
+        "probabilities": [
+            {"value": "4..5", "probability": 0.5, "at_least": 1.0},
+            {"value": [1, 2], "probability": 0.5, "at_least": 0.5},
+        ],
+        "summary": {"average": None},
+    }
+
+
+def test_json_empty():
+    stream = io.StringIO()
+    write_json(iter([]), stream)
+    assert json.loads(stream.getvalue()) == {}
+
+
+def test_ndjson():
+    stream = io.StringIO()
+    write_ndjson(iter(RECORDS), stream)
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["type"] for line in lines] == ["result", "line", "probability", "probability", "summary"]
+    assert lines[1] == {"type": "line", "statement": 1, "line": "4"}
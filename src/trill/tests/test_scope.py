@@ -0,0 +1,53 @@
+"""Test nested scopes of variables."""
+import pytest
+
+from trill import trill
+from trill.scope import Scope
+
+
+def test_shadowing():
+    scope = Scope({"x": 1})
+    scope.push({"x": 2, "y": 3})
+    scope["z"] = 4
+    assert (scope["x"], scope.get("y"), scope.get("z")) == (2, 3, 4)
+    assert scope.innermost() == {"x": 2, "y": 3, "z": 4}
+
+    scope.pop()
+    assert scope["x"] == 1
+    assert "y" not in scope and scope.get("z") is None
+    assert list(scope) == ["x"]
+
+
+def test_assigning_twice_in_a_scope():
+    scope = Scope()
+    scope["x"] = 1
+    scope.push()
+    scope["x"] = 2
+    scope["x"] = 3
+    scope.pop()
+    assert scope["x"] == 1
+
+
+def test_restore():
+    scope = Scope()
+    depth = scope.depth
+    for value in range(5):
+        scope.push({"x": value})
+    assert scope.depth == depth + 5 and scope["x"] == 4
+
+    scope.restore(depth)
+    assert scope.depth == depth and "x" not in scope
+
+
+@pytest.mark.parametrize("engine", ["interpreter", "closure"])
+@pytest.mark.parametrize(
+    "roll, expected",
+    [
+        ("x := 1; y := (x := 2; x + 1); x + y", 4),
+        ("x := 5; sum (foreach x in 1..3 do x) + x", 11),
+        ("function f(n) = n + x\nx := 10; call f(1) + (x := 20; call f(1))", 32),
+        ("x := 1; (repeat x := x + 1 until x > 3) + x", 5),
+    ],
+)
+def test_scopes_in_rolls(roll, expected, engine):
+    assert trill(roll, engine=engine)[0][-1] == expected
@@ -0,0 +1,76 @@
+"""Test the roll server."""
+import io
+import json
+import threading
+import time
+import urllib.request
+from urllib.parse import quote
+
+from trill import Limits, trill
+from trill.serve import handle, http_server, serve_stdio
+
+
+def test_handle():
+    response = handle({"id": "a", "roll": "sum 3d6", "seed": 4, "engine": "interpreter"})
+    assert response["id"] == "a"
+    assert [response["result"], response["errors"]] == trill("sum 3d6", seed=4)
+    assert response["latency_ms"] >= 0
+
+
+def test_handle_probabilities():
+    response = handle({"roll": "d4", "probabilities": True})
+    assert [row["value"] for row in response["probabilities"]] == [1, 2, 3, 4]
+    assert response["summary"]["average"] == 2.5
+
+
+def test_handle_errors():
+    response = handle({"roll": "d("})
+    assert response["result"] is None
+    assert response["errors"][0]["kind"] == "ParserError"
+    assert handle({})["errors"][0]["kind"] == "KeyError"
+
+
+def test_stdio():
+    stdout = io.StringIO()
+    serve_stdio(io.StringIO('d6\n\n{"roll": "3", "id": 2}\n{"roll": \n'), stdout)
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert len(responses) == 3
+    assert responses[1] == {"id": 2, "result": [3], "errors": [], "latency_ms": responses[1]["latency_ms"]}
+    assert responses[2]["errors"][0]["kind"] == "RequestError"
+
+
+def test_http():
+    server = http_server("127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    try:
+        with urllib.request.urlopen(url + "?roll=" + quote("sum 2d6") + "&seed=3") as response:
+            assert json.load(response)["result"] == trill("sum 2d6", seed=3, engine="closure")[0]
+
+        request = urllib.request.Request(url, data=json.dumps({"roll": "d2", "probabilities": True}).encode())
+        with urllib.request.urlopen(request) as response:
+            assert len(json.load(response)["probabilities"]) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_handle_limits():
+    response = handle({"roll": "repeat x := d6 until x > 7"})
+    assert response["result"] is None
+    assert response["errors"][0]["kind"] == "InterpreterError"
+    assert response["errors"][0]["column"] == 15
+
+
+def test_handle_large_distributions():
+    response = handle({"roll": "largest 10 30d20", "probabilities": True})
+    assert response["errors"][0]["kind"] == "InterpreterError"
+    assert "outcomes to calculate" in response["errors"][0]["message"]
+
+    # Few outcomes, but too many rolls to enumerate within the timeout.
+    start = time.monotonic()
+    response = handle({"roll": "largest 4 12d20", "probabilities": True}, Limits(timeout=0.5))
+    assert time.monotonic() - start < 2
+    assert response["errors"][0]["message"] == "Roll took more than 0.5 seconds"
+    assert "probabilities" not in response
@@ -1,4 +1,9 @@
 """Syntax tree tests."""
+import dataclasses
+import sys
+
+import pytest
+
 from trill.tokens import TokenType
 from trill.tokenizer import Token
 from trill.ast.printer import ASTPrinter
@@ -16,3 +21,14 @@ def test_printer():
 
     res = ASTPrinter().print(expression)
     assert res == ["(* (- 123) (group 45.67))"]
+
+
+def test_compact_nodes():
+    node = Binary(Literal(1), Token(TokenType.PLUS, "+", None, 1, 1), Literal(2))
+
+    assert not hasattr(node, "__dict__") or sys.version_info < (3, 10)
+    assert node.visit_method == "visit_Binary_Expression"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        node.left = Literal(3)  # type: ignore[misc]
+    assert node != Binary(node.left, node.operator, node.right)
+    assert {node: 1}[node] == 1
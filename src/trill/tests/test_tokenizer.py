@@ -1,7 +1,8 @@
 """Test the scanner."""
 import pytest
 
-from trill.tokenizer import Tokenizer
+from trill.error import ErrorHandler, ScannerError
+from trill.tokenizer import CharacterTokenizer, Tokenizer
 from trill.tokens import TokenType, Token
 from trill.error import handler as error_handler
 from trill.tests.cases import testcases
@@ -86,3 +87,57 @@ def test_tokenizer(roll: str, result: int):
     scanner = Tokenizer(roll)
     res = scanner.scan_tokens()
     assert len(res) == result + 1, roll
+
+
+def scanned(tokenizer, source: str):
+    """Tokens with their positions, and errors."""
+    errors = ErrorHandler()
+    tokens = tokenizer(source, errors).scan_tokens()
+    return (
+        [(t.token_type, t.lexeme, t.literal, t.line, t.column) for t in tokens],
+        [(type(e), e.line, e.column, e.message) for e in errors.error_report],
+    )
+
+
+@pytest.mark.parametrize(
+    "source",
+    [case.roll for case in testcases]
+    + [
+        "Ux xU dU d_ D6 z4 Zz",
+        "1.5.3 1..5 1. %1 %3 %12 % | : . =/ =/=",
+        "\\ comment\n d6 \\\nd8\n3",
+        "\\ comment at the end",
+        "d6 \\",
+        '"text" "two\nlines" "unterminated',
+        "d6 \f d8",
+        "dé é1 1é 1.5é 1.²  %² 12٣ ß",
+        "  \t\r\n  ",
+    ],
+)
+def test_scanners_agree(source: str):
+    assert scanned(Tokenizer, source) == scanned(CharacterTokenizer, source)
+
+
+@pytest.mark.parametrize("tokenizer", [Tokenizer, CharacterTokenizer])
+def test_end_of_source(tokenizer):
+    tokens, errors = scanned(tokenizer, "d6 \\ comment at the end")
+    assert tokens == [
+        (TokenType.DICE, "d", "d", 1, 0),
+        (TokenType.INTEGER, "6", 6, 1, 1),
+        (TokenType.EOF, "\\0", None, 1, 23),
+    ]
+    assert not errors
+
+    tokens, errors = scanned(tokenizer, '1 "unterminated')
+    assert [token[0] for token in tokens] == [TokenType.INTEGER, TokenType.EOF]
+    assert errors == [(ScannerError, 1, 15, "Unterminated string")]
+
+
+@pytest.mark.parametrize("tokenizer", [Tokenizer, CharacterTokenizer])
+def test_compact_tokens(tokenizer):
+    first, second = (tokenizer(source, ErrorHandler()).scan_tokens() for source in ("sum x + 3d6", "x + sum 4d6"))
+    assert not hasattr(first[0], "__dict__")
+    # Lexemes of keywords, operators and names are shared between programs.
+    assert first[0].lexeme is second[2].lexeme
+    assert first[1].lexeme is second[0].lexeme
+    assert first[2].lexeme is second[1].lexeme
@@ -1,11 +1,86 @@
-"""Troll tokenizer."""
-from typing import List
+"""Troll tokenizer.
+
+Tokens are matched by a single compiled pattern. Anything the pattern does
+not cover, like unexpected characters, unterminated strings and non-ASCII
+letters and digits, is scanned a character at a time, so both scanners give
+the same tokens and errors.
+"""
+import re
+import sys
+from typing import List, Optional
 
 from .tokens import TokenLiteral, TokenType
 from .tokens import Token
-from .error import handler as error_handler, ScannerError
+from . import error
+from .error import ErrorHandler, ScannerError
 from .reserved import KEYWORDS
 
+# Whitespace before a token, then either the token or a character to scan by character.
+# Names and numbers must not be followed by non-ASCII characters, which isalpha and
+# isdigit may count as part of them.
+TOKEN_PATTERN = re.compile(
+    r"""
+    ([ \t\r]*)
+    (?:
+        (
+            [A-TV-Za-z][A-Za-z]*(?![A-Za-z]|[^\x00-\x7f])
+            |[0-9]+\.[0-9]+(?![0-9]|[^\x00-\x7f])
+            |[0-9]+(?![0-9]|\.[0-9]|\.?[^\x00-\x7f])
+            |\n
+            |"[^"]*"
+            |\\(?:[\s\S][^\n]*)?(?=\n|\Z)
+            |%[12]
+            |=/=|<=|<\||<>|\|\||\|>|>=|:=|--|\.\.
+            |[<>'=;+/*?&!~\-(){}\[\],\#U@]
+        )
+        |([\s\S])
+    )
+    """,
+    re.VERBOSE,
+)
+
+OPERATORS = {
+    "=/=": TokenType.NOT_EQUAL,
+    "<=": TokenType.LESS_THAN_OR_EQUAL,
+    "<|": TokenType.TEXTALIGN,
+    "<>": TokenType.TEXTALIGN,
+    "||": TokenType.TEXTALIGN,
+    "|>": TokenType.TEXTALIGN,
+    ">=": TokenType.GREATER_THAN_OR_EQUAL,
+    ":=": TokenType.ASSIGN,
+    "--": TokenType.MINUSMINUS,
+    "..": TokenType.RANGE,
+    "<": TokenType.LESS_THAN,
+    ">": TokenType.GREATER_THAN,
+    "'": TokenType.TEXTBOX,
+    "=": TokenType.EQUAL,
+    ";": TokenType.SEMICOLON,
+    "+": TokenType.PLUS,
+    "/": TokenType.DIVIDE,
+    "*": TokenType.MULTIPLY,
+    "?": TokenType.PROBABILITY,
+    "&": TokenType.AND,
+    "!": TokenType.NOT,
+    "~": TokenType.DEFAULT,
+    "-": TokenType.MINUS,
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    "{": TokenType.LBRACKET,
+    "}": TokenType.RBRACKET,
+    "[": TokenType.LSQUARE,
+    "]": TokenType.RSQUARE,
+    ",": TokenType.COMMA,
+    "#": TokenType.SAMPLES,
+    "U": TokenType.UNION,
+    "@": TokenType.UNION,
+}
+
+# Tokens with their text as literal: operators, keywords and dice.
+FIXED_TOKENS = {**OPERATORS, **KEYWORDS, **dict.fromkeys("dDzZ", TokenType.DICE)}
+
+LETTERS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz")
+DIGITS = frozenset("0123456789")
+
 
 class Tokenizer:
     source: str
@@ -16,16 +91,75 @@ class Tokenizer:
     _line: int = 1
     _column: int = 0
 
-    def __init__(self, source: str):
+    def __init__(self, source: str, errors: Optional[ErrorHandler] = None):
+        """Create a tokenizer reporting to ERRORS, or to a new error handler.
+
+        The handler also becomes the error handler of the current thread.
+        """
         self.source = source
-        error_handler.reset()
+        self.errors = errors if errors is not None else ErrorHandler()
+        error.use(self.errors)
 
     def scan_tokens(self) -> List[Token]:
         self.tokens = []
-        while not self.is_at_end():
-            self._start = self._current
-            self.scan_token()
-
+        tokens = self.tokens
+        source = self.source
+        end = len(source)
+        line = self._line
+        column = self._column
+        position = self._current
+
+        append = tokens.append
+        fixed = FIXED_TOKENS
+        intern = sys.intern
+
+        while position < end:
+            for space, text, other in TOKEN_PATTERN.findall(source, position):
+                if space:
+                    position += len(space)
+                    column += len(space)
+
+                if other:
+                    self._start = self._current = position
+                    self._line, self._column = line, column
+                    self.scan_token()
+                    position, line, column = self._current, self._line, self._column
+                    # Scanning by character may end elsewhere than the pattern did.
+                    break
+
+                token_type = fixed.get(text)
+                if token_type is not None:
+                    text = intern(text)
+                    append(Token(token_type, text, text, line, position))
+                else:
+                    first = text[0]
+                    if first in LETTERS:
+                        text = intern(text)
+                        append(Token(TokenType.IDENTIFIER, text, text, line, position))
+                    elif first in DIGITS:
+                        if "." in text:
+                            append(Token(TokenType.FLOAT, text, float(text), line, position))
+                        else:
+                            append(Token(TokenType.INTEGER, text, int(text, 10), line, position))
+                    elif first == "\n":
+                        line += 1
+                        column = 0
+                        position += 1
+                        continue
+                    elif first == '"':
+                        append(Token(TokenType.STRING, text, text[1:-1], line, position))
+                    elif first == "%":
+                        append(Token(TokenType.PAIR_VALUE, text, int(text[1]), line, position))
+                    # Comments add no token.
+
+                position += len(text)
+                column += len(text)
+            else:
+                # Only whitespace is left.
+                column += end - position
+                position = end
+
+        self._current, self._line, self._column = position, line, column
         self.tokens.append(Token(TokenType.EOF, "\\0", None, self._line, self._current))
         return self.tokens
 
@@ -34,14 +168,14 @@ class Tokenizer:
 
         is_float = False
 
-        while self.peek().isdigit():
+        while self.peek().isdecimal():
             self.advance()
 
-        if self.peek() == "." and self.peek_next().isdigit():
+        if self.peek() == "." and self.peek_next().isdecimal():
             is_float = True
             self.advance()
 
-            while self.peek().isdigit():
+            while self.peek().isdecimal():
                 self.advance()
 
         if is_float:
@@ -53,6 +187,9 @@ class Tokenizer:
         """Scan string."""
 
         while self.peek() != '"':
+            if self.is_at_end():
+                self.errors.report(ScannerError(self._line, self._column, "Unterminated string"))
+                return
             self.advance()
 
         self.advance()
@@ -65,7 +202,7 @@ class Tokenizer:
         while self.peek().isalpha():
             self.advance()
 
-        text = self.source[self._start : self._current]
+        text = sys.intern(self.source[self._start : self._current])
         _type = KEYWORDS.get(text, TokenType.IDENTIFIER)
         self.add_token(_type, text)
 
@@ -172,10 +309,10 @@ class Tokenizer:
         if character == ",":
             return self.add_token(TokenType.COMMA, character)
 
-        if character == "%" and self.peek().isdigit():
+        if character == "%" and self.peek().isdecimal():
             element = int(self.advance(), 10)
             if element not in [1, 2]:
-                error_handler.report(
+                self.errors.report(
                     ScannerError(self._line, self._column, f"{element} is not a pair value"),
                 )
                 return None
@@ -206,13 +343,13 @@ class Tokenizer:
             self._column = 0
             return None
 
-        if character.isdigit():
+        if character.isdecimal():
             return self.number()
 
         if character.isalpha():
             return self.identifier()
 
-        error_handler.report(ScannerError(self._line, self._column, f"Unexpected character: {character}"))
+        self.errors.report(ScannerError(self._line, self._column, f"Unexpected character: {character}"))
         return None
 
     def is_at_end(self):
@@ -226,8 +363,9 @@ class Tokenizer:
     def comment(self):
         res = ""
 
-        self.advance()
-        while self.peek() != "\n":
+        if not self.is_at_end():
+            self.advance()
+        while not self.is_at_end() and self.peek() != "\n":
             res += self.advance()
         return res
 
@@ -244,4 +382,20 @@ class Tokenizer:
 
     def add_token(self, _type: TokenType, literal: TokenLiteral):
         text = self.source[self._start : self._current]
+        if _type is not TokenType.STRING:
+            # Operators, keywords and names share one string per lexeme.
+            text = sys.intern(text)
         self.tokens.append(Token(_type, text, literal, self._line, self._start))
+
+
+class CharacterTokenizer(Tokenizer):
+    """Tokenizer scanning every token a character at a time."""
+
+    def scan_tokens(self) -> List[Token]:
+        self.tokens = []
+        while not self.is_at_end():
+            self._start = self._current
+            self.scan_token()
+
+        self.tokens.append(Token(TokenType.EOF, "\\0", None, self._line, self._current))
+        return self.tokens
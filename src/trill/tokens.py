@@ -91,6 +91,8 @@ TokenLiteral = Union[str, int, float, None]
 
 
 class Token:
+    __slots__ = ("token_type", "lexeme", "literal", "line", "column")
+
     token_type: TokenType
     lexeme: str
     literal: TokenLiteral
@@ -1,5 +1,21 @@
 """Misc types used in code."""
-from typing import Sequence, Union
+from typing import Any, List, Protocol, Sequence, Union
 
 Number = Union[int, float]
 NumberList = Sequence[Number]
+
+
+class RandomSource(Protocol):
+    """The methods of random.Random used for rolling dice."""
+
+    def randint(self, a: int, b: int) -> int:
+        ...
+
+    def random(self) -> float:
+        ...
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        ...
+
+    def sample(self, population: Sequence[Any], k: int) -> List[Any]:
+        ...